@@ -0,0 +1,34 @@
+"""add prediction idempotency keys
+
+Revision ID: 3e9a6c1f5b28
+Revises: b5d81f3c6a47
+Create Date: 2026-10-18 19:52:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "3e9a6c1f5b28"
+down_revision: Union[str, None] = "b5d81f3c6a47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # Databases bootstrapped by Base.metadata.create_all already have the table
+    if sa.inspect(op.get_bind()).has_table('prediction_keys'):
+        return
+    # Not partitioned with predictions: a unique key on a partitioned table would have
+    # to include the timestamp, and a retried request gets a new one
+    op.create_table(
+        'prediction_keys',
+        sa.Column('key', sa.String, primary_key=True),
+        sa.Column('response', sa.JSON, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_prediction_keys_created_at', 'prediction_keys', ['created_at'])
+
+def downgrade() -> None:
+    op.drop_index('ix_prediction_keys_created_at', table_name='prediction_keys')
+    op.drop_table('prediction_keys')
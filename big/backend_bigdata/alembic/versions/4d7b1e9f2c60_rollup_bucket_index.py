@@ -0,0 +1,28 @@
+"""index machine rollups by bucket
+
+Revision ID: 4d7b1e9f2c60
+Revises: e8c1d5a7b302
+Create Date: 2026-10-18 23:41:08.527310
+
+/stats and /machines read the daily buckets of every machine; without this index
+that is a scan of all the minute and hour buckets too.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "4d7b1e9f2c60"
+down_revision: Union[str, None] = "e8c1d5a7b302"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_machine_rollups_bucket_machine_id',
+        'machine_rollups',
+        ['bucket', 'machine_id'],
+        if_not_exists=True,
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_machine_rollups_bucket_machine_id', table_name='machine_rollups', if_exists=True)
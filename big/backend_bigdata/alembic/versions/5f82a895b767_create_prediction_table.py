@@ -8,18 +8,39 @@ Create Date: 2025-12-10 23:14:40.748961
 from typing import Sequence, Union
 
 from alembic import op
-from sqlalchemy import Column, Integer, Float, String, DateTime
+import sqlalchemy as sa
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON
+
+revision: str = "5f82a895b767"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
-    op.create_table(
-        'predictions',
-        Column('id', Integer, primary_key=True),
-        Column('machine_id', String, nullable=False),
-        Column('temperature', Float, nullable=False),
-        Column('humidity', Float, nullable=False),
-        Column('prediction', Float, nullable=False),
-        Column('timestamp', DateTime, server_default=func.now()),
-    )
+    # Databases bootstrapped by Base.metadata.create_all already have these tables
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('predictions'):
+        op.create_table(
+            'predictions',
+            Column('id', Integer, primary_key=True),
+            Column('machine_id', String),
+            Column('features', JSON),
+            Column('prediction', Float),
+            Column('model_version', String),
+            Column('timestamp', DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index('ix_predictions_id', 'predictions', ['id'])
+        op.create_index('ix_predictions_machine_id', 'predictions', ['machine_id'])
+    if not inspector.has_table('machines'):
+        op.create_table(
+            'machines',
+            Column('id', Integer, primary_key=True),
+            Column('name', String),
+            Column('created_at', DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index('ix_machines_id', 'machines', ['id'])
+        op.create_index('ix_machines_name', 'machines', ['name'])
 
 def downgrade() -> None:
-    op.drop_table('predictions')
\ No newline at end of file
+    op.drop_table('machines')
+    op.drop_table('predictions')
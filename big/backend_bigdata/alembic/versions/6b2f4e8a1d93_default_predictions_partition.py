@@ -0,0 +1,41 @@
+"""default predictions partition
+
+Revision ID: 6b2f4e8a1d93
+Revises: 4d7b1e9f2c60
+Create Date: 2026-10-18 23:58:42.190734
+
+A reading timestamped outside every monthly partition (clock skew, backfills older
+than the oldest partition) made the whole batch it arrived in fail. Such rows now
+go to ``predictions_default``; app.db.partitions moves them to their month when its
+partition is created.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "6b2f4e8a1d93"
+down_revision: Union[str, None] = "4d7b1e9f2c60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def _is_partitioned(bind) -> bool:
+    return bind.dialect.name == "postgresql" and bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('predictions'))"
+    )).scalar()
+
+def upgrade() -> None:
+    if not _is_partitioned(op.get_bind()):
+        return
+    op.execute('CREATE TABLE IF NOT EXISTS predictions_default PARTITION OF predictions DEFAULT')
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if not _is_partitioned(bind):
+        return
+    if bind.execute(sa.text('SELECT EXISTS (SELECT 1 FROM predictions_default)')).scalar():
+        raise RuntimeError(
+            "predictions_default holds rows outside the monthly partitions; "
+            "create partitions for them (app.db.partitions) before downgrading"
+        )
+    op.execute('DROP TABLE predictions_default')
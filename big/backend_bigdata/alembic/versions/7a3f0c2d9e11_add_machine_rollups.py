@@ -0,0 +1,41 @@
+"""add machine rollups
+
+Revision ID: 7a3f0c2d9e11
+Revises: adb8b44ec9e6
+Create Date: 2026-10-18 10:05:12.431876
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "7a3f0c2d9e11"
+down_revision: Union[str, None] = "adb8b44ec9e6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('machine_rollups'):
+        op.create_table(
+            'machine_rollups',
+            sa.Column('machine_id', sa.String, primary_key=True),
+            sa.Column('bucket', sa.String(8), primary_key=True),
+            sa.Column('bucket_start', sa.DateTime(timezone=True), primary_key=True),
+            sa.Column('count', sa.Integer, nullable=False),
+            sa.Column('maintenance_count', sa.Integer, nullable=False),
+            sa.Column('temperature_min', sa.Float),
+            sa.Column('temperature_max', sa.Float),
+            sa.Column('temperature_sum', sa.Float, nullable=False),
+            sa.Column('humidity_min', sa.Float),
+            sa.Column('humidity_max', sa.Float),
+            sa.Column('humidity_sum', sa.Float, nullable=False),
+        )
+    index_names = {ix['name'] for ix in inspector.get_indexes('predictions')}
+    if 'ix_predictions_timestamp' not in index_names:
+        op.create_index('ix_predictions_timestamp', 'predictions', ['timestamp'])
+
+def downgrade() -> None:
+    op.drop_index('ix_predictions_timestamp', table_name='predictions')
+    op.drop_table('machine_rollups')
@@ -0,0 +1,85 @@
+"""typed prediction columns
+
+Revision ID: 9c4e2b7d1a36
+Revises: 7a3f0c2d9e11
+Create Date: 2026-10-18 11:32:47.902514
+
+Adds double precision temperature/humidity and a boolean needs_maintenance column
+next to the JSON features (the ones a database bootstrapped by the app already has
+are skipped), backfills them in bounded id ranges (each chunk commits on its own,
+so the table stays writable) and replaces the machine_id index with a composite
+(machine_id, timestamp DESC) index built CONCURRENTLY.
+"""
+from typing import Sequence, Union
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "9c4e2b7d1a36"
+down_revision: Union[str, None] = "7a3f0c2d9e11"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "10000"))
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    existing = {column['name'] for column in sa.inspect(conn).get_columns('predictions')}
+    # Nullable columns without a default are a catalog-only change
+    for column in (
+        sa.Column('temperature', sa.Float),
+        sa.Column('humidity', sa.Float),
+        sa.Column('needs_maintenance', sa.Boolean),
+    ):
+        if column.name not in existing:
+            op.add_column('predictions', column)
+
+    with op.get_context().autocommit_block():
+        max_id = conn.execute(sa.text("SELECT max(id) FROM predictions")).scalar() or 0
+        for low in range(0, max_id, BACKFILL_CHUNK_SIZE):
+            conn.execute(
+                sa.text(
+                    "UPDATE predictions SET "
+                    "temperature = (features->>'temperature')::double precision, "
+                    "humidity = (features->>'humidity')::double precision, "
+                    # Same rule as the old read path: exactly 0.5 didn't need maintenance
+                    "needs_maintenance = prediction > 0.5 "
+                    "WHERE id > :low AND id <= :high AND needs_maintenance IS NULL"
+                ),
+                {"low": low, "high": low + BACKFILL_CHUNK_SIZE},
+            )
+
+        op.create_index(
+            'ix_predictions_machine_id_timestamp',
+            'predictions',
+            ['machine_id', sa.text('"timestamp" DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # The composite index serves every machine_id lookup the old one did
+        op.drop_index(
+            'ix_predictions_machine_id',
+            table_name='predictions',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_predictions_machine_id',
+            'predictions',
+            ['machine_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_predictions_machine_id_timestamp',
+            table_name='predictions',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column('predictions', 'needs_maintenance')
+    op.drop_column('predictions', 'humidity')
+    op.drop_column('predictions', 'temperature')
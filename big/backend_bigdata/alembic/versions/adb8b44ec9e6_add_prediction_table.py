@@ -5,21 +5,18 @@ Revision ID: adb8b44ec9e6
 Revises: fdcd5fd0c717
 Create Date: 2025-12-10 23:47:08.992207
 
+This revision used to create ``predictions`` a third time. The table is created
+by 5f82a895b767, so it is now a no-op kept to preserve the revision chain.
 """
 from typing import Sequence, Union
-from alembic import op
-import sqlalchemy as sa
+
+revision: str = "adb8b44ec9e6"
+down_revision: Union[str, None] = "fdcd5fd0c717"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
-    op.create_table(
-        'predictions',
-        sa.Column('id', sa.Integer, primary_key=True),
-        sa.Column('machine_id', sa.String(length=50), nullable=False),
-        sa.Column('features', sa.JSON, nullable=False),
-        sa.Column('prediction', sa.Float, nullable=False),
-        sa.Column('model_version', sa.String(length=50), nullable=False),
-        sa.Column('timestamp', sa.DateTime, server_default=sa.func.now()),
-    )
+    pass
 
 def downgrade() -> None:
-    op.drop_table('predictions')
\ No newline at end of file
+    pass
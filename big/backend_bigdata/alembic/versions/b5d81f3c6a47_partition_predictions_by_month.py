@@ -0,0 +1,92 @@
+"""partition predictions by month
+
+Revision ID: b5d81f3c6a47
+Revises: 9c4e2b7d1a36
+Create Date: 2026-10-18 14:21:09.513027
+
+Turns ``predictions`` into a table range-partitioned on ``timestamp``. The existing
+table is not rewritten: it is attached as the ``predictions_legacy`` partition
+holding everything before the start of next month, after its constraints and
+indexes have been built online. Monthly partitions after that are created here for
+the next few months and from then on by app.db.partitions.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "b5d81f3c6a47"
+down_revision: Union[str, None] = "9c4e2b7d1a36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMADE_MONTHS = 3
+
+def _next_month(dt):
+    return (dt.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    now = datetime.now(timezone.utc)
+    cutoff = _next_month(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+
+    # Online preparation: these only take SHARE UPDATE EXCLUSIVE locks
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS predictions_legacy_id_timestamp '
+            'ON predictions (id, "timestamp")'
+        )
+        op.execute(
+            'ALTER TABLE predictions ADD CONSTRAINT predictions_legacy_range '
+            f'CHECK ("timestamp" IS NOT NULL AND "timestamp" < \'{cutoff.isoformat()}\') NOT VALID'
+        )
+        op.execute('ALTER TABLE predictions VALIDATE CONSTRAINT predictions_legacy_range')
+
+    # The swap itself is catalog-only
+    op.execute('ALTER TABLE predictions ALTER COLUMN "timestamp" SET NOT NULL')
+    op.execute('ALTER TABLE predictions RENAME TO predictions_legacy')
+    op.execute('ALTER INDEX IF EXISTS ix_predictions_machine_id_timestamp RENAME TO ix_predictions_legacy_machine_id_timestamp')
+    op.execute('ALTER INDEX IF EXISTS ix_predictions_timestamp RENAME TO ix_predictions_legacy_timestamp')
+    # Declared on the model, so a table bootstrapped by create_all already has it;
+    # index names are schema-wide and the partitioned one is created under this name later
+    op.execute('ALTER INDEX IF EXISTS ix_predictions_machine_pk_timestamp RENAME TO ix_predictions_legacy_machine_pk_timestamp')
+    op.execute(
+        'CREATE TABLE predictions (LIKE predictions_legacy INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE ("timestamp")'
+    )
+    op.execute('ALTER TABLE predictions ADD PRIMARY KEY (id, "timestamp")')
+    op.execute('CREATE INDEX ix_predictions_machine_id_timestamp ON predictions (machine_id, "timestamp" DESC)')
+    op.execute('CREATE INDEX ix_predictions_timestamp ON predictions ("timestamp")')
+    # Dropping the legacy partition later must not drop the id sequence with it
+    op.execute('ALTER SEQUENCE predictions_id_seq OWNED BY predictions.id')
+    op.execute(
+        'ALTER TABLE predictions ATTACH PARTITION predictions_legacy '
+        f'FOR VALUES FROM (MINVALUE) TO (\'{cutoff.isoformat()}\')'
+    )
+
+    start = cutoff
+    for _ in range(PREMADE_MONTHS):
+        end = _next_month(start)
+        op.execute(
+            f'CREATE TABLE IF NOT EXISTS predictions_p{start:%Y_%m} PARTITION OF predictions '
+            f'FOR VALUES FROM (\'{start.isoformat()}\') TO (\'{end.isoformat()}\')'
+        )
+        start = end
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute('ALTER TABLE predictions DETACH PARTITION predictions_legacy')
+    op.execute('ALTER TABLE predictions_legacy DROP CONSTRAINT IF EXISTS predictions_legacy_range')
+    op.execute('INSERT INTO predictions_legacy SELECT * FROM predictions')
+    op.execute('ALTER SEQUENCE predictions_id_seq OWNED BY predictions_legacy.id')
+    op.execute('DROP TABLE predictions CASCADE')
+    op.execute('ALTER TABLE predictions_legacy RENAME TO predictions')
+    op.execute('ALTER INDEX IF EXISTS ix_predictions_legacy_machine_id_timestamp RENAME TO ix_predictions_machine_id_timestamp')
+    op.execute('ALTER INDEX IF EXISTS ix_predictions_legacy_timestamp RENAME TO ix_predictions_timestamp')
+    op.execute('ALTER INDEX IF EXISTS ix_predictions_legacy_machine_pk_timestamp RENAME TO ix_predictions_machine_pk_timestamp')
+    op.execute('DROP INDEX IF EXISTS predictions_legacy_id_timestamp')
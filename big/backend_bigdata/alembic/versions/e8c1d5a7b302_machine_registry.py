@@ -0,0 +1,85 @@
+"""machine registry
+
+Revision ID: e8c1d5a7b302
+Revises: 3e9a6c1f5b28
+Create Date: 2026-10-18 21:07:15.640921
+
+Makes ``machines.name`` unique and registers every machine id already stored, adds
+the integer ``predictions.machine_pk`` referencing it, backfills it in bounded id
+ranges (each chunk commits on its own, so the table stays writable) and replaces
+the (machine_id, timestamp DESC) index with (machine_pk, timestamp DESC).
+"""
+from typing import Sequence, Union
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "e8c1d5a7b302"
+down_revision: Union[str, None] = "3e9a6c1f5b28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "10000"))
+
+def upgrade() -> None:
+    # The table was created early on but never written to; keep the oldest of any duplicates
+    op.execute(
+        "DELETE FROM machines WHERE name IS NULL OR id NOT IN "
+        "(SELECT min(id) FROM machines GROUP BY name)"
+    )
+    op.drop_index('ix_machines_name', table_name='machines', if_exists=True)
+    op.create_index('ix_machines_name', 'machines', ['name'], unique=True)
+    op.execute(
+        "INSERT INTO machines (name) SELECT DISTINCT machine_id FROM predictions "
+        "WHERE machine_id IS NOT NULL AND machine_id NOT IN (SELECT name FROM machines)"
+    )
+
+    conn = op.get_bind()
+    # Nullable column without a default: catalog-only, also on every partition.
+    # Databases bootstrapped by Base.metadata.create_all already have it
+    if 'machine_pk' not in {column['name'] for column in sa.inspect(conn).get_columns('predictions')}:
+        op.add_column('predictions', sa.Column('machine_pk', sa.Integer))
+
+    with op.get_context().autocommit_block():
+        max_id = conn.execute(sa.text("SELECT max(id) FROM predictions")).scalar() or 0
+        for low in range(0, max_id, BACKFILL_CHUNK_SIZE):
+            conn.execute(
+                sa.text(
+                    "UPDATE predictions SET machine_pk = "
+                    "(SELECT machines.id FROM machines WHERE machines.name = predictions.machine_id) "
+                    "WHERE id > :low AND id <= :high AND machine_pk IS NULL"
+                ),
+                {"low": low, "high": low + BACKFILL_CHUNK_SIZE},
+            )
+
+    if conn.dialect.name == "postgresql":
+        # Index names are schema-wide: one left on the legacy partition by a create_all
+        # bootstrap would make the IF NOT EXISTS below skip the partitioned index
+        owner = conn.execute(sa.text(
+            "SELECT tablename FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND indexname = 'ix_predictions_machine_pk_timestamp'"
+        )).scalar()
+        if owner is not None and owner != 'predictions':
+            op.execute('ALTER INDEX ix_predictions_machine_pk_timestamp RENAME TO ix_predictions_legacy_machine_pk_timestamp')
+
+    # CONCURRENTLY isn't available on a partitioned table; the build locks out writes
+    op.create_index(
+        'ix_predictions_machine_pk_timestamp',
+        'predictions',
+        ['machine_pk', sa.text('"timestamp" DESC')],
+        if_not_exists=True,
+    )
+    op.drop_index('ix_predictions_machine_id_timestamp', table_name='predictions', if_exists=True)
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_predictions_machine_id_timestamp',
+        'predictions',
+        ['machine_id', sa.text('"timestamp" DESC')],
+        if_not_exists=True,
+    )
+    op.drop_index('ix_predictions_machine_pk_timestamp', table_name='predictions', if_exists=True)
+    op.drop_column('predictions', 'machine_pk')
+    op.drop_index('ix_machines_name', table_name='machines')
+    op.create_index('ix_machines_name', 'machines', ['name'])
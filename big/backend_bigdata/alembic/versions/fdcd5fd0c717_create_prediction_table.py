@@ -4,22 +4,18 @@ Revision ID: fdcd5fd0c717
 Revises: 5f82a895b767
 Create Date: 2025-12-10 23:37:48.047209
 
+This revision used to create ``predictions`` a second time. The table is created
+by 5f82a895b767, so it is now a no-op kept to preserve the revision chain.
 """
 from typing import Sequence, Union
 
-from alembic import op
-from sqlalchemy import Column, Integer, Float, String, DateTime
+revision: str = "fdcd5fd0c717"
+down_revision: Union[str, None] = "5f82a895b767"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
-    op.create_table(
-        'predictions',
-        Column('id', Integer, primary_key=True),
-        Column('machine_id', String, nullable=False),
-        Column('temperature', Float, nullable=False),
-        Column('humidity', Float, nullable=False),
-        Column('prediction', Float, nullable=False),
-        Column('timestamp', DateTime, server_default=func.now()),
-    )
+    pass
 
 def downgrade() -> None:
-    op.drop_table('predictions')
\ No newline at end of file
+    pass
@@ -0,0 +1,237 @@
+"""Admission control: per-route-class concurrency limits with bounded wait queues.
+
+Requests are classified by path. ``ingest`` (/predict, /predict/batch), ``read``
+(history, machine and stats endpoints) and ``bulk`` (/predictions/import,
+/predictions/export and the ``stream=true`` exports of /history, /history/archive
+and /machine/{id}, which hold a connection for as long as the transfer takes) each
+have their own concurrency limit and wait queue per worker, so dashboard reads and
+bulk transfers can only hold a few of the database connections, and ingestion has
+priority: while requests of a higher class are queued, queued requests of a lower
+one are not admitted. Other paths (probes, /metrics, the SSE stream, admin) are not
+limited.
+
+A request that can't start right away is shed with a fast 503 and Retry-After
+instead of queueing when the queue is full, or when the estimated wait (queue
+position times the class's recent service time over its limit) already exceeds the
+class's ADMISSION_<CLASS>_MAX_WAIT_MS; a queued request that still hasn't started
+after that long is shed too. Bulk transfers take anything from a second to many
+minutes, so their durations are not averaged and they are only shed on a full
+queue or a timeout. Shed, queued and in-flight counts are exported per class.
+"""
+from collections import deque
+from typing import Optional
+from urllib.parse import parse_qsl
+import asyncio
+import math
+import os
+import time
+
+from app.prometheus_metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_SHED, ADMISSION_WAIT
+import logging
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Highest priority first; (method, path, whether path is a prefix, required query
+# parameter and its accepted values or None). Rules with a query parameter are
+# matched before the others.
+STREAM = ("stream", ("1", "true", "yes", "on"))
+ROUTE_CLASSES = {
+    "ingest": (
+        ("POST", "/predict", False, None),
+        ("POST", "/predict/batch", False, None),
+    ),
+    "read": (
+        ("GET", "/history", True, None),
+        ("GET", "/machine/", True, None),
+        ("GET", "/machines", False, None),
+        ("GET", "/stats", False, None),
+    ),
+    "bulk": (
+        ("POST", "/predictions/import", False, None),
+        ("GET", "/predictions/export", False, None),
+        ("GET", "/history", False, STREAM),
+        ("GET", "/history/archive", False, STREAM),
+        ("GET", "/machine/", True, STREAM),
+    ),
+}
+
+DEFAULTS = {
+    # concurrency, queue, max wait in ms
+    "ingest": (24, 256, 1000),
+    "read": (4, 32, 2000),
+    "bulk": (2, 8, 10000),
+}
+
+# Classes whose service time feeds the wait estimate
+ESTIMATED_CLASSES = ("ingest", "read")
+
+def _setting(name: str, setting: str, default):
+    return type(default)(os.getenv(f"ADMISSION_{name.upper()}_{setting}", str(default)))
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RouteClass:
+    """Concurrency limit and FIFO wait queue of one route class in this worker."""
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float, estimated: bool = True):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.estimated = estimated
+        self.in_flight = 0
+        self.waiters = deque()
+        # Moving average of how long an admitted request holds its slot
+        self.service_time = 0.05
+
+    def estimated_wait(self, position: int) -> float:
+        return position * self.service_time / self.limit if self.estimated else 0.0
+
+    def observe_service_time(self, seconds: float):
+        if self.estimated:
+            self.service_time += 0.1 * (seconds - self.service_time)
+
+class AdmissionController:
+    def __init__(self):
+        self.classes = [
+            RouteClass(
+                name,
+                _setting(name, "CONCURRENCY", DEFAULTS[name][0]),
+                _setting(name, "QUEUE", DEFAULTS[name][1]),
+                _setting(name, "MAX_WAIT_MS", DEFAULTS[name][2]) / 1000,
+                name in ESTIMATED_CLASSES,
+            )
+            for name in ROUTE_CLASSES
+        ]
+        self._by_name = {c.name: c for c in self.classes}
+        rules = [(name, *rule) for name, class_rules in ROUTE_CLASSES.items() for rule in class_rules]
+        self._rules = sorted(rules, key=lambda rule: rule[4] is None)
+
+    def classify(self, method: str, path: str, query_string: bytes = b"") -> Optional[RouteClass]:
+        query = None
+        for name, rule_method, rule_path, prefix, parameter in self._rules:
+            if method != rule_method or not (path.startswith(rule_path) if prefix else path == rule_path):
+                continue
+            if parameter is not None:
+                if query is None:
+                    query = dict(parse_qsl(query_string.decode("latin-1")))
+                if query.get(parameter[0], "").lower() not in parameter[1]:
+                    continue
+            return self._by_name[name]
+        return None
+
+    def _blocked(self, route_class: RouteClass) -> bool:
+        """Higher-priority classes with queued requests go first."""
+        for other in self.classes:
+            if other is route_class:
+                return False
+            if other.waiters:
+                return True
+        return False
+
+    def _dispatch(self):
+        for route_class in self.classes:
+            while route_class.waiters and route_class.in_flight < route_class.limit and not self._blocked(route_class):
+                waiter = route_class.waiters.popleft()
+                if waiter.done():
+                    continue
+                route_class.in_flight += 1
+                waiter.set_result(None)
+            ADMISSION_QUEUED.labels(route_class=route_class.name).set(len(route_class.waiters))
+            ADMISSION_IN_FLIGHT.labels(route_class=route_class.name).set(route_class.in_flight)
+
+    async def acquire(self, route_class: RouteClass):
+        """Wait for a slot; raises Shed when the request wouldn't start in time."""
+        name = route_class.name
+        if route_class.in_flight < route_class.limit and not route_class.waiters and not self._blocked(route_class):
+            route_class.in_flight += 1
+            ADMISSION_IN_FLIGHT.labels(route_class=name).set(route_class.in_flight)
+            ADMISSION_WAIT.labels(route_class=name).observe(0.0)
+            return
+        position = len(route_class.waiters) + 1
+        estimate = route_class.estimated_wait(position)
+        if len(route_class.waiters) >= route_class.max_queue:
+            raise Shed("queue_full", estimate)
+        if estimate > route_class.max_wait:
+            raise Shed("deadline", estimate)
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(waiter)
+        ADMISSION_QUEUED.labels(route_class=name).set(len(route_class.waiters))
+        try:
+            await asyncio.wait_for(waiter, timeout=route_class.max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.done() or waiter.cancelled():
+                self._forget(route_class, waiter)
+                raise Shed("timeout", route_class.estimated_wait(len(route_class.waiters) + 1))
+            # Otherwise the slot was handed over just as the wait timed out: keep it
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(route_class, 0.0)
+            else:
+                self._forget(route_class, waiter)
+            raise
+        ADMISSION_WAIT.labels(route_class=name).observe(time.perf_counter() - start)
+
+    def _forget(self, route_class: RouteClass, waiter):
+        try:
+            route_class.waiters.remove(waiter)
+        except ValueError:
+            pass
+        # Lower-priority classes may have been held back by this waiter
+        self._dispatch()
+
+    def release(self, route_class: RouteClass, service_time: float):
+        route_class.in_flight -= 1
+        if service_time:
+            route_class.observe_service_time(service_time)
+        self._dispatch()
+
+controller = AdmissionController()
+
+async def _reject(send, reason: str, retry_after: float):
+    body = f'{{"detail":"Server busy ({reason}), retry later"}}'.encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; the slot is held until the response has been sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = None
+        if ADMISSION_ENABLED and scope["type"] == "http":
+            route_class = controller.classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await controller.acquire(route_class)
+        except Shed as e:
+            ADMISSION_SHED.labels(route_class=route_class.name, reason=e.reason).inc()
+            logger.warning(f"Shed {scope['method']} {scope['path']} ({route_class.name}): {e.reason}")
+            await _reject(send, e.reason, e.retry_after)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(route_class, time.perf_counter() - start)
@@ -1,3 +1,6 @@
 from . import predict
+from . import admin
+from . import stream
+from . import bulk
 
-__all__ = ["predict"]
+__all__ = ["predict", "admin", "stream", "bulk"]
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from app.db import crud
+from app.instrumentation import PROFILE_DIR
+from app.model_loader import model_wrapper
+import hmac
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin")
+
+# Admin calls must send it in the X-Admin-Token header; without it the endpoints are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+class ModelStatus(BaseModel):
+    active_version: Optional[str]
+    available_versions: List[str]
+
+def _check_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/model", response_model=ModelStatus)
+async def get_model_status(x_admin_token: Optional[str] = Header(None)):
+    """List the model versions found in MODEL_DIR and the active one"""
+    _check_token(x_admin_token)
+    return ModelStatus(
+        active_version=model_wrapper.version,
+        available_versions=model_wrapper.available_versions()
+    )
+
+@router.post("/model/{version}", response_model=ModelStatus)
+async def swap_model(version: str, x_admin_token: Optional[str] = Header(None)):
+    """Load a model version and swap it in without a restart; the other workers follow within MODEL_SYNC_INTERVAL"""
+    _check_token(x_admin_token)
+    if version not in model_wrapper.available_versions():
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version}")
+    try:
+        # Loading reads from disk, keep it off the event loop
+        await run_in_threadpool(model_wrapper.swap, version)
+    except Exception as e:
+        logger.error(f"Failed to load model {version}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to load model")
+    return ModelStatus(
+        active_version=model_wrapper.version,
+        available_versions=model_wrapper.available_versions()
+    )
+
+@router.post("/rollups/rebuild")
+async def rebuild_rollups(x_admin_token: Optional[str] = Header(None)):
+    """Recompute the machine rollup tables from the raw predictions"""
+    _check_token(x_admin_token)
+    try:
+        max_id = await crud.rebuild_rollups()
+    except Exception as e:
+        logger.error(f"Failed to rebuild rollups: {e}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild rollups")
+    logger.info(f"Rollups rebuilt up to prediction id {max_id}")
+    return {"rebuilt_through_id": max_id}
+
+@router.get("/profiles", response_model=List[str])
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Saved request profiles (requests sent with X-Profile: 1 that exceeded PROFILE_SLOW_MS), newest first"""
+    _check_token(x_admin_token)
+    if not PROFILE_DIR.is_dir():
+        return []
+    return sorted((p.name for p in PROFILE_DIR.glob("*.folded")), reverse=True)
+
+@router.get("/profiles/{name}", response_class=PlainTextResponse)
+async def get_profile(name: str, x_admin_token: Optional[str] = Header(None)):
+    """One profile in folded-stack format, ready for flamegraph.pl or speedscope"""
+    _check_token(x_admin_token)
+    path = PROFILE_DIR / name
+    if "/" in name or path.suffix != ".folded" or not path.is_file():
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return PlainTextResponse(path.read_text())
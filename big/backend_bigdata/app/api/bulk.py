@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from app import bulk_io
+from app.bulk_io import BulkImportError, EXPORT_MEDIA_TYPES, IMPORT_MAX_BYTES
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/predictions")
+
+class ImportSummary(BaseModel):
+    rows_imported: int
+    rows_rejected: int
+    batches: int
+
+async def _spool_upload(request: Request, suffix: str) -> Path:
+    """Copy the request body to a temporary file without holding it in memory"""
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        path = Path(f.name)
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Upload larger than {IMPORT_MAX_BYTES} bytes")
+                f.write(chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+    return path
+
+@router.post("/import", response_model=ImportSummary)
+async def import_predictions(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Score and store historical readings sent as the raw request body.
+
+    Columns: machine_id (or machineId), temperature, humidity and an optional
+    ISO 8601 timestamp (UTC when it has no offset; the import time when empty).
+    Incomplete rows are skipped and counted in ``rows_rejected``.
+
+    Imports are not deduplicated (a retried upload is stored again), so an
+    ``Idempotency-Key`` header is refused rather than silently ignored.
+    """
+    if idempotency_key is not None:
+        raise HTTPException(status_code=400, detail="Imports are not idempotent: a retried upload is stored again")
+    path = None
+    try:
+        path = await _spool_upload(request, f".{format}")
+        return ImportSummary(**await bulk_io.import_file(path, format))
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to import predictions: {e}")
+        raise HTTPException(status_code=500, detail="Failed to import predictions")
+    finally:
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+@router.get("/export")
+async def export_predictions(
+    format: str = Query("csv", pattern="^(csv|parquet|arrow)$"),
+    machine_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Stream predictions (oldest first) as CSV, Parquet or an Arrow IPC stream"""
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        bulk_io.export_stream(format, machine_id=machine_id, start=start, end=end),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="predictions.{extension}"'},
+    )
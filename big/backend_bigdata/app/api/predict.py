@@ -1,22 +1,44 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from app.db import crud
-from app.kafka_producer import send_prediction_event
-from app.prometheus_metrics import PREDICTION_COUNTER, PREDICTION_LATENCY
+from urllib.parse import urlencode
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import cache, idempotency, serialization
+from app.db import crud, archive
+from app.db.session import get_db
+from app.kafka_producer import queue_prediction_event, queue_prediction_events
+from app.live_stats import live_stats
+from app.broadcast import broadcaster, live_event
+from app.model_loader import model_wrapper
+from app.scoring import score_batch
+from app.write_behind import WRITE_BEHIND_ENABLED, WriteBehindFull, write_behind
+from app.instrumentation import bind, stage
+from app.prometheus_metrics import PREDICTION_COUNTER, record_prediction_latency
 import time
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "10000"))
+HISTORY_DEFAULT_PAGE_SIZE = int(os.getenv("HISTORY_DEFAULT_PAGE_SIZE", "100"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "10000"))
+HISTORY_FORMAT_PATTERN = f"^({'|'.join(serialization.HISTORY_FORMATS)})$"
+
 # Request/Response Models
 class PredictRequest(BaseModel):
     machineId: str
     temperature: float
     humidity: float
+    # When the reading was taken; (machineId, timestamp) then deduplicates retries
+    timestamp: Optional[datetime] = None
 
 class PredictResponse(BaseModel):
     prediction: int  # 0 = No maintenance needed, 1 = Maintenance needed
@@ -24,7 +46,7 @@ class PredictResponse(BaseModel):
     confidence: float
     timestamp: datetime
     model_version: str = "v1.0"
-    kafka_sent: bool = False
+    kafka_sent: bool = False  # accepted into the Kafka outbox
 
 class PredictionHistory(BaseModel):
     id: int
@@ -40,6 +62,9 @@ class StatsResponse(BaseModel):
     unique_machines: int
     avg_prediction: float
     latest_prediction: Optional[datetime]
+    # Approximate p50/p90/p95/p99, only reported by the in-memory aggregator
+    temperature_quantiles: Optional[Dict[str, float]] = None
+    humidity_quantiles: Optional[Dict[str, float]] = None
 
 class MachineInfo(BaseModel):
     machine_id: str
@@ -47,58 +72,125 @@ class MachineInfo(BaseModel):
     last_prediction: Optional[float]
     last_timestamp: Optional[datetime]
 
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    count: int
+    maintenance_count: int
+    temperature_min: Optional[float]
+    temperature_mean: Optional[float]
+    temperature_max: Optional[float]
+    humidity_min: Optional[float]
+    humidity_mean: Optional[float]
+    humidity_max: Optional[float]
+
 # Endpoints
+def _replayed(content) -> JSONResponse:
+    """The stored response of an earlier request with the same idempotency key"""
+    return JSONResponse(content, headers={"Idempotent-Replayed": "true"})
+
 @router.post("/predict", response_model=PredictResponse)
-async def predict(request: PredictRequest):
-    start_time = time.time()
-    
+async def predict(
+    request: PredictRequest,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=idempotency.IDEMPOTENCY_KEY_MAX_LENGTH),
+    db: AsyncSession = Depends(get_db),
+):
+    """Score one reading and store it.
+
+    A retry carrying the same ``Idempotency-Key`` header, or the same machineId and
+    reading ``timestamp``, gets the original response back without a second row or
+    Kafka event.
+    """
+    start_time = time.perf_counter()
+    bind(machine_id=request.machineId)
+
+    key = None
+    if idempotency_key is not None:
+        key = idempotency.header_key("predict", idempotency_key)
+    elif request.timestamp is not None:
+        key = idempotency.reading_key(request.machineId, request.timestamp)
+    if key is not None:
+        cached = idempotency.cached_responses([key])
+        if cached:
+            return _replayed(cached[key])
+
     # Increment prediction counter
     PREDICTION_COUNTER.inc()
     
-    # ML Model Logic: Determine if maintenance is needed (0 or 1)
-    # Rule-based prediction (replace with actual ML model):
-    # - High temperature (> 80°C) OR high humidity (> 70%) = needs maintenance
-    # - Very high temperature (> 90°C) = definitely needs maintenance
-    # - Calculate a risk score and threshold it
-    
-    risk_score = (request.temperature / 100) * 0.6 + (request.humidity / 100) * 0.4
-    
-    # Add additional risk factors
-    if request.temperature > 90:
-        risk_score += 0.3
-    elif request.temperature > 80:
-        risk_score += 0.15
-    
-    if request.humidity > 70:
-        risk_score += 0.1
-    
-    # Clamp confidence between 0 and 1
-    confidence = min(max(risk_score, 0.0), 1.0)
-    
-    # Threshold: if risk score > 0.5, maintenance is needed
-    needs_maintenance = confidence > 0.5
+    # Score through the active model (rule-based v1.0 unless an artifact is loaded)
+    with stage("score"):
+        output = model_wrapper.predict([[request.temperature, request.humidity]])
+    confidence = float(output.confidence[0])
+    needs_maintenance = bool(output.needs_maintenance[0])
     prediction_value = 1 if needs_maintenance else 0
-    
-    model_version = "v1.0"
-    timestamp = datetime.utcnow()
+    model_version = output.model_version
+    timestamp = idempotency.as_utc(request.timestamp) if request.timestamp is not None else datetime.utcnow()
 
     record = {
         "machine_id": request.machineId,
         "features": {"temperature": request.temperature, "humidity": request.humidity},
         "prediction": prediction_value,
+        "temperature": request.temperature,
+        "humidity": request.humidity,
+        "needs_maintenance": needs_maintenance,
         "model_version": model_version,
     }
 
-    # Save to database
-    try:
-        created = crud.create_prediction(record)
-        logger.info(f"Prediction saved to database for machine {request.machineId}: maintenance={'needed' if needs_maintenance else 'not needed'}")
-    except Exception as e:
-        logger.error(f"Failed to save prediction: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save prediction")
+    if request.timestamp is not None:
+        record["timestamp"] = timestamp
+
+    # Save to database; the id is only known here when the row is stored synchronously
+    prediction_id = None
+    if WRITE_BEHIND_ENABLED and key is None:
+        # Journaled now, committed with the next group commit (which also updates live stats/stream).
+        # Keyed requests take the synchronous path so the key is claimed before answering.
+        record["timestamp"] = timestamp
+        try:
+            with stage("db_write"):
+                await write_behind.submit(record, round(confidence, 4))
+        except WriteBehindFull:
+            raise HTTPException(status_code=503, detail="Too many predictions waiting to be stored", headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Failed to journal prediction: {e}")
+            raise HTTPException(status_code=500, detail="Failed to save prediction")
+    else:
+        try:
+            with stage("db_write"):
+                if key is None:
+                    created = await crud.create_prediction(db, record)
+                else:
+                    stored_response = jsonable_encoder(PredictResponse(
+                        prediction=prediction_value,
+                        needs_maintenance=needs_maintenance,
+                        confidence=round(confidence, 4),
+                        timestamp=timestamp,
+                        model_version=model_version,
+                    ))
+                    created = (await idempotency.store(db, [record], [key], [stored_response]))[0]
+                    if created is None:
+                        original = await idempotency.stored_responses(db, [key])
+            if created is None:
+                if key not in original:
+                    # The key expired and was pruned between the insert and the lookup
+                    raise HTTPException(status_code=409, detail="Idempotency key expired during the request, retry")
+                return _replayed(original[key])
+            # Lazy arguments: nothing is formatted when the record is sampled out
+            logger.info(
+                "Prediction saved to database for machine %s: maintenance=%s",
+                request.machineId, "needed" if needs_maintenance else "not needed",
+                extra={"needs_maintenance": needs_maintenance},
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save prediction: {e}")
+            raise HTTPException(status_code=500, detail="Failed to save prediction")
+        prediction_id = created.id
+        live_stats.observe([(created.id, request.machineId, created.timestamp, request.temperature, request.humidity, prediction_value)])
+        broadcaster.publish([live_event(created.id, created.timestamp, record, round(confidence, 4))])
 
     # Send to Kafka
     kafka_event = {
+        "id": prediction_id,
         "machine_id": request.machineId,
         "temperature": request.temperature,
         "humidity": request.humidity,
@@ -111,114 +203,371 @@ async def predict(request: PredictRequest):
     
     kafka_sent = False
     try:
-        kafka_sent = send_prediction_event(kafka_event)
+        with stage("kafka_publish"):
+            kafka_sent = await queue_prediction_event(kafka_event)
     except Exception as e:
-        logger.warning(f"Failed to send to Kafka (non-critical): {e}")
-    
+        logger.warning(f"Failed to queue for Kafka (non-critical): {e}")
+
+    with stage("serialize"):
+        content = jsonable_encoder(PredictResponse(
+            prediction=prediction_value,
+            needs_maintenance=needs_maintenance,
+            confidence=round(confidence, 4),
+            timestamp=timestamp,
+            model_version=model_version,
+            kafka_sent=kafka_sent
+        ))
+        response = JSONResponse(content)
+    if key is not None:
+        # Retries get the Kafka outcome too, not the response stored with the row
+        with stage("db_keys"):
+            await idempotency.complete(db, {key: content})
+
     # Record latency
-    PREDICTION_LATENCY.observe(time.time() - start_time)
-
-    return PredictResponse(
-        prediction=prediction_value,
-        needs_maintenance=needs_maintenance,
-        confidence=round(confidence, 4),
-        timestamp=timestamp,
-        model_version=model_version,
-        kafka_sent=kafka_sent
+    record_prediction_latency(start_time)
+    return response
+
+@router.post("/predict/batch", response_model=List[PredictResponse])
+async def predict_batch(
+    requests: List[PredictRequest],
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=idempotency.IDEMPOTENCY_KEY_MAX_LENGTH),
+    db: AsyncSession = Depends(get_db),
+):
+    """Score a burst of readings at once and store them with a single bulk insert.
+
+    Deduplicated per reading like /predict: the ``Idempotency-Key`` header covers the
+    whole batch (a retry must send the same readings in the same order), otherwise
+    readings with a ``timestamp`` are keyed by (machineId, timestamp).
+    """
+    start_time = time.perf_counter()
+
+    if not requests:
+        return []
+    if len(requests) > PREDICT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(requests)} readings (max {PREDICT_BATCH_MAX_SIZE})"
+        )
+
+    if idempotency_key is not None:
+        keys = [idempotency.header_key("batch", idempotency_key, i) for i in range(len(requests))]
+    else:
+        keys = [
+            idempotency.reading_key(r.machineId, r.timestamp) if r.timestamp is not None else None
+            for r in requests
+        ]
+    replayed = idempotency.cached_responses(keys)
+    pending = [i for i, key in enumerate(keys) if key is None or key not in replayed]
+    if not pending:
+        return _replayed([replayed[key] for key in keys])
+    pending_requests = [requests[i] for i in pending]
+    pending_keys = [keys[i] for i in pending]
+    keyed = any(key is not None for key in pending_keys)
+
+    PREDICTION_COUNTER.inc(len(pending))
+
+    with stage("score"):
+        scored = score_batch(
+            [r.machineId for r in pending_requests],
+            [r.temperature for r in pending_requests],
+            [r.humidity for r in pending_requests],
+            [idempotency.as_utc(r.timestamp) if r.timestamp else None for r in pending_requests] if keyed else None,
+        )
+
+    # Save to database in one round trip
+    try:
+        with stage("db_write"):
+            if keyed:
+                stored_responses = [
+                    jsonable_encoder(PredictResponse(
+                        prediction=1 if needs else 0,
+                        needs_maintenance=needs,
+                        confidence=confidence,
+                        timestamp=reading_time,
+                        model_version=scored.model_version,
+                    )) if key is not None else None
+                    for key, needs, confidence, reading_time in zip(
+                        pending_keys, scored.needs_maintenance, scored.confidences, scored.timestamps
+                    )
+                ]
+                rows = await idempotency.store(db, scored.records, pending_keys, stored_responses)
+                duplicates = [key for key, row in zip(pending_keys, rows) if row is None]
+                if duplicates:
+                    replayed.update(await idempotency.stored_responses(db, duplicates))
+            else:
+                rows = await crud.create_predictions_bulk(db, scored.records)
+        logger.info("Batch of %d predictions saved to database", len(scored.records), extra={"rows": len(scored.records)})
+    except Exception as e:
+        logger.error(f"Failed to save prediction batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save predictions")
+
+    # Only rows stored by this request are observed, streamed and published
+    fresh = [j for j, row in enumerate(rows) if row is not None]
+    live_stats.observe(
+        (rows[j].id, scored.records[j]["machine_id"], rows[j].timestamp, scored.records[j]["temperature"],
+         scored.records[j]["humidity"], scored.records[j]["prediction"])
+        for j in fresh
+    )
+    broadcaster.publish(
+        live_event(rows[j].id, rows[j].timestamp, scored.records[j], scored.confidences[j])
+        for j in fresh
     )
 
+    kafka_sent = [False] * len(fresh)
+    try:
+        with stage("kafka_publish"):
+            kafka_sent = await queue_prediction_events([{**scored.kafka_events[j], "id": rows[j].id} for j in fresh])
+    except Exception as e:
+        logger.warning(f"Failed to queue batch for Kafka (non-critical): {e}")
+    sent_by_index = dict(zip(fresh, kafka_sent))
+
+    with stage("serialize"):
+        results = [None] * len(requests)
+        completed = {}
+        for j, i in enumerate(pending):
+            if j in sent_by_index:
+                results[i] = jsonable_encoder(PredictResponse(
+                    prediction=1 if scored.needs_maintenance[j] else 0,
+                    needs_maintenance=scored.needs_maintenance[j],
+                    confidence=scored.confidences[j],
+                    timestamp=scored.timestamps[j],
+                    model_version=scored.model_version,
+                    kafka_sent=sent_by_index[j]
+                ))
+                if pending_keys[j] is not None:
+                    completed[pending_keys[j]] = results[i]
+        # Repeats of a key stored by this request get its final response as well
+        replayed.update((key, response) for key, response in completed.items() if key in replayed)
+        for i, key in enumerate(keys):
+            if key is not None and key in replayed:
+                results[i] = replayed[key]
+        headers = {"Idempotent-Replayed": "true"} if replayed else None
+        response = JSONResponse(results, headers=headers)
+    if completed:
+        # Retries get the Kafka outcome too, not the responses stored with the rows
+        with stage("db_keys"):
+            await idempotency.complete(db, completed)
+    if None in results:
+        # A duplicate's key expired and was pruned before its response was read; the
+        # readings stored by this request are replayed to the retry
+        raise HTTPException(status_code=409, detail="Idempotency key expired during the request, retry")
+
+    record_prediction_latency(start_time)
+    return response
+
+async def _ndjson_lines(rows):
+    async for p in rows:
+        yield serialization.ndjson_line(p)
+
+def _encode_rows(rows, fmt: str):
+    with stage("serialize"):
+        try:
+            return serialization.encode_rows(rows, fmt)
+        except serialization.FormatUnavailable as e:
+            raise HTTPException(status_code=406, detail=str(e))
+
+async def _history_response(db: AsyncSession, request: Request, machine_id: Optional[str], limit: int,
+                      after_id: Optional[int], before_timestamp: Optional[datetime],
+                      before_id: Optional[int], start: Optional[datetime],
+                      end: Optional[datetime], stream: bool, fmt: str):
+    """Shared keyset pagination / NDJSON export for /history and /machine/{id}.
+
+    Rows are encoded straight from the query result (app.serialization) in ``fmt``.
+    """
+    filters = dict(
+        machine_id=machine_id,
+        after_id=after_id,
+        before_timestamp=before_timestamp,
+        before_id=before_id,
+        start=start,
+        end=end,
+    )
+    if stream:
+        # Rows are pulled through a server-side cursor as the client reads them
+        return StreamingResponse(
+            _ndjson_lines(crud.iter_predictions(primary=db.info.get("primary", False), **filters)),
+            media_type="application/x-ndjson"
+        )
+
+    async def produce():
+        rows = await crud.get_predictions_page(db, limit=limit, **filters)
+        headers = {}
+        if len(rows) == limit:
+            last = rows[-1]
+            if before_timestamp is not None:
+                headers["X-Next-Cursor"] = urlencode(
+                    {"before_timestamp": last.timestamp.isoformat(), "before_id": last.id}
+                )
+            else:
+                headers["X-Next-Cursor"] = urlencode({"after_id": last.id})
+        body, _ = _encode_rows(rows, fmt)
+        return body, headers
+
+    media_type = "application/msgpack" if fmt == "msgpack" else "application/json"
+    if machine_id is None:
+        return await cache.cached_json_response(request, "history", cache.GLOBAL_SCOPE, produce, media_type)
+    return await cache.cached_json_response(request, "machine", cache.machine_scope(machine_id), produce, media_type)
+
 @router.get("/history", response_model=List[PredictionHistory])
-async def get_history():
-    """Get all prediction history"""
+async def get_history(
+    request: Request,
+    limit: int = Query(HISTORY_DEFAULT_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    before_timestamp: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    stream: bool = False,
+    format: str = Query("json", pattern=HISTORY_FORMAT_PATTERN),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get prediction history.
+
+    Returns at most ``limit`` rows (HISTORY_DEFAULT_PAGE_SIZE by default). Page with
+    ``after_id`` (oldest first) or ``before_timestamp`` (newest first); the cursor for
+    the next page is returned in the ``X-Next-Cursor`` header. ``stream=true`` exports
+    every matching row as NDJSON. Pages are cached until the next write and carry an ETag.
+    ``format=columnar`` (one array per column) or ``format=msgpack`` return a more
+    compact body.
+    """
     try:
-        predictions = crud.get_all_predictions()
-        return [
-            PredictionHistory(
-                id=p.id,
-                machine_id=p.machine_id,
-                features=p.features if p.features else {},
-                prediction=int(p.prediction) if p.prediction in [0, 1] else (1 if p.prediction > 0.5 else 0),
-                needs_maintenance=bool(p.prediction >= 1 or p.prediction > 0.5),
-                model_version=p.model_version or "v1.0",
-                timestamp=p.timestamp
-            )
-            for p in predictions
-        ]
+        return await _history_response(db, request, None, limit, after_id, before_timestamp,
+                                 before_id, start, end, stream, format)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch history: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch history")
 
-@router.get("/stats", response_model=StatsResponse)
-async def get_stats():
-    """Get prediction statistics"""
+@router.get("/history/archive", response_model=List[PredictionHistory])
+async def get_archived_history(
+    machine_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    stream: bool = False,
+    format: str = Query("json", pattern=HISTORY_FORMAT_PATTERN),
+):
+    """Read-only access to predictions that retention moved to Parquet (oldest first)"""
+    filters = dict(machine_id=machine_id, start=start, end=end, after_id=after_id)
     try:
-        predictions = crud.get_all_predictions()
-        if not predictions:
-            return StatsResponse(
-                total_predictions=0,
-                unique_machines=0,
-                avg_prediction=0.0,
-                latest_prediction=None
+        if stream:
+            return StreamingResponse(
+                _ndjson_lines(iterate_in_threadpool(archive.iter_archived(**filters))),
+                media_type="application/x-ndjson"
             )
-        
-        unique_machines = len(set(p.machine_id for p in predictions))
-        avg_pred = sum(p.prediction for p in predictions) / len(predictions)
-        latest = max(p.timestamp for p in predictions)
-        
+        rows = await run_in_threadpool(lambda: list(archive.iter_archived(limit=limit, **filters)))
+        body, media_type = _encode_rows(rows, format)
+        return Response(content=body, media_type=media_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to read archived history: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read archived history")
+
+@router.get("/stats", response_model=StatsResponse)
+async def get_stats(request: Request, db: AsyncSession = Depends(get_db)):
+    """Get prediction statistics (from memory once the live aggregator is seeded)"""
+    if live_stats.ready:
+        return StatsResponse(**live_stats.stats())
+
+    async def produce():
+        stats = await crud.get_prediction_stats(db)
         return StatsResponse(
-            total_predictions=len(predictions),
-            unique_machines=unique_machines,
-            avg_prediction=round(avg_pred, 4),
-            latest_prediction=latest
-        )
+            total_predictions=stats.total_predictions,
+            unique_machines=stats.unique_machines,
+            avg_prediction=round(float(stats.avg_prediction or 0.0), 4),
+            latest_prediction=stats.latest_prediction
+        ), {}
+
+    try:
+        return await cache.cached_json_response(request, "stats", cache.GLOBAL_SCOPE, produce)
     except Exception as e:
         logger.error(f"Failed to fetch stats: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch stats")
 
 @router.get("/machines", response_model=List[MachineInfo])
-async def get_machines():
+async def get_machines(request: Request, db: AsyncSession = Depends(get_db)):
     """Get all unique machines with their prediction info"""
+    if live_stats.ready:
+        return [MachineInfo(**m) for m in live_stats.machine_summaries()]
+
+    async def produce():
+        return [
+            MachineInfo(
+                machine_id=m.machine_id,
+                prediction_count=m.prediction_count,
+                last_prediction=m.last_prediction,
+                last_timestamp=m.last_timestamp
+            )
+            for m in await crud.get_machine_summaries(db)
+        ], {}
+
     try:
-        predictions = crud.get_all_predictions()
-        machines_dict = {}
-        
-        for p in predictions:
-            if p.machine_id not in machines_dict:
-                machines_dict[p.machine_id] = {
-                    "machine_id": p.machine_id,
-                    "prediction_count": 0,
-                    "last_prediction": None,
-                    "last_timestamp": None
-                }
-            machines_dict[p.machine_id]["prediction_count"] += 1
-            if machines_dict[p.machine_id]["last_timestamp"] is None or p.timestamp > machines_dict[p.machine_id]["last_timestamp"]:
-                machines_dict[p.machine_id]["last_prediction"] = p.prediction
-                machines_dict[p.machine_id]["last_timestamp"] = p.timestamp
-        
-        return [MachineInfo(**m) for m in machines_dict.values()]
+        return await cache.cached_json_response(request, "machines", cache.GLOBAL_SCOPE, produce)
     except Exception as e:
         logger.error(f"Failed to fetch machines: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch machines")
 
 @router.get("/machine/{machine_id}", response_model=List[PredictionHistory])
-async def get_machine_predictions(machine_id: str):
-    """Get predictions for a specific machine"""
+async def get_machine_predictions(
+    machine_id: str,
+    request: Request,
+    limit: int = Query(HISTORY_DEFAULT_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    before_timestamp: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    stream: bool = False,
+    format: str = Query("json", pattern=HISTORY_FORMAT_PATTERN),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get predictions for a specific machine (same paging and format options as /history)"""
+    bind(machine_id=machine_id)
     try:
-        predictions = crud.get_all_predictions()
-        machine_predictions = [p for p in predictions if p.machine_id == machine_id]
-        
+        return await _history_response(db, request, machine_id, limit, after_id, before_timestamp,
+                                 before_id, start, end, stream, format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to fetch machine predictions: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch machine predictions")
+
+@router.get("/machine/{machine_id}/timeseries", response_model=List[TimeseriesPoint])
+async def get_machine_timeseries(
+    machine_id: str,
+    request: Request,
+    bucket: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Get per-bucket telemetry for a machine from the rollup table (bucket: minute, hour or day)"""
+    bind(machine_id=machine_id)
+    if bucket not in crud.ROLLUP_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(crud.ROLLUP_BUCKETS)}")
+
+    async def produce():
+        rollups = await crud.get_machine_timeseries(db, machine_id, bucket=bucket, start=start, end=end)
         return [
-            PredictionHistory(
-                id=p.id,
-                machine_id=p.machine_id,
-                features=p.features if p.features else {},
-                prediction=int(p.prediction) if p.prediction in [0, 1] else (1 if p.prediction > 0.5 else 0),
-                needs_maintenance=bool(p.prediction >= 1 or p.prediction > 0.5),
-                model_version=p.model_version or "v1.0",
-                timestamp=p.timestamp
+            TimeseriesPoint(
+                bucket_start=r.bucket_start,
+                count=r.count,
+                maintenance_count=r.maintenance_count,
+                temperature_min=r.temperature_min,
+                temperature_mean=r.temperature_sum / r.count if r.temperature_max is not None else None,
+                temperature_max=r.temperature_max,
+                humidity_min=r.humidity_min,
+                humidity_mean=r.humidity_sum / r.count if r.humidity_max is not None else None,
+                humidity_max=r.humidity_max
             )
-            for p in machine_predictions
-        ]
+            for r in rollups
+        ], {}
+
+    try:
+        return await cache.cached_json_response(request, "timeseries", cache.machine_scope(machine_id), produce)
     except Exception as e:
-        logger.error(f"Failed to fetch machine predictions: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch machine predictions")
\ No newline at end of file
+        logger.error(f"Failed to fetch machine timeseries: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch machine timeseries")
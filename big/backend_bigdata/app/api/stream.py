@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.broadcast import broadcaster
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/stream")
+
+# Comment lines keep proxies from closing idle connections
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+async def _sse_events(request: Request, machine_id: Optional[str]):
+    # Subscribed only once the response is being sent: a client gone before that
+    # never starts the generator and so leaves no subscription behind
+    subscription = broadcaster.subscribe(machine_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            # Write-behind rows are published before they have an id
+            event_id = f"id: {event['id']}\n" if event["id"] is not None else ""
+            yield f"{event_id}event: prediction\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+@router.get("/predictions")
+async def stream_predictions(request: Request, machine_id: Optional[str] = None):
+    """Server-Sent Events feed of new predictions, optionally for a single machine"""
+    return StreamingResponse(
+        _sse_events(request, machine_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
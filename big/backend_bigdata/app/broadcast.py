@@ -0,0 +1,198 @@
+"""Fan-out of newly stored predictions to /stream/predictions subscribers.
+
+Every worker follows the ``predictions`` Kafka topic that all writers publish to
+(API workers, write-behind, the sensor ingestion consumer), so a client sees every
+new prediction whichever process stored it. The relay is a thread with its own
+KafkaConsumer that reads from the end of each partition without a consumer group;
+it starts with the first subscriber, stops once the last one has been gone for
+STREAM_RELAY_IDLE_SECONDS and hands events to the event loop, where every
+connected client gets them from its own bounded queue: N open dashboards cost N
+queue puts instead of N polling loops against the database. A client that stops
+reading loses its oldest events rather than holding memory or slowing the writers
+down. Bulk imports are historical rows and are not streamed.
+
+STREAM_SOURCE=local fans out only what this process stored, without Kafka (a
+single-process development server).
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import os
+import threading
+
+from kafka import KafkaConsumer, TopicPartition
+from kafka.errors import KafkaError
+
+from app.kafka_producer import KAFKA_BOOTSTRAP_SERVERS, KAFKA_TOPIC_PREDICTIONS
+from app.prometheus_metrics import STREAM_SUBSCRIBERS, STREAM_EVENTS_DROPPED
+import logging
+
+logger = logging.getLogger(__name__)
+
+STREAM_CLIENT_BUFFER = int(os.getenv("STREAM_CLIENT_BUFFER", "256"))
+# "kafka" (every process's predictions) or "local" (this process's only)
+STREAM_SOURCE = os.getenv("STREAM_SOURCE", "kafka").lower()
+STREAM_RELAY_RETRY_SECONDS = float(os.getenv("STREAM_RELAY_RETRY_SECONDS", "5"))
+# The relay outlives its last subscriber this long, so reconnecting clients don't restart it
+STREAM_RELAY_IDLE_SECONDS = float(os.getenv("STREAM_RELAY_IDLE_SECONDS", "30"))
+
+def live_event(prediction_id: int, timestamp: datetime, record: Dict[str, Any], confidence: float) -> Dict[str, Any]:
+    """/stream/predictions payload: a PredictionHistory row plus the confidence"""
+    return {
+        "id": prediction_id,
+        "machine_id": record["machine_id"],
+        "features": record["features"],
+        "prediction": record["prediction"],
+        "needs_maintenance": record["needs_maintenance"],
+        "model_version": record["model_version"],
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "confidence": confidence,
+    }
+
+def event_from_message(value: dict) -> Dict[str, Any]:
+    """/stream/predictions payload of a predictions topic message
+
+    ``id`` is None for rows that weren't stored yet when they were published
+    (write-behind).
+    """
+    return {
+        "id": value.get("id"),
+        "machine_id": value["machine_id"],
+        "features": {"temperature": value["temperature"], "humidity": value["humidity"]},
+        "prediction": value["prediction"],
+        "needs_maintenance": value["needs_maintenance"],
+        "model_version": value.get("model_version"),
+        "timestamp": value.get("timestamp"),
+        "confidence": value.get("confidence"),
+    }
+
+class Subscription:
+    __slots__ = ("machine_id", "queue")
+
+    def __init__(self, machine_id: Optional[str], maxsize: int):
+        self.machine_id = machine_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+class PredictionBroadcaster:
+    def __init__(self, buffer_size=STREAM_CLIENT_BUFFER, source=STREAM_SOURCE):
+        self.buffer_size = buffer_size
+        self.source = source
+        self._subscribers = set()
+        self._relay_thread = None
+        self._relay_stop = threading.Event()
+        self._idle_timer = None
+
+    def subscribe(self, machine_id: Optional[str] = None) -> Subscription:
+        """Must run on the event loop; pair every call with unsubscribe."""
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if self.source == "kafka":
+            self._start_relay()
+        subscription = Subscription(machine_id, self.buffer_size)
+        self._subscribers.add(subscription)
+        STREAM_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Must run on the event loop."""
+        self._subscribers.discard(subscription)
+        STREAM_SUBSCRIBERS.set(len(self._subscribers))
+        if not self._subscribers and self._relay_thread is not None and self._idle_timer is None:
+            self._idle_timer = asyncio.get_running_loop().call_later(STREAM_RELAY_IDLE_SECONDS, self._stop_idle_relay)
+
+    def _stop_idle_relay(self):
+        self._idle_timer = None
+        if not self._subscribers and self._relay_thread is not None:
+            # Not joined: the thread notices within one poll, and a new subscriber
+            # gets a relay of its own in the meantime
+            self._relay_stop.set()
+            self._relay_thread = None
+            logger.info("Prediction stream relay stopped, no subscribers left")
+
+    def publish(self, events):
+        """Events of rows this process stored; with STREAM_SOURCE=kafka they reach the
+        subscribers through the topic instead. Must run on the event loop."""
+        if self.source == "local":
+            self._fan_out(events)
+
+    def _fan_out(self, events):
+        """Hand events to every matching subscriber; never blocks."""
+        if not self._subscribers:
+            return
+        for event in events:
+            for subscription in self._subscribers:
+                if subscription.machine_id is not None and subscription.machine_id != event["machine_id"]:
+                    continue
+                if subscription.queue.full():
+                    subscription.queue.get_nowait()
+                    STREAM_EVENTS_DROPPED.inc()
+                subscription.queue.put_nowait(event)
+
+    def _start_relay(self):
+        if self._relay_thread is not None and self._relay_thread.is_alive():
+            return
+        self._relay_stop = threading.Event()
+        self._relay_thread = threading.Thread(
+            target=self._relay_loop, args=(asyncio.get_running_loop(), self._relay_stop),
+            name="stream-relay", daemon=True
+        )
+        self._relay_thread.start()
+
+    def stop(self):
+        """Stop the Kafka relay thread."""
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if self._relay_thread is not None:
+            self._relay_stop.set()
+            self._relay_thread.join(timeout=5)
+            self._relay_thread = None
+
+    def _relay_loop(self, loop, stop: threading.Event):
+        consumer = None
+        while not stop.is_set():
+            try:
+                if consumer is None:
+                    consumer = _open_relay_consumer()
+                    logger.info(f"Streaming predictions from Kafka topic {KAFKA_TOPIC_PREDICTIONS}")
+                records = consumer.poll(timeout_ms=500)
+                events = []
+                for messages in records.values():
+                    for message in messages:
+                        try:
+                            events.append(event_from_message(message.value))
+                        except (KeyError, TypeError, AttributeError):
+                            logger.warning(f"Skipping malformed prediction event at offset {message.offset}")
+                # A stopped relay may overlap with its successor for one poll
+                if events and not stop.is_set():
+                    loop.call_soon_threadsafe(self._fan_out, events)
+            except Exception as e:
+                # Keep relaying: a dead thread would leave every open stream silent
+                logger.warning(f"Prediction stream relay failed, retrying in {STREAM_RELAY_RETRY_SECONDS:.0f}s: {e}")
+                if consumer is not None:
+                    consumer.close()
+                    consumer = None
+                stop.wait(STREAM_RELAY_RETRY_SECONDS)
+        if consumer is not None:
+            consumer.close()
+
+def _open_relay_consumer() -> KafkaConsumer:
+    """Consumer positioned at the end of every partition of the predictions topic."""
+    consumer = KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=None,
+        enable_auto_commit=False,
+        value_deserializer=lambda v: json.loads(v),
+    )
+    partitions = consumer.partitions_for_topic(KAFKA_TOPIC_PREDICTIONS)
+    if not partitions:
+        consumer.close()
+        raise KafkaError(f"Topic {KAFKA_TOPIC_PREDICTIONS} has no partitions yet")
+    assignment = [TopicPartition(KAFKA_TOPIC_PREDICTIONS, p) for p in partitions]
+    consumer.assign(assignment)
+    consumer.seek_to_end(*assignment)
+    return consumer
+
+broadcaster = PredictionBroadcaster()
@@ -0,0 +1,213 @@
+"""Bulk import and export of prediction history (/predictions/import and /predictions/export).
+
+An upload is spooled to a temporary file and read back with pyarrow a batch at a
+time: each batch is scored as one feature matrix and loaded with
+crud.copy_predictions (COPY on Postgres) in its own transaction, so memory is bounded
+by the batch size rather than the file size. A failing batch stops the import with
+the earlier batches already stored. Imported rows are historical: they are not sent
+to Kafka or the live stream.
+
+Exports read through a server-side cursor (crud.iter_prediction_batches) and encode
+each batch as it arrives, so only one batch is held at a time.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import os
+
+from fastapi.concurrency import run_in_threadpool
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from app.db import crud
+from app.db.archive import ARCHIVE_SCHEMA, ArchivedPrediction
+from app.db.session import AsyncSessionLocal
+from app.live_stats import live_stats
+from app.model_loader import model_wrapper
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "50000"))
+# CSV is read in blocks of bytes rather than rows; 4 MiB is roughly 100k readings
+IMPORT_CSV_BLOCK_BYTES = int(os.getenv("IMPORT_CSV_BLOCK_BYTES", str(4 << 20)))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(2 << 30)))
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+
+IMPORT_FORMATS = ("csv", "parquet")
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# The /history columns, typed as in the Parquet archive
+EXPORT_SCHEMA = pa.schema([ARCHIVE_SCHEMA.field(name) for name in ArchivedPrediction._fields])
+
+_CSV_COLUMN_TYPES = {
+    "machine_id": pa.string(),
+    "machineId": pa.string(),
+    "temperature": pa.float64(),
+    "humidity": pa.float64(),
+    # Parsed per value below: pyarrow wants all or none of the values to carry an offset
+    "timestamp": pa.string(),
+}
+
+class BulkImportError(ValueError):
+    """The uploaded file can't be imported (unreadable, or required columns missing)."""
+
+def iter_file_batches(path: Path, fmt: str) -> Iterator[pa.RecordBatch]:
+    if fmt == "csv":
+        return iter(pacsv.open_csv(
+            path,
+            read_options=pacsv.ReadOptions(block_size=IMPORT_CSV_BLOCK_BYTES),
+            convert_options=pacsv.ConvertOptions(column_types=_CSV_COLUMN_TYPES),
+        ))
+    return pq.ParquetFile(path).iter_batches(batch_size=IMPORT_BATCH_ROWS)
+
+def _as_utc(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def _parse_timestamps(column: pa.Array, default: datetime) -> List:
+    """UTC datetimes (naive input is taken as UTC); None where a value doesn't parse."""
+    timestamps = []
+    for value in column.to_pylist():
+        if value is None or value == "":
+            timestamps.append(default)
+            continue
+        try:
+            timestamps.append(_as_utc(value))
+        except (TypeError, ValueError):
+            timestamps.append(None)
+    return timestamps
+
+def score_file_batch(batch: pa.RecordBatch, imported_at: datetime) -> Tuple[List[tuple], int]:
+    """Score one batch; returns (rows in crud.COPY_COLUMNS order, rejected row count).
+
+    Rows without a machine id, temperature or humidity, or with an unparsable
+    timestamp, are rejected. Rows without a timestamp get ``imported_at``.
+    """
+    names = batch.schema.names
+    machine_column = "machine_id" if "machine_id" in names else "machineId"
+    missing = [c for c in (machine_column, "temperature", "humidity") if c not in names]
+    if missing:
+        raise BulkImportError(f"Missing columns: {', '.join(missing)}")
+
+    machine_ids = np.asarray(batch.column(machine_column).cast(pa.string()).to_pylist(), dtype=object)
+    temperatures = batch.column("temperature").cast(pa.float64()).to_numpy(zero_copy_only=False)
+    humidities = batch.column("humidity").cast(pa.float64()).to_numpy(zero_copy_only=False)
+    if "timestamp" in names:
+        timestamps = np.asarray(_parse_timestamps(batch.column("timestamp"), imported_at), dtype=object)
+    else:
+        timestamps = np.full(batch.num_rows, imported_at, dtype=object)
+
+    valid = ~(np.isnan(temperatures) | np.isnan(humidities))
+    valid &= np.not_equal(machine_ids, None) & np.not_equal(timestamps, None)
+    rejected = int(batch.num_rows - valid.sum())
+    if rejected:
+        machine_ids, temperatures, humidities, timestamps = (
+            machine_ids[valid], temperatures[valid], humidities[valid], timestamps[valid]
+        )
+    if len(machine_ids) == 0:
+        return [], rejected
+
+    output = model_wrapper.predict(np.column_stack((temperatures, humidities)))
+    model_version = output.model_version
+    rows = [
+        (machine_id, {"temperature": temperature, "humidity": humidity}, 1.0 if needs else 0.0,
+         temperature, humidity, needs, model_version, timestamp)
+        for machine_id, temperature, humidity, needs, timestamp in zip(
+            machine_ids.tolist(), temperatures.tolist(), humidities.tolist(),
+            output.needs_maintenance.tolist(), timestamps.tolist(),
+        )
+    ]
+    return rows, rejected
+
+async def import_file(path: Path, fmt: str) -> dict:
+    """Score and store every row of a spooled upload, one transaction per batch."""
+    imported_at = datetime.now(timezone.utc)
+    summary = {"rows_imported": 0, "rows_rejected": 0, "batches": 0}
+    try:
+        batches = await run_in_threadpool(iter_file_batches, path, fmt)
+        while True:
+            batch = await run_in_threadpool(next, batches, None)
+            if batch is None:
+                break
+            rows, rejected = await run_in_threadpool(score_file_batch, batch, imported_at)
+            async with AsyncSessionLocal() as db:
+                await crud.copy_predictions(db, rows)
+            summary["rows_imported"] += len(rows)
+            summary["rows_rejected"] += rejected
+            summary["batches"] += 1
+    except (pa.ArrowInvalid, OSError) as e:
+        raise BulkImportError(f"Unreadable {fmt} file after {summary['rows_imported']} rows: {e}") from e
+    finally:
+        if summary["rows_imported"] and live_stats.ready:
+            # COPY returns no ids to fold in incrementally; re-seed from the database instead
+            await live_stats.reconcile()
+    logger.info(f"Imported {summary['rows_imported']} predictions ({summary['rows_rejected']} rejected) from {fmt}")
+    return summary
+
+class _DrainableSink:
+    """Write-only file object handed to the pyarrow writers; ``drain`` takes what they wrote.
+
+    It counts its own position because the Parquet footer records absolute offsets.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _open_writer(fmt: str, sink):
+    if fmt == "csv":
+        return pacsv.CSVWriter(sink, EXPORT_SCHEMA)
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, EXPORT_SCHEMA, compression="zstd")
+    return pa.ipc.new_stream(sink, EXPORT_SCHEMA)
+
+def _write_rows(writer, rows):
+    columns = list(zip(*rows))
+    writer.write_batch(pa.RecordBatch.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, EXPORT_SCHEMA)],
+        schema=EXPORT_SCHEMA,
+    ))
+
+async def export_stream(fmt: str, machine_id=None, start=None, end=None):
+    """Yield the encoded file piece by piece, oldest prediction first."""
+    sink = _DrainableSink()
+    writer = _open_writer(fmt, pa.PythonFile(sink, mode="w"))
+    async for rows in crud.iter_prediction_batches(
+        batch_size=EXPORT_BATCH_ROWS, machine_id=machine_id, start=start, end=end
+    ):
+        await run_in_threadpool(_write_rows, writer, rows)
+        yield sink.drain()
+    await run_in_threadpool(writer.close)
+    yield sink.drain()
@@ -0,0 +1,181 @@
+"""Read-through response cache for the dashboard endpoints.
+
+Entries are keyed by path + query string and by a generation counter for the data
+they depend on: table-wide reads (/stats, /machines, /history) use the "global"
+generation, per-machine reads use that machine's generation. Writes bump the
+generations instead of deleting keys, so stale entries simply stop being addressed
+and age out through LRU/TTL.
+
+CACHE_BACKEND=memory is an in-process LRU with TTL, the default for a single
+process. CACHE_BACKEND=redis (CACHE_REDIS_URL) shares entries and generations
+between workers and with the sensor consumer, so a write is seen by every worker
+right away; gunicorn.conf.py makes it the default when it runs more than one worker.
+While Redis can't be reached, responses are produced without the cache.
+
+Requests with ``X-Read-Consistency: primary`` never get a cached body: an entry may
+have been produced from a replica that hadn't replayed the write yet when the
+generation was bumped. Their fresh response is still stored for everyone else.
+"""
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.db.session import reads_primary
+from app.instrumentation import stage
+from app.prometheus_metrics import CACHE_HITS, CACHE_MISSES
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://redis:6379/0")
+
+class MemoryBackend:
+    """LRU with per-entry TTL; generations are plain counters."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def generations(self, names) -> list:
+        with self._lock:
+            return [self._generations.get(name, 0) for name in names]
+
+    async def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+
+class RedisBackend:
+    """Shared backend; entries expire through Redis TTLs."""
+
+    def __init__(self, url=CACHE_REDIS_URL, ttl=CACHE_TTL_SECONDS):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(f"cache:{key}")
+
+    async def set(self, key: str, value: bytes):
+        await self.client.set(f"cache:{key}", value, ex=max(int(self.ttl), 1))
+
+    async def generations(self, names) -> list:
+        values = await self.client.mget([f"gen:{name}" for name in names])
+        return [int(v) if v is not None else 0 for v in values]
+
+    async def bump(self, names):
+        pipe = self.client.pipeline()
+        for name in names:
+            pipe.incr(f"gen:{name}")
+        await pipe.execute()
+
+def _create_backend():
+    if CACHE_BACKEND == "redis":
+        try:
+            return RedisBackend()
+        except ImportError:
+            logger.warning("CACHE_BACKEND=redis but the redis package is not installed, using the in-process cache")
+    return MemoryBackend()
+
+backend = _create_backend()
+
+def machine_scope(machine_id: str) -> str:
+    return f"machine:{machine_id}"
+
+GLOBAL_SCOPE = "global"
+# Bumped by bulk rewrites (updates, deletes, rollup rebuilds) to drop every entry
+EPOCH_SCOPE = "epoch"
+
+async def _bump(names):
+    # The write is already committed; a cache outage must not turn it into an error
+    try:
+        await backend.bump(names)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate response cache: {e}")
+
+async def invalidate_machines(machine_ids: Iterable[str]):
+    """Called after new predictions are committed."""
+    await _bump([GLOBAL_SCOPE] + [machine_scope(m) for m in set(machine_ids)])
+
+async def invalidate_all():
+    await _bump([EPOCH_SCOPE])
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+async def cached_json_response(request: Request, endpoint: str, scope: str, produce: Callable,
+                               media_type: str = "application/json") -> Response:
+    """Serve a JSON payload through the cache, with ETag / If-None-Match support.
+
+    ``produce`` is an async callable returning ``(payload, headers)``; it only runs on a
+    miss. A bytes payload is taken as the already encoded body (of ``media_type``).
+    The extra headers (e.g. X-Next-Cursor) are cached along with the body.
+    """
+    try:
+        epoch, generation = await backend.generations([EPOCH_SCOPE, scope])
+        key = f"{epoch}:{scope}:{generation}:{request.url.path}?{sorted(request.query_params.multi_items())}"
+        cached = None if reads_primary(request) else await backend.get(key)
+    except Exception as e:
+        logger.warning(f"Response cache unavailable: {e}")
+        key = cached = None
+    if cached is not None:
+        CACHE_HITS.labels(endpoint=endpoint).inc()
+        etag, extra_headers, body = cached.split(b"\n", 2)
+        etag = etag.decode()
+        extra_headers = json.loads(extra_headers)
+    else:
+        CACHE_MISSES.labels(endpoint=endpoint).inc()
+        payload, extra_headers = await produce()
+        if isinstance(payload, bytes):
+            body = payload
+        else:
+            with stage("serialize"):
+                body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+        etag = _etag(body)
+        if key is not None:
+            try:
+                await backend.set(key, b"\n".join((etag.encode(), json.dumps(extra_headers).encode(), body)))
+            except Exception as e:
+                logger.warning(f"Failed to store cached response: {e}")
+
+    headers = {**extra_headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,6 +1,6 @@
-from .session import SessionLocal, engine
-from .models import Prediction, Machine
+from .session import SessionLocal, engine, AsyncSessionLocal, async_engine, get_db
+from .models import Prediction, MachineRollup, Machine
 from .base import Base
 from . import crud
 
-__all__ = ["SessionLocal", "engine", "Prediction", "Machine", "Base", "crud"]
+__all__ = ["SessionLocal", "engine", "AsyncSessionLocal", "async_engine", "get_db", "Prediction", "MachineRollup", "Machine", "Base", "crud"]
@@ -0,0 +1,94 @@
+"""Parquet archive of predictions partitions that aged out of Postgres.
+
+Each detached monthly partition becomes one file in ARCHIVE_DIR. The files are only
+read back through ``iter_archived`` (the /history/archive endpoint); nothing ever
+writes to an existing file.
+"""
+from collections import namedtuple
+from datetime import timezone
+from pathlib import Path
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(os.getenv("PREDICTIONS_ARCHIVE_DIR", Path(__file__).resolve().parents[2] / "archive"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50000"))
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("machine_id", pa.string()),
+    ("features", pa.string()),
+    ("prediction", pa.float64()),
+    ("temperature", pa.float64()),
+    ("humidity", pa.float64()),
+    ("needs_maintenance", pa.bool_()),
+    ("model_version", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+])
+
+# Same attribute names as crud.HISTORY_COLUMNS so the API can serialize both alike
+ArchivedPrediction = namedtuple(
+    "ArchivedPrediction",
+    ["id", "machine_id", "temperature", "humidity", "needs_maintenance", "model_version", "timestamp"],
+)
+
+def export_partition(conn, table_name: str) -> Path:
+    """Stream one partition table into ARCHIVE_DIR/<table_name>.parquet through a server-side cursor."""
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = ARCHIVE_DIR / f"{table_name}.parquet"
+    tmp_path = path.with_suffix(".parquet.tmp")
+    result = conn.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE).execute(text(
+        f'SELECT id, machine_id, features::text, prediction, temperature, humidity, '
+        f'needs_maintenance, model_version, "timestamp" FROM {table_name} ORDER BY id'
+    ))
+    rows_written = 0
+    with pq.ParquetWriter(tmp_path, ARCHIVE_SCHEMA, compression="zstd") as writer:
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, ARCHIVE_SCHEMA)],
+                schema=ARCHIVE_SCHEMA,
+            ))
+            rows_written += len(rows)
+    # Only a complete file ever appears under the final name
+    os.replace(tmp_path, path)
+    logger.info(f"Archived {rows_written} rows from {table_name} to {path}")
+    return path
+
+def _as_utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+def iter_archived(machine_id=None, start=None, end=None, after_id=None, limit=None):
+    """Yield archived predictions in id order, filtered with Parquet statistics pushdown."""
+    files = sorted(ARCHIVE_DIR.glob("*.parquet")) if ARCHIVE_DIR.is_dir() else []
+    if not files:
+        return
+    dataset = ds.dataset([str(f) for f in files], schema=ARCHIVE_SCHEMA, format="parquet")
+    expression = None
+    conditions = []
+    if machine_id is not None:
+        conditions.append(ds.field("machine_id") == machine_id)
+    if start is not None:
+        conditions.append(ds.field("timestamp") >= pa.scalar(_as_utc(start), type=ARCHIVE_SCHEMA.field("timestamp").type))
+    if end is not None:
+        conditions.append(ds.field("timestamp") < pa.scalar(_as_utc(end), type=ARCHIVE_SCHEMA.field("timestamp").type))
+    if after_id is not None:
+        conditions.append(ds.field("id") > after_id)
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    scanner = dataset.scanner(columns=list(ArchivedPrediction._fields), filter=expression)
+    remaining = limit
+    for batch in scanner.to_batches():
+        for row in batch.to_pylist():
+            yield ArchivedPrediction(**row)
+            if remaining is not None:
+                remaining -= 1
+                if remaining == 0:
+                    return
@@ -1,45 +1,462 @@
 # Updated contents for /home/jasser/Desktop/big/backend_bigdata/app/db/crud.py
 
-from app.db.session import SessionLocal
-from app.db.models import Prediction
+import json
 
-def create_prediction(prediction_data):
-    db = SessionLocal()
+from sqlalchemy import BigInteger, insert, select, update, delete, func, or_, and_, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
+from app.db.models import Prediction, Machine, MachineRollup, PredictionKey
+from app import cache, machine_registry
+from app.instrumentation import stage
+
+ROLLUP_BUCKETS = ("minute", "hour", "day")
+
+def _bucket_start(timestamp, bucket):
+    if bucket == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def _upsert_rollups(db: AsyncSession, rows, sign=1):
+    """Fold (machine_id, timestamp, temperature, humidity, needs_maintenance) rows into machine_rollups.
+
+    Rows are pre-aggregated per bucket here so each batch is one multi-row upsert.
+    ``sign=-1`` takes rows back out (deletes, updates); counts and sums are exact, the
+    min/max of the bucket are left as they were.
+    """
+    groups = {}
+    for machine_id, timestamp, temperature, humidity, needs_maintenance in rows:
+        for bucket in ROLLUP_BUCKETS:
+            key = (machine_id, bucket, _bucket_start(timestamp, bucket))
+            g = groups.get(key)
+            if g is None:
+                g = groups[key] = {
+                    "machine_id": key[0], "bucket": key[1], "bucket_start": key[2],
+                    "count": 0, "maintenance_count": 0,
+                    "temperature_min": None, "temperature_max": None, "temperature_sum": 0.0,
+                    "humidity_min": None, "humidity_max": None, "humidity_sum": 0.0,
+                }
+            g["count"] += sign
+            g["maintenance_count"] += sign if needs_maintenance else 0
+            for name, value in (("temperature", temperature), ("humidity", humidity)):
+                if value is None:
+                    continue
+                g[f"{name}_sum"] += sign * value
+                if sign < 0:
+                    continue
+                g[f"{name}_min"] = value if g[f"{name}_min"] is None else min(g[f"{name}_min"], value)
+                g[f"{name}_max"] = value if g[f"{name}_max"] is None else max(g[f"{name}_max"], value)
+    if not groups:
+        return
+
+    if db.bind.dialect.name == "postgresql":
+        stmt = postgresql.insert(MachineRollup)
+        least, greatest = func.least, func.greatest
+    else:
+        stmt = sqlite.insert(MachineRollup)
+        least, greatest = func.min, func.max
+    table, new = MachineRollup.__table__.c, stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.machine_id, table.bucket, table.bucket_start],
+        set_={
+            "count": table.count + new.count,
+            "maintenance_count": table.maintenance_count + new.maintenance_count,
+            "temperature_sum": table.temperature_sum + new.temperature_sum,
+            "temperature_min": func.coalesce(least(table.temperature_min, new.temperature_min), table.temperature_min, new.temperature_min),
+            "temperature_max": func.coalesce(greatest(table.temperature_max, new.temperature_max), table.temperature_max, new.temperature_max),
+            "humidity_sum": table.humidity_sum + new.humidity_sum,
+            "humidity_min": func.coalesce(least(table.humidity_min, new.humidity_min), table.humidity_min, new.humidity_min),
+            "humidity_max": func.coalesce(greatest(table.humidity_max, new.humidity_max), table.humidity_max, new.humidity_max),
+        },
+    )
+    # Sorted keys keep the row-lock order stable between concurrent writers
+    await db.execute(stmt, [groups[k] for k in sorted(groups, key=lambda k: (k[0], k[1], k[2]))])
+
+async def _with_machine_pks(predictions_data):
+    """Copies of the rows with machine_pk filled in from the machine registry.
+
+    Runs before the caller's transaction writes anything: registering a new machine
+    commits on its own connection.
+    """
+    pks = await machine_registry.resolve(data["machine_id"] for data in predictions_data)
+    return [{**data, "machine_pk": pks.get(data["machine_id"])} for data in predictions_data]
+
+async def create_prediction(db: AsyncSession, prediction_data):
+    prediction_data, = await _with_machine_pks([prediction_data])
     new_prediction = Prediction(**prediction_data)
     db.add(new_prediction)
-    db.commit()
-    db.refresh(new_prediction)
-    db.close()
+    with stage("db_insert"):
+        await db.flush()
+    with stage("db_rollups"):
+        await _upsert_rollups(db, [(
+            new_prediction.machine_id, new_prediction.timestamp,
+            new_prediction.temperature, new_prediction.humidity, new_prediction.needs_maintenance,
+        )])
+    with stage("db_commit"):
+        await db.commit()
+    await cache.invalidate_machines([new_prediction.machine_id])
     return new_prediction
 
-def get_prediction(prediction_id):
-    db = SessionLocal()
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
-    db.close()
-    return prediction
+async def _insert_predictions(db: AsyncSession, predictions_data):
+    stmt = insert(Prediction).returning(
+        Prediction.id, Prediction.timestamp, sort_by_parameter_order=True
+    )
+    with stage("db_insert"):
+        rows = (await db.execute(stmt, predictions_data)).all()
+    with stage("db_rollups"):
+        await _upsert_rollups(db, [
+            (data["machine_id"], row.timestamp, data.get("temperature"), data.get("humidity"),
+             data.get("needs_maintenance"))
+            for data, row in zip(predictions_data, rows)
+        ])
+    return rows
+
+async def create_predictions_bulk(db: AsyncSession, predictions_data):
+    """Insert many predictions in a single statement and commit once.
+
+    Returns (id, timestamp) rows in the same order as the input.
+    """
+    if not predictions_data:
+        return []
+    rows = await _insert_predictions(db, await _with_machine_pks(predictions_data))
+    with stage("db_commit"):
+        await db.commit()
+    await cache.invalidate_machines(data["machine_id"] for data in predictions_data)
+    return rows
+
+async def create_predictions_once(db: AsyncSession, predictions_data, keys):
+    """Insert the predictions whose idempotency key isn't stored yet, in one transaction.
+
+    ``keys`` runs parallel to ``predictions_data``: a (key, response) pair, or None for
+    a row without a key. The response is stored with the key for answering retries.
+    Returns a list parallel to the input with the (id, timestamp) row of each stored
+    prediction and None for duplicates, including repeats of a key within the call.
+    A concurrent transaction holding the same key makes this one wait for its outcome.
+    """
+    predictions_data = await _with_machine_pks(predictions_data)
+    candidates = {}
+    for key_response in keys:
+        if key_response is not None:
+            candidates.setdefault(*key_response)
+    claimed = set()
+    if candidates:
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(PredictionKey).on_conflict_do_nothing(
+            index_elements=[PredictionKey.key]
+        ).returning(PredictionKey.key)
+        with stage("db_keys"):
+            # Sorted like the rollups, for a stable lock order between writers
+            claimed = set((await db.execute(
+                stmt, [{"key": k, "response": candidates[k]} for k in sorted(candidates)]
+            )).scalars())
+
+    fresh = []
+    for i, key_response in enumerate(keys):
+        if key_response is None:
+            fresh.append(i)
+        elif key_response[0] in claimed:
+            claimed.discard(key_response[0])
+            fresh.append(i)
+    results = [None] * len(predictions_data)
+    if fresh:
+        rows = await _insert_predictions(db, [predictions_data[i] for i in fresh])
+        for i, row in zip(fresh, rows):
+            results[i] = row
+    with stage("db_commit"):
+        await db.commit()
+    if fresh:
+        await cache.invalidate_machines(predictions_data[i]["machine_id"] for i in fresh)
+    return results
+
+async def get_key_responses(db: AsyncSession, keys):
+    """Stored responses of the given idempotency keys, as {key: response}."""
+    if not keys:
+        return {}
+    rows = await db.execute(
+        select(PredictionKey.key, PredictionKey.response).where(PredictionKey.key.in_(list(keys)))
+    )
+    return {row.key: row.response for row in rows}
+
+async def update_key_responses(db: AsyncSession, responses):
+    """Replace the stored responses of claimed keys ({key: response}) and commit."""
+    if not responses:
+        return
+    await db.execute(update(PredictionKey), [{"key": key, "response": response} for key, response in responses.items()])
+    await db.commit()
+
+async def delete_expired_keys(db: AsyncSession, before):
+    result = await db.execute(delete(PredictionKey).where(PredictionKey.created_at < before))
+    await db.commit()
+    return result.rowcount
+
+COPY_COLUMNS = (
+    "machine_id", "features", "prediction", "temperature", "humidity",
+    "needs_maintenance", "model_version", "timestamp",
+)
+
+async def copy_predictions(db: AsyncSession, rows):
+    """Load tuples in COPY_COLUMNS order (features as a dict, timestamp tz-aware) and commit.
+
+    Postgres gets a binary COPY through asyncpg; other databases a multi-row INSERT.
+    No ids are returned, which is what makes COPY possible.
+    """
+    if not rows:
+        return 0
+    pks = await machine_registry.resolve(r[0] for r in rows)
+    rows = [(*r, pks.get(r[0])) for r in rows]
+    # The rollup upsert opens the transaction, so the COPY below runs inside it
+    with stage("db_rollups"):
+        await _upsert_rollups(db, [(r[0], r[7], r[3], r[4], r[5]) for r in rows])
+    with stage("db_insert"):
+        if db.bind.dialect.name == "postgresql":
+            connection = await (await db.connection()).get_raw_connection()
+            await connection.driver_connection.copy_records_to_table(
+                Prediction.__tablename__,
+                records=[(r[0], json.dumps(r[1]), *r[2:]) for r in rows],
+                columns=COPY_COLUMNS + ("machine_pk",),
+            )
+        else:
+            await db.execute(insert(Prediction), [dict(zip(COPY_COLUMNS + ("machine_pk",), r)) for r in rows])
+    with stage("db_commit"):
+        await db.commit()
+    await cache.invalidate_machines(r[0] for r in rows)
+    return len(rows)
+
+async def get_prediction(db: AsyncSession, prediction_id):
+    return await db.get(Prediction, prediction_id)
 
-def get_all_predictions():
-    db = SessionLocal()
-    predictions = db.query(Prediction).all()
-    db.close()
-    return predictions
+async def get_all_predictions(db: AsyncSession):
+    return (await db.execute(select(Prediction))).scalars().all()
 
-def update_prediction(prediction_id, prediction_data):
-    db = SessionLocal()
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+HISTORY_COLUMNS = (
+    Prediction.id,
+    Prediction.machine_id,
+    Prediction.temperature,
+    Prediction.humidity,
+    Prediction.needs_maintenance,
+    Prediction.model_version,
+    Prediction.timestamp,
+)
+
+def _machine_pk_of(machine_id):
+    # Evaluated once per query (an InitPlan on Postgres), then the machine_pk index is used
+    return select(Machine.id).where(Machine.name == machine_id).scalar_subquery()
+
+def _history_query(machine_id=None, after_id=None, before_timestamp=None, before_id=None,
+                   start=None, end=None):
+    """Build a keyset query over predictions.
+
+    With ``before_timestamp`` rows come newest first (timestamp, id) DESC, otherwise
+    they come in insertion order by id ASC. Both orders are served by indexes, and
+    ``start``/``end``/``before_timestamp`` let Postgres prune monthly partitions.
+    """
+    stmt = select(*HISTORY_COLUMNS)
+    if machine_id is not None:
+        stmt = stmt.where(Prediction.machine_pk == _machine_pk_of(machine_id))
+    if start is not None:
+        stmt = stmt.where(Prediction.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(Prediction.timestamp < end)
+    if before_timestamp is not None:
+        if before_id is not None:
+            stmt = stmt.where(or_(
+                Prediction.timestamp < before_timestamp,
+                and_(Prediction.timestamp == before_timestamp, Prediction.id < before_id),
+            ))
+        else:
+            stmt = stmt.where(Prediction.timestamp < before_timestamp)
+        return stmt.order_by(Prediction.timestamp.desc(), Prediction.id.desc())
+    if after_id is not None:
+        stmt = stmt.where(Prediction.id > after_id)
+    return stmt.order_by(Prediction.id)
+
+async def get_predictions_page(db: AsyncSession, limit=None, **filters):
+    """Fetch one page of predictions; see _history_query for the supported filters."""
+    stmt = _history_query(**filters)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return (await db.execute(stmt)).all()
+
+async def iter_predictions(batch_size=1000, primary=False, **filters):
+    """Yield predictions through a server-side cursor, batch_size rows at a time.
+
+    Opens its own session because the rows are consumed after the request handler
+    has returned; ``primary`` keeps it off the read replicas.
+    """
+    async with AsyncSessionLocal(info={"primary": primary}) as db:
+        stmt = _history_query(**filters).execution_options(yield_per=batch_size)
+        result = await db.stream(stmt)
+        async for row in result:
+            yield row
+
+async def iter_prediction_batches(batch_size=50000, primary=False, **filters):
+    """Like iter_predictions, but yields lists of up to batch_size rows (for columnar export)."""
+    async with AsyncSessionLocal(info={"primary": primary}) as db:
+        stmt = _history_query(**filters).execution_options(yield_per=batch_size)
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
+
+def _daily_rollups():
+    """Per-machine totals from the daily buckets of machine_rollups.
+
+    A few rows per machine and day instead of every prediction. The stored prediction
+    is 1 when maintenance is needed and 0 otherwise, so the mean prediction is
+    maintenance_count / count.
+    """
+    return (
+        select(
+            MachineRollup.machine_id,
+            func.sum(MachineRollup.count).label("prediction_count"),
+            func.sum(MachineRollup.maintenance_count).label("maintenance_count"),
+        )
+        .where(MachineRollup.bucket == "day")
+        .group_by(MachineRollup.machine_id)
+        .having(func.sum(MachineRollup.count) > 0)
+        .subquery()
+    )
+
+async def get_prediction_stats(db: AsyncSession):
+    """Aggregate totals: count, distinct machines, avg prediction (from the rollups), latest timestamp."""
+    days = _daily_rollups()
+    total = func.sum(days.c.prediction_count)
+    stmt = select(
+        # sum() of bigints is numeric on Postgres
+        func.coalesce(total, 0).cast(BigInteger).label("total_predictions"),
+        func.count(days.c.machine_id).label("unique_machines"),
+        (func.sum(days.c.maintenance_count) * 1.0 / func.nullif(total, 0)).label("avg_prediction"),
+        select(func.max(Prediction.timestamp)).scalar_subquery().label("latest_prediction"),
+    )
+    return (await db.execute(stmt)).one()
+
+async def get_machine_summaries(db: AsyncSession):
+    """Per-machine prediction count, mean and latest prediction, read from the machine registry.
+
+    Counts come from the daily rollups; the latest prediction is joined on the integer
+    machine_pk. Machines without predictions are left out.
+    """
+    counts = _daily_rollups()
+    stmt = select(
+        Machine.name.label("machine_id"),
+        counts.c.prediction_count,
+        (counts.c.maintenance_count * 1.0 / counts.c.prediction_count).label("avg_prediction"),
+    ).join(counts, counts.c.machine_id == Machine.name)
+    if db.bind.dialect.name == "postgresql":
+        # One index probe on (machine_pk, timestamp DESC) per registered machine
+        latest = (
+            select(Prediction.prediction, Prediction.timestamp)
+            .where(Prediction.machine_pk == Machine.id)
+            .order_by(Prediction.timestamp.desc(), Prediction.id.desc())
+            .limit(1)
+            .lateral()
+        )
+        stmt = stmt.join(latest, true())
+    else:
+        ranked = select(
+            Prediction.machine_pk,
+            Prediction.prediction,
+            Prediction.timestamp,
+            func.row_number().over(
+                partition_by=Prediction.machine_pk,
+                order_by=(Prediction.timestamp.desc(), Prediction.id.desc()),
+            ).label("rn"),
+        ).subquery()
+        latest = (
+            select(ranked.c.machine_pk, ranked.c.prediction, ranked.c.timestamp)
+            .where(ranked.c.rn == 1)
+            .subquery()
+        )
+        stmt = stmt.join(latest, latest.c.machine_pk == Machine.id)
+    stmt = stmt.add_columns(
+        latest.c.prediction.label("last_prediction"),
+        latest.c.timestamp.label("last_timestamp"),
+    ).order_by(Machine.name)
+    return (await db.execute(stmt)).all()
+
+async def get_visible_prediction_ids(db: AsyncSession, ids, chunk_size=1000):
+    """The ids among ``ids`` that the session's snapshot can see."""
+    ids, visible = list(ids), set()
+    for start in range(0, len(ids), chunk_size):
+        stmt = select(Prediction.id).where(Prediction.id.in_(ids[start:start + chunk_size]))
+        visible.update((await db.execute(stmt)).scalars())
+    return visible
+
+async def get_recent_readings(db: AsyncSession, limit):
+    """(temperature, humidity) of the newest ``limit`` predictions."""
+    stmt = (
+        select(Prediction.temperature, Prediction.humidity)
+        .order_by(Prediction.timestamp.desc(), Prediction.id.desc())
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).all()
+
+async def get_machine_timeseries(db: AsyncSession, machine_id, bucket="hour", start=None, end=None):
+    """Read pre-aggregated buckets for one machine from machine_rollups."""
+    stmt = select(MachineRollup).where(
+        MachineRollup.machine_id == machine_id,
+        MachineRollup.bucket == bucket,
+    )
+    if start is not None:
+        stmt = stmt.where(MachineRollup.bucket_start >= start)
+    if end is not None:
+        stmt = stmt.where(MachineRollup.bucket_start < end)
+    return (await db.execute(stmt.order_by(MachineRollup.bucket_start))).scalars().all()
+
+async def rebuild_rollups(batch_size=5000):
+    """Recompute machine_rollups from the raw predictions (one-off backfill or repair).
+
+    Reads from the primary: a replica's max(id) may lag behind rows already stored.
+    """
+    async with AsyncSessionLocal(info={"primary": True}) as db:
+        max_id = (await db.execute(select(func.max(Prediction.id)))).scalar()
+        await db.execute(delete(MachineRollup))
+        if max_id is not None:
+            stmt = (
+                select(
+                    Prediction.machine_id, Prediction.timestamp,
+                    Prediction.temperature, Prediction.humidity, Prediction.needs_maintenance,
+                )
+                .where(Prediction.id <= max_id)
+                .execution_options(yield_per=batch_size)
+            )
+            result = await db.stream(stmt)
+            async for rows in result.partitions():
+                await _upsert_rollups(db, rows)
+        await db.commit()
+    await cache.invalidate_all()
+    return max_id or 0
+
+def _rollup_row(prediction):
+    return (
+        prediction.machine_id, prediction.timestamp,
+        prediction.temperature, prediction.humidity, prediction.needs_maintenance,
+    )
+
+async def update_prediction(db: AsyncSession, prediction_id, prediction_data):
+    # The row is loaded to be written, so it has to come from the primary
+    db.info["primary"] = True
+    if "machine_id" in prediction_data:
+        prediction_data, = await _with_machine_pks([prediction_data])
+    prediction = await db.get(Prediction, prediction_id)
     if prediction:
+        await _upsert_rollups(db, [_rollup_row(prediction)], sign=-1)
         for key, value in prediction_data.items():
             setattr(prediction, key, value)
-        db.commit()
-        db.refresh(prediction)
-    db.close()
+        await db.flush()
+        await _upsert_rollups(db, [_rollup_row(prediction)])
+        await db.commit()
+        await db.refresh(prediction)
+        await cache.invalidate_all()
     return prediction
 
-def delete_prediction(prediction_id):
-    db = SessionLocal()
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+async def delete_prediction(db: AsyncSession, prediction_id):
+    db.info["primary"] = True
+    prediction = await db.get(Prediction, prediction_id)
     if prediction:
-        db.delete(prediction)
-        db.commit()
-    db.close()
-    return prediction
\ No newline at end of file
+        await _upsert_rollups(db, [_rollup_row(prediction)], sign=-1)
+        await db.delete(prediction)
+        await db.commit()
+        await cache.invalidate_all()
+    return prediction
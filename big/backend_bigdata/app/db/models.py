@@ -1,5 +1,5 @@
 # filepath: /home/jasser/Desktop/big/backend_bigdata/app/db/models.py
-from sqlalchemy import Column, Integer, Float, String, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, Boolean, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -7,15 +7,58 @@ class Prediction(Base):
     __tablename__ = "predictions"
 
     id = Column(Integer, primary_key=True, index=True)
-    machine_id = Column(String, index=True)
+    machine_id = Column(String)
+    # machines.id of machine_id; per-machine lookups and joins go through this
+    machine_pk = Column(Integer)
     features = Column(JSON)
     prediction = Column(Float)
+    # Typed copies of the features/prediction so filters and aggregates skip JSON
+    temperature = Column(Float)
+    humidity = Column(Float)
+    needs_maintenance = Column(Boolean)
     model_version = Column(String)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        Index("ix_predictions_machine_pk_timestamp", machine_pk, timestamp.desc()),
+    )
+
+    # Fetch the server-generated id/timestamp with RETURNING on flush instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
+
+class MachineRollup(Base):
+    """Per-machine telemetry aggregated into minute/hour/day buckets."""
+    __tablename__ = "machine_rollups"
+
+    machine_id = Column(String, primary_key=True)
+    bucket = Column(String(8), primary_key=True)  # "minute", "hour" or "day"
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    maintenance_count = Column(Integer, nullable=False, default=0)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_sum = Column(Float, nullable=False, default=0.0)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    humidity_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Daily buckets of every machine, for /stats and /machines
+        Index("ix_machine_rollups_bucket_machine_id", bucket, machine_id),
+    )
 
 class Machine(Base):
+    """Registry of machine ids (``name``), see app.machine_registry."""
     __tablename__ = "machines"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    name = Column(String, unique=True, index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class PredictionKey(Base):
+    """Idempotency keys of stored predictions with the response that was returned."""
+    __tablename__ = "prediction_keys"
+
+    key = Column(String, primary_key=True)
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,182 @@
+"""Maintenance of the monthly ``predictions`` partitions.
+
+A background thread periodically creates the partitions for the coming months and
+moves partitions older than the retention window to Parquet (app.db.archive) before
+dropping them. Rows outside every monthly range (readings timestamped far in the
+future, or older than the oldest partition) land in the ``predictions_default``
+partition instead of failing the batch they arrive in; they are moved to their month
+when its partition is created. Only one process runs a pass at a time, guarded by an
+advisory lock.
+Databases where ``predictions`` is not partitioned (SQLite, or Postgres before the
+b5d81f3c6a47 migration) are left alone.
+"""
+from datetime import datetime, timezone
+import logging
+import os
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.db.session import engine
+from app.db import archive
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "12"))
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600"))
+# Longest wait for the lock DETACH needs on predictions; a busy table is retried next pass
+PARTITION_DETACH_LOCK_TIMEOUT_MS = int(os.getenv("PARTITION_DETACH_LOCK_TIMEOUT_MS", "2000"))
+
+DEFAULT_PARTITION = "predictions_default"
+
+_MAINTENANCE_LOCK_KEY = 0x70726564  # arbitrary, shared by all workers
+
+_maintenance_thread = None
+_maintenance_stop = threading.Event()
+
+def _month_start(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _add_months(dt, months):
+    year, month = divmod(dt.month - 1 + months, 12)
+    return dt.replace(year=dt.year + year, month=month + 1, day=1)
+
+def _is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('predictions'))"
+    )).scalar()
+
+def list_partitions(conn):
+    """(name, lower_bound, upper_bound) of every range partition, oldest first; MINVALUE is None.
+
+    The default partition is not included.
+    """
+    return conn.execute(text(r"""
+        SELECT c.relname AS name,
+               (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::timestamptz AS lower_bound,
+               (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamptz AS upper_bound
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'predictions'::regclass
+          AND pg_get_expr(c.relpartbound, c.oid) <> 'DEFAULT'
+        ORDER BY upper_bound
+    """)).all()
+
+def ensure_default_partition(conn):
+    """Catch-all partition for rows outside every monthly range."""
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF predictions DEFAULT"))
+    conn.commit()
+
+def _create_partition(conn, name, start, end):
+    """Create one monthly partition, taking over the default partition's rows in its range.
+
+    Postgres refuses to create a partition while the default one holds rows that belong
+    in it, so those are moved to a plain table first, which is then attached.
+    """
+    bounds = {"start": start, "end": end}
+    in_range = 'WHERE "timestamp" >= :start AND "timestamp" < :end'
+    strays = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} {in_range})"), bounds).scalar()
+    if strays:
+        conn.execute(text(f"CREATE TABLE {name} (LIKE predictions INCLUDING DEFAULTS)"))
+        moved = conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} {in_range} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), bounds).rowcount
+        conn.execute(text(
+            f"ALTER TABLE predictions ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        logger.info(f"Moved {moved} predictions from {DEFAULT_PARTITION} to {name}")
+    else:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF predictions "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+    conn.commit()
+
+def ensure_partitions(conn, months_ahead=PARTITION_PREMAKE_MONTHS):
+    """Create contiguous monthly partitions up to ``months_ahead`` months past the current one."""
+    ensure_default_partition(conn)
+    partitions = list_partitions(conn)
+    now = datetime.now(timezone.utc)
+    start = partitions[-1].upper_bound.astimezone(timezone.utc) if partitions else _month_start(now)
+    horizon = _add_months(_month_start(now), months_ahead + 1)
+    created = []
+    while start < horizon:
+        end = _add_months(start, 1)
+        name = f"predictions_p{start:%Y_%m}"
+        _create_partition(conn, name, start, end)
+        created.append(name)
+        start = end
+    if created:
+        logger.info(f"Created predictions partitions: {', '.join(created)}")
+    return created
+
+def archive_expired_partitions(conn, retention_months=PARTITION_RETENTION_MONTHS):
+    """Export partitions entirely older than the retention window to Parquet, then drop them."""
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc)), -retention_months)
+    archived = []
+    for partition in list_partitions(conn):
+        if partition.upper_bound is None or partition.upper_bound > cutoff:
+            continue
+        # Export first: the rows stay queryable until the file is complete
+        archive.export_partition(conn, partition.name)
+        conn.commit()
+        # DETACH ... CONCURRENTLY is not allowed next to a default partition, so the
+        # plain DETACH is bounded instead of queueing every query behind its lock
+        try:
+            conn.execute(text(f"SET LOCAL lock_timeout = {PARTITION_DETACH_LOCK_TIMEOUT_MS}"))
+            conn.execute(text(f"ALTER TABLE predictions DETACH PARTITION {partition.name}"))
+            conn.execute(text(f"DROP TABLE {partition.name}"))
+            conn.commit()
+        except OperationalError as e:
+            conn.rollback()
+            logger.warning(f"Could not detach {partition.name}, retrying next pass: {e}")
+            continue
+        archived.append(partition.name)
+    if archived:
+        logger.info(f"Archived and dropped predictions partitions: {', '.join(archived)}")
+    return archived
+
+def run_partition_maintenance():
+    """One maintenance pass; returns False if the database is not partitioned or another worker holds the lock."""
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        if not _is_partitioned(conn):
+            return False
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _MAINTENANCE_LOCK_KEY}).scalar():
+            return False
+        try:
+            conn.commit()
+            ensure_partitions(conn)
+            archive_expired_partitions(conn)
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MAINTENANCE_LOCK_KEY})
+            conn.commit()
+    return True
+
+def _maintenance_loop():
+    while not _maintenance_stop.is_set():
+        try:
+            run_partition_maintenance()
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+        _maintenance_stop.wait(PARTITION_MAINTENANCE_INTERVAL)
+
+def start_partition_maintenance():
+    """Start the background thread that keeps partitions ahead of time and applies retention."""
+    global _maintenance_thread
+    if _maintenance_thread is not None and _maintenance_thread.is_alive():
+        return
+    _maintenance_stop.clear()
+    _maintenance_thread = threading.Thread(target=_maintenance_loop, name="partition-maintenance", daemon=True)
+    _maintenance_thread.start()
+
+def stop_partition_maintenance():
+    global _maintenance_thread
+    if _maintenance_thread is not None:
+        _maintenance_stop.set()
+        _maintenance_thread.join(timeout=5)
+        _maintenance_thread = None
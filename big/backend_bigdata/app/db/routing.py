@@ -0,0 +1,116 @@
+"""Health and replication lag of the read replicas (DATABASE_READ_URLS).
+
+session.RoutingSession asks ``replicas.pick()`` for the engine of a session's reads:
+the healthy replicas take turns, and None (the primary) is returned when there are
+none. Every REPLICA_CHECK_INTERVAL the monitor runs one query per replica that
+reports its replay lag (0 when it has replayed everything it received, or when the
+server isn't a standby, e.g. a stand-in pointing at the primary). A replica that
+fails the check or is more than REPLICA_MAX_LAG_SECONDS behind is skipped until a
+later check finds it usable again.
+"""
+from typing import List, Optional
+import asyncio
+import itertools
+import os
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app.prometheus_metrics import DB_READS_ROUTED, DB_REPLICA_HEALTHY, DB_REPLICA_LAG
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+REPLICA_CHECK_TIMEOUT = float(os.getenv("REPLICA_CHECK_TIMEOUT", "2"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        url = make_url(engine.url)
+        self.name = f"{url.host}:{url.port or 5432}/{url.database}" if url.host else str(url.database)
+        # Unused until the first check has passed
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+    async def _lag(self) -> float:
+        async with self.engine.connect() as conn:
+            if self.engine.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            return float(await conn.scalar(LAG_QUERY))
+
+    async def check(self):
+        try:
+            lag = await asyncio.wait_for(self._lag(), REPLICA_CHECK_TIMEOUT)
+        except Exception as e:
+            if self.healthy or self.error is None:
+                logger.warning(f"Read replica {self.name} unavailable: {e}")
+            self.healthy, self.lag, self.error = False, None, str(e) or type(e).__name__
+        else:
+            healthy = lag <= REPLICA_MAX_LAG_SECONDS
+            if healthy != self.healthy:
+                logger.info(f"Read replica {self.name} {'in use' if healthy else 'skipped'}: lag {lag:.3f}s")
+            self.healthy, self.lag, self.error = healthy, lag, None
+            DB_REPLICA_LAG.labels(replica=self.name).set(lag)
+        DB_REPLICA_HEALTHY.labels(replica=self.name).set(1 if self.healthy else 0)
+
+class ReplicaSet:
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self._turn = itertools.count()
+
+    def add(self, engine):
+        self.replicas.append(Replica(engine))
+
+    def pick(self):
+        """Engine of the next healthy replica, None when reads have to go to the primary."""
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            DB_READS_ROUTED.labels(target="primary").inc()
+            return None
+        DB_READS_ROUTED.labels(target="replica").inc()
+        return healthy[next(self._turn) % len(healthy)].engine
+
+    async def check(self):
+        await asyncio.gather(*(r.check() for r in self.replicas))
+
+    def status(self) -> dict:
+        return {
+            r.name: {"healthy": r.healthy, "lag_seconds": r.lag, **({"error": r.error} if r.error else {})}
+            for r in self.replicas
+        }
+
+replicas = ReplicaSet()
+
+_monitor_task = None
+
+async def _monitor_loop():
+    while True:
+        await replicas.check()
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+def start_replica_monitor():
+    """Keep checking the replicas; must run inside the event loop."""
+    global _monitor_task
+    if not replicas.replicas or _monitor_task is not None:
+        return
+    _monitor_task = asyncio.get_running_loop().create_task(_monitor_loop())
+
+async def stop_replica_monitor():
+    global _monitor_task
+    if _monitor_task is not None:
+        _monitor_task.cancel()
+        try:
+            await _monitor_task
+        except asyncio.CancelledError:
+            pass
+        _monitor_task = None
@@ -1,10 +1,116 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from sqlalchemy import Delete, Insert, Select, Update, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.db.routing import replicas
+from app.prometheus_metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_IN_USE
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Read-only replicas (comma-separated URLs); reads are routed to them by RoutingSession
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
 
+# Pool settings for the async engine used by the API
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Sync engine, kept for scripts and migrations
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _async_database_url(url: str) -> str:
+    """Swap the sync driver in DATABASE_URL for its asyncio counterpart."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return url
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+def _create_async_engine(url: str):
+    if make_url(url).get_backend_name() == "sqlite":
+        # Local development only; SQLite does not take pool sizing arguments
+        return create_async_engine(url)
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+read_engines = [_create_async_engine(_async_database_url(url)) for url in DATABASE_READ_URLS]
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_IN_USE.inc()
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_IN_USE.dec()
+
+for _engine in [async_engine, *read_engines]:
+    event.listen(_engine.sync_engine, "checkout", _on_checkout)
+    event.listen(_engine.sync_engine, "checkin", _on_checkin)
+for _engine in read_engines:
+    replicas.add(_engine)
+
+class RoutingSession(Session):
+    """Sends plain SELECTs to a healthy replica (see app.db.routing) and everything else to the primary.
+
+    A session sticks to the replica of its first read, and reads the primary once it
+    has written or when created with ``info={"primary": True}`` (read-your-writes,
+    or work that needs one snapshot of the primary).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not read_engines or self.info.get("primary"):
+            return async_engine.sync_engine
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            # Later reads in this session must see what it wrote
+            self.info["primary"] = True
+            return async_engine.sync_engine
+        if not isinstance(clause, Select):
+            return async_engine.sync_engine
+        if "replica" not in self.info:
+            self.info["replica"] = replicas.pick()
+        return (self.info["replica"] or async_engine).sync_engine
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False
+)
+
+READ_CONSISTENCY_HEADER = "x-read-consistency"
+
+def reads_primary(request: Request) -> bool:
+    """Whether the client asked to see its own recent writes (``X-Read-Consistency: primary``)."""
+    return request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary"
+
+async def get_db(request: Request):
+    """FastAPI dependency: one pooled AsyncSession per request.
+
+    ``X-Read-Consistency: primary`` makes the request read from the primary, for a
+    client that must see its own recent writes.
+    """
+    async with AsyncSessionLocal(info={"primary": True} if reads_primary(request) else {}) as session:
+        yield session
@@ -0,0 +1,121 @@
+"""Startup warm-up and the /live and /ready probes.
+
+``warm_up`` runs at the end of startup, before the worker starts accepting
+connections: it scores a dummy reading, opens DB_WARM_CONNECTIONS pooled database
+connections and creates the Kafka producer with the predictions topic metadata, so
+the first requests after a deploy don't pay for any of it. Failures are logged and
+left to /ready to report.
+
+``/live`` only says the event loop is responding. ``/ready`` checks the database,
+the model and Kafka and reports each with its latency; it answers 503 until the
+warm-up has finished, when the database or model check fails (Kafka too with
+READY_REQUIRE_KAFKA, otherwise predictions are still stored while it's down), and
+once shutdown has begun.
+"""
+from typing import Dict
+import asyncio
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from app.db.routing import replicas
+from app.db.session import async_engine
+from app.kafka_producer import KAFKA_TOPIC_PREDICTIONS, get_kafka_producer, kafka_connected
+from app.model_loader import model_wrapper
+import logging
+
+logger = logging.getLogger(__name__)
+
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "4"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "2"))
+READY_REQUIRE_KAFKA = os.getenv("READY_REQUIRE_KAFKA", "false").lower() in ("1", "true", "yes")
+
+class _State:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.warmed = False
+        self.shutting_down = False
+
+state = _State()
+
+async def _timed(check, timeout: float) -> Dict:
+    start = time.perf_counter()
+    try:
+        detail = await asyncio.wait_for(check(), timeout=timeout)
+        result = {"ok": True}
+        if detail:
+            result.update(detail)
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": f"timed out after {timeout}s"}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+async def _ping_database():
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+async def _check_model():
+    output = await run_in_threadpool(model_wrapper.predict, [[20.0, 40.0]])
+    return {"version": output.model_version}
+
+async def _connect_kafka():
+    def connect():
+        producer = get_kafka_producer()
+        # Fetches the topic metadata, which the first send would otherwise wait for
+        producer.partitions_for(KAFKA_TOPIC_PREDICTIONS)
+    await run_in_threadpool(connect)
+
+async def _check_kafka():
+    if not kafka_connected():
+        raise ConnectionError("producer not connected to the bootstrap servers")
+
+async def warm_up():
+    """Pre-open database connections, create the Kafka producer and score a dummy row."""
+    async def open_connections():
+        # Held at the same time, so the pool really opens DB_WARM_CONNECTIONS of them
+        connections = []
+        try:
+            for _ in range(DB_WARM_CONNECTIONS):
+                connections.append(await async_engine.connect())
+            await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in connections))
+        finally:
+            for conn in connections:
+                await conn.close()
+
+    results = dict(zip(("model", "database", "kafka"), await asyncio.gather(
+        _timed(_check_model, WARMUP_TIMEOUT_SECONDS),
+        _timed(open_connections, WARMUP_TIMEOUT_SECONDS),
+        _timed(_connect_kafka, WARMUP_TIMEOUT_SECONDS),
+    )))
+    for name, result in results.items():
+        if result["ok"]:
+            logger.info(f"Warm-up {name}: {result['latency_ms']} ms")
+        else:
+            logger.warning(f"Warm-up {name} failed: {result['error']}")
+    state.warmed = True
+    return results
+
+async def readiness() -> Dict:
+    checks = dict(zip(("database", "model", "kafka"), await asyncio.gather(
+        _timed(_ping_database, READY_TIMEOUT_SECONDS),
+        _timed(_check_model, READY_TIMEOUT_SECONDS),
+        _timed(_check_kafka, READY_TIMEOUT_SECONDS),
+    )))
+    required = ["database", "model"] + (["kafka"] if READY_REQUIRE_KAFKA else [])
+    ready = state.warmed and not state.shutting_down and all(checks[name]["ok"] for name in required)
+    return {
+        "status": "ready" if ready else "not_ready",
+        "warmed": state.warmed,
+        "shutting_down": state.shutting_down,
+        "checks": checks,
+        # Informational: reads fall back to the primary without a usable replica
+        **({"replicas": replicas.status()} if replicas.replicas else {}),
+    }
+
+def liveness() -> Dict:
+    return {"status": "alive", "uptime_seconds": round(time.monotonic() - state.started_at, 1)}
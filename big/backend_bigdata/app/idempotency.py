@@ -0,0 +1,148 @@
+"""Deduplication of retried prediction writes.
+
+A reading is identified by the ``Idempotency-Key`` request header (scoped to the
+route, and to the reading's position for /predict/batch) or, without the header, by
+its natural key (machine id, reading timestamp) when the reading carries its own
+timestamp. crud.create_predictions_once claims the keys in ``prediction_keys`` (its
+primary key is the unique index) in the same transaction as the rows, together with
+the response, so a retry, even one landing on another worker, stores and publishes
+nothing and gets the original response back. The API routes replace that response
+with the final one (``complete``) once the Kafka outcome is known. Recently seen
+keys are answered from a bounded per-process LRU without a database round trip.
+
+/predictions/import is not deduplicated: a retried upload is stored again.
+
+Keys are kept for IDEMPOTENCY_KEY_TTL_HOURS; a retry after that is stored again.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import crud
+from app.db.session import AsyncSessionLocal
+from app.prometheus_metrics import DUPLICATE_PREDICTIONS
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000"))
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 200
+IDEMPOTENCY_PRUNE_INTERVAL = float(os.getenv("IDEMPOTENCY_PRUNE_INTERVAL", "3600"))
+
+class RecentKeys:
+    """LRU of key -> stored response, at most ``max_entries`` keys."""
+
+    def __init__(self, max_entries=IDEMPOTENCY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        response = self._entries.get(key)
+        if response is not None:
+            self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: dict):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+recent_keys = RecentKeys()
+
+def as_utc(timestamp: datetime) -> datetime:
+    """Readings without an offset are taken as UTC."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+def header_key(route: str, value: str, index: Optional[int] = None) -> str:
+    return f"{route}:{value}" if index is None else f"{route}:{value}#{index}"
+
+def reading_key(machine_id: str, timestamp: datetime) -> str:
+    return f"reading:{machine_id}@{as_utc(timestamp).isoformat()}"
+
+def cached_responses(keys: Iterable[Optional[str]]) -> Dict[str, dict]:
+    """Stored responses of the keys this process has seen recently."""
+    found = {}
+    for key in keys:
+        if key is not None and key not in found:
+            response = recent_keys.get(key)
+            if response is not None:
+                found[key] = response
+    if found:
+        DUPLICATE_PREDICTIONS.labels(source="cache").inc(len(found))
+    return found
+
+async def store(db: AsyncSession, records: List[dict], keys: List[Optional[str]], responses: List[dict]):
+    """crud.create_predictions_once with each keyed row's response; None marks a duplicate row."""
+    rows = await crud.create_predictions_once(
+        db, records, [None if key is None else (key, response) for key, response in zip(keys, responses)]
+    )
+    for key, response, row in zip(keys, responses, rows):
+        if key is not None and row is not None:
+            recent_keys.put(key, response)
+    return rows
+
+async def complete(db: AsyncSession, responses: Dict[str, dict]):
+    """Store the final responses of keys claimed by ``store``; a failure only logs, the rows are stored."""
+    try:
+        await crud.update_key_responses(db, responses)
+    except Exception as e:
+        logger.warning(f"Failed to update {len(responses)} idempotency responses: {e}")
+        return
+    for key, response in responses.items():
+        recent_keys.put(key, response)
+
+async def stored_responses(db: AsyncSession, keys: Iterable[str]) -> Dict[str, dict]:
+    """Original responses of keys that ``store`` reported as duplicates.
+
+    A key pruned since is missing from the result.
+    """
+    keys = set(keys)
+    found = {key: recent_keys.get(key) for key in keys}
+    found = {key: response for key, response in found.items() if response is not None}
+    missing = keys - found.keys()
+    if missing:
+        from_db = await crud.get_key_responses(db, missing)
+        DUPLICATE_PREDICTIONS.labels(source="database").inc(len(from_db))
+        for key, response in from_db.items():
+            recent_keys.put(key, response)
+        found.update(from_db)
+    DUPLICATE_PREDICTIONS.labels(source="cache").inc(len(keys) - len(missing))
+    return found
+
+_prune_task = None
+
+async def _prune_loop():
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_PRUNE_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                deleted = await crud.delete_expired_keys(
+                    db, datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+                )
+            if deleted:
+                logger.info(f"Deleted {deleted} expired idempotency keys")
+        except Exception as e:
+            logger.warning(f"Idempotency key pruning failed: {e}")
+
+def start_key_pruning():
+    global _prune_task
+    if _prune_task is None:
+        _prune_task = asyncio.get_running_loop().create_task(_prune_loop())
+
+async def stop_key_pruning():
+    global _prune_task
+    if _prune_task is not None:
+        _prune_task.cancel()
+        try:
+            await _prune_task
+        except asyncio.CancelledError:
+            pass
+        _prune_task = None
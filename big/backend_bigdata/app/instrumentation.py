@@ -0,0 +1,169 @@
+"""Request- and stage-level latency instrumentation.
+
+``RequestMetricsMiddleware`` observes every request in HTTP_REQUEST_LATENCY by route
+template and status, and gives the request a dict that ``stage()`` timers inside the
+handlers and crud add their durations to (``current_stages()``). Each request also
+gets an id, the incoming ``X-Request-ID`` header or a new one, echoed back in the
+response and attached to its log records (``current_request()``).
+
+With PROFILING_ENABLED, a request sent with ``X-Profile: 1`` is sampled by a
+background thread; if it takes at least PROFILE_SLOW_MS the stacks are written to
+PROFILE_DIR in folded format (flamegraph.pl / speedscope input) and the file name is
+returned in the ``X-Profile-File`` response header.
+"""
+from collections import Counter as _Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+import os
+import sys
+import threading
+import time
+import uuid
+
+from app.prometheus_metrics import HTTP_REQUEST_LATENCY, STAGE_LATENCY
+import logging
+
+logger = logging.getLogger(__name__)
+# One record per request with its status, duration and stage timings
+request_logger = logging.getLogger("app.requests")
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "100"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "/tmp/profiles"))
+
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+_request: ContextVar[Optional[dict]] = ContextVar("request_context", default=None)
+
+REQUEST_ID_MAX_LENGTH = 128
+
+def current_stages() -> Dict[str, float]:
+    """Seconds spent per stage in the current request so far."""
+    return _stages.get() or {}
+
+def current_request() -> Optional[dict]:
+    """{"id", "method", "scope", "fields"} of the request being handled, None outside one."""
+    return _request.get()
+
+def bind(**fields):
+    """Attach fields (e.g. machine_id) to every log record of the current request."""
+    request = _request.get()
+    if request is not None:
+        request["fields"].update(fields)
+
+def route_of(request: dict) -> str:
+    return _route_label(request["scope"])
+
+@contextmanager
+def stage(name: str):
+    """Time a block with the monotonic clock into STAGE_LATENCY and the request's stage dict."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=name).observe(elapsed)
+        stages = _stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and counts folded stacks."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = _Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so random URLs can't blow up the series count
+    return getattr(route, "path", None) or "unmatched"
+
+def _save_profile(profiler: SamplingProfiler, route: str) -> str:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{slug}.folded"
+    (PROFILE_DIR / name).write_text(profiler.folded())
+    return name
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        token = _stages.set({})
+        request_id = (dict(scope["headers"]).get(b"x-request-id") or b"").decode("latin-1")[:REQUEST_ID_MAX_LENGTH]
+        request_id = request_id or uuid.uuid4().hex
+        request_token = _request.set({"id": request_id, "method": scope["method"], "scope": scope, "fields": {}})
+        status = {"code": 500}
+        profiler = None
+        if PROFILING_ENABLED and (dict(scope["headers"]).get(b"x-profile") or b"").lower() in (b"1", b"true"):
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+
+        async def send_wrapper(message):
+            nonlocal profiler
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", []).append((b"x-request-id", request_id.encode("latin-1")))
+                if profiler is not None:
+                    profiler.stop()
+                    if (time.perf_counter() - start) * 1000 >= PROFILE_SLOW_MS:
+                        try:
+                            name = _save_profile(profiler, _route_label(scope))
+                            message.setdefault("headers", []).append((b"x-profile-file", name.encode()))
+                        except OSError as e:
+                            logger.warning(f"Failed to save request profile: {e}")
+                    profiler = None
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            elapsed = time.perf_counter() - start
+            route = _route_label(scope)
+            HTTP_REQUEST_LATENCY.labels(
+                method=scope["method"], route=route, status=str(status["code"])
+            ).observe(elapsed)
+            request_logger.info(
+                "%s %s %s", scope["method"], route, status["code"],
+                extra={"status": status["code"], "duration_ms": round(elapsed * 1000, 3)},
+            )
+            _request.reset(request_token)
+            _stages.reset(token)
@@ -0,0 +1,228 @@
+"""Sensor ingestion worker: sensor-readings topic -> score -> Postgres -> predictions topic.
+
+Run with ``python -m app.kafka_consumer``. Start as many processes as the topic has
+partitions; they share KAFKA_CONSUMER_GROUP so Kafka balances partitions between them.
+Offsets are committed only after the batch has been written to the database, so a
+crash replays the batch instead of losing it (at-least-once). Malformed messages are
+published to KAFKA_TOPIC_SENSOR_DLQ, with their source offset and raw value, before
+the batch is written.
+"""
+from datetime import datetime
+import asyncio
+import json
+import os
+import signal
+import time
+from kafka import KafkaConsumer
+from kafka.errors import KafkaError
+from fastapi.concurrency import run_in_threadpool
+from app import idempotency
+from app.db import crud
+from app.db.session import AsyncSessionLocal
+from app.kafka_producer import (
+    KAFKA_BOOTSTRAP_SERVERS, queue_prediction_events, send_records, start_kafka_publisher, close_kafka_producer,
+)
+from app.model_loader import model_wrapper
+from app.prometheus_metrics import (
+    PREDICTION_COUNTER, DUPLICATE_PREDICTIONS, KAFKA_CONSUMER_LAG, SENSOR_READINGS_CONSUMED, SENSOR_READINGS_INVALID,
+    start_metrics_server,
+)
+from app.scoring import score_batch
+from app.structured_logging import configure_logging
+import logging
+
+logger = logging.getLogger(__name__)
+
+KAFKA_TOPIC_SENSOR_READINGS = os.getenv("KAFKA_TOPIC_SENSOR_READINGS", "sensor-readings")
+KAFKA_CONSUMER_GROUP = os.getenv("KAFKA_CONSUMER_GROUP", "sensor-ingest")
+KAFKA_TOPIC_SENSOR_DLQ = os.getenv("KAFKA_TOPIC_SENSOR_DLQ", "sensor-readings-dlq")
+KAFKA_CONSUMER_BATCH = int(os.getenv("KAFKA_CONSUMER_BATCH", "1000"))
+KAFKA_CONSUMER_POLL_MS = int(os.getenv("KAFKA_CONSUMER_POLL_MS", "500"))
+KAFKA_CONSUMER_LAG_INTERVAL = float(os.getenv("KAFKA_CONSUMER_LAG_INTERVAL", "10"))
+KAFKA_CONSUMER_METRICS_PORT = int(os.getenv("KAFKA_CONSUMER_METRICS_PORT", "8001"))
+
+def parse_reading(value: bytes):
+    """Decode one message into (machine_id, temperature, humidity, timestamp); None if malformed.
+
+    The timestamp is optional (None when absent); readings that carry one are
+    deduplicated on (machine_id, timestamp), so a replayed batch isn't stored twice.
+    """
+    try:
+        data = json.loads(value)
+        machine_id = data.get("machineId", data.get("machine_id"))
+        if not machine_id:
+            return None
+        timestamp = data.get("timestamp")
+        if timestamp is not None:
+            timestamp = idempotency.as_utc(datetime.fromisoformat(timestamp))
+        return str(machine_id), float(data["temperature"]), float(data["humidity"]), timestamp
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+def dead_letter(message, reason: str) -> dict:
+    """Dead-letter record of a message that can't be ingested."""
+    value = message.value
+    return {
+        "topic": message.topic,
+        "partition": message.partition,
+        "offset": message.offset,
+        "error": reason,
+        "value": value.decode("utf-8", "replace") if isinstance(value, bytes) else value,
+    }
+
+async def send_dead_letters(records: list):
+    await run_in_threadpool(send_records, KAFKA_TOPIC_SENSOR_DLQ, records)
+
+class SensorIngestWorker:
+    """Micro-batching consume loop.
+
+    ``consumer`` only needs the KafkaConsumer methods used here (poll, commit, seek,
+    assignment, position, end_offsets), so a local Redpanda consumer or an in-memory
+    stand-in can be passed in; likewise ``session_factory``, ``publish`` and
+    ``send_dead_letters``.
+    """
+
+    def __init__(self, consumer, session_factory=AsyncSessionLocal, publish=queue_prediction_events,
+                 send_dead_letters=send_dead_letters):
+        self.consumer = consumer
+        self.session_factory = session_factory
+        self.publish = publish
+        self.send_dead_letters = send_dead_letters
+        self._stop = asyncio.Event()
+        self._last_lag_update = 0.0
+
+    def stop(self):
+        self._stop.set()
+
+    async def process_batch(self, batch) -> int:
+        """Score, store and publish one poll() result. Returns the number of readings stored."""
+        machine_ids, temperatures, humidities, timestamps = [], [], [], []
+        dead_letters = []
+        for messages in batch.values():
+            for message in messages:
+                reading = parse_reading(message.value)
+                if reading is None:
+                    logger.warning(f"Malformed reading at {message.topic}[{message.partition}]@{message.offset}")
+                    dead_letters.append(dead_letter(message, "malformed reading"))
+                    continue
+                machine_ids.append(reading[0])
+                temperatures.append(reading[1])
+                humidities.append(reading[2])
+                timestamps.append(reading[3])
+        if dead_letters:
+            # Before the write: if this fails the whole batch is polled again, and
+            # readings without a timestamp must not be stored twice
+            await self.send_dead_letters(dead_letters)
+            SENSOR_READINGS_INVALID.inc(len(dead_letters))
+        if not machine_ids:
+            return 0
+
+        keys = [
+            idempotency.reading_key(machine_id, timestamp) if timestamp is not None else None
+            for machine_id, timestamp in zip(machine_ids, timestamps)
+        ]
+        if not any(keys):
+            scored = score_batch(machine_ids, temperatures, humidities)
+            async with self.session_factory() as db:
+                rows = await crud.create_predictions_bulk(db, scored.records)
+            events = [{**event, "id": row.id} for event, row in zip(scored.kafka_events, rows)]
+        else:
+            scored = score_batch(machine_ids, temperatures, humidities, timestamps)
+            async with self.session_factory() as db:
+                # The stored "response" is the event published for the reading
+                rows = await idempotency.store(db, scored.records, keys, scored.kafka_events)
+            events = [{**event, "id": row.id} for event, row in zip(scored.kafka_events, rows) if row is not None]
+            duplicates = len(rows) - len(events)
+            if duplicates:
+                DUPLICATE_PREDICTIONS.labels(source="database").inc(duplicates)
+        await self.publish(events)
+        PREDICTION_COUNTER.inc(len(events))
+        SENSOR_READINGS_CONSUMED.inc(len(machine_ids))
+        return len(events)
+
+    async def run_once(self) -> int:
+        batch = self.consumer.poll(timeout_ms=KAFKA_CONSUMER_POLL_MS, max_records=KAFKA_CONSUMER_BATCH)
+        if not batch:
+            self.update_lag()
+            return 0
+        try:
+            stored = await self.process_batch(batch)
+        except Exception:
+            # Rewind so the same messages are polled again; nothing was committed
+            for tp, messages in batch.items():
+                self.consumer.seek(tp, messages[0].offset)
+            raise
+        # Only now is the batch durable, so only now may the offsets move
+        self.consumer.commit()
+        self.update_lag()
+        return stored
+
+    def update_lag(self, force: bool = False):
+        """Export end offset minus position for every assigned partition."""
+        now = time.monotonic()
+        if not force and now - self._last_lag_update < KAFKA_CONSUMER_LAG_INTERVAL:
+            return
+        self._last_lag_update = now
+        assignment = list(self.consumer.assignment())
+        if not assignment:
+            return
+        end_offsets = self.consumer.end_offsets(assignment)
+        for tp in assignment:
+            lag = max(end_offsets.get(tp, 0) - self.consumer.position(tp), 0)
+            KAFKA_CONSUMER_LAG.labels(topic=tp.topic, partition=str(tp.partition)).set(lag)
+
+    async def run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                await self.run_once()
+                backoff = 1.0
+            except Exception as e:
+                logger.error(f"Sensor batch failed, retrying in {backoff:.0f}s: {e}")
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(backoff * 2, 30.0)
+            # Let signal handlers and other tasks run between polls
+            await asyncio.sleep(0)
+
+def create_consumer() -> KafkaConsumer:
+    return KafkaConsumer(
+        KAFKA_TOPIC_SENSOR_READINGS,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=KAFKA_CONSUMER_GROUP,
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+        max_poll_records=KAFKA_CONSUMER_BATCH,
+    )
+
+async def _main():
+    consumer = create_consumer()
+    worker = SensorIngestWorker(consumer)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    logger.info(
+        f"Consuming {KAFKA_TOPIC_SENSOR_READINGS} as group {KAFKA_CONSUMER_GROUP} from {KAFKA_BOOTSTRAP_SERVERS}"
+    )
+    try:
+        await worker.run()
+    finally:
+        consumer.close()
+
+def main():
+    configure_logging()
+    start_metrics_server(KAFKA_CONSUMER_METRICS_PORT)
+    model_wrapper.load()
+    start_kafka_publisher()
+    try:
+        asyncio.run(_main())
+    except KafkaError as e:
+        logger.error(f"Sensor consumer stopped: {e}")
+        raise
+    finally:
+        close_kafka_producer()
+
+if __name__ == "__main__":
+    main()
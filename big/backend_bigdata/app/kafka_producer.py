@@ -1,7 +1,14 @@
+from contextlib import contextmanager
+import fcntl
 import json
 import os
+import queue
+import threading
+import time
+from fastapi.concurrency import run_in_threadpool
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
+from app.prometheus_metrics import KAFKA_OUTBOX_DEPTH, KAFKA_DELIVERY_LAG, KAFKA_EVENTS_DROPPED
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,12 +16,44 @@ logger = logging.getLogger(__name__)
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "redpanda:9092")
 KAFKA_TOPIC_PREDICTIONS = os.getenv("KAFKA_TOPIC_PREDICTIONS", "predictions")
 
+# Producer batching
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "20"))
+KAFKA_BATCH_BYTES = int(os.getenv("KAFKA_BATCH_BYTES", "65536"))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "gzip") or None
+
+# Outbox queue between the request handlers and the publisher thread
+KAFKA_OUTBOX_MAX_SIZE = int(os.getenv("KAFKA_OUTBOX_MAX_SIZE", "10000"))
+KAFKA_OUTBOX_DRAIN_BATCH = int(os.getenv("KAFKA_OUTBOX_DRAIN_BATCH", "500"))
+# What to do when the outbox is full: "drop", "block" or "spill"
+KAFKA_OUTBOX_POLICY = os.getenv("KAFKA_OUTBOX_POLICY", "drop").lower()
+KAFKA_OUTBOX_BLOCK_TIMEOUT_MS = int(os.getenv("KAFKA_OUTBOX_BLOCK_TIMEOUT_MS", "100"))
+# Shared by every process on the host; access is serialized with flock on "<path>.lock"
+KAFKA_OUTBOX_SPILL_PATH = os.getenv("KAFKA_OUTBOX_SPILL_PATH", "/tmp/kafka_outbox_spill.jsonl")
+# Dropped events are counted per event but logged at most once per interval
+KAFKA_DROP_LOG_INTERVAL = float(os.getenv("KAFKA_DROP_LOG_INTERVAL", "10"))
+
 _producer = None
+# Warm-up creates the producer from a threadpool thread while the publisher may too
+_producer_lock = threading.Lock()
+
+_outbox = queue.Queue(maxsize=KAFKA_OUTBOX_MAX_SIZE)
+_spill_lock = threading.Lock()
+_publisher_thread = None
+_publisher_stop = threading.Event()
+# Accepted items the producer couldn't take yet; sent before anything newer
+_unpublished = []
+_drop_lock = threading.Lock()
+_drops_unlogged = 0
+_drops_logged_at = 0.0
 
 def get_kafka_producer() -> KafkaProducer:
-    """Get or create a Kafka producer instance."""
+    """Get or create the Kafka producer; safe to call from any thread."""
     global _producer
-    if _producer is None:
+    if _producer is not None:
+        return _producer
+    with _producer_lock:
+        if _producer is not None:
+            return _producer
         try:
             _producer = KafkaProducer(
                 bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
@@ -22,6 +61,9 @@ def get_kafka_producer() -> KafkaProducer:
                 key_serializer=lambda k: k.encode('utf-8') if k else None,
                 acks='all',
                 retries=3,
+                linger_ms=KAFKA_LINGER_MS,
+                batch_size=KAFKA_BATCH_BYTES,
+                compression_type=KAFKA_COMPRESSION,
             )
             logger.info(f"Kafka producer connected to {KAFKA_BOOTSTRAP_SERVERS}")
         except KafkaError as e:
@@ -29,30 +71,227 @@ def get_kafka_producer() -> KafkaProducer:
             raise
     return _producer
 
-def send_prediction_event(prediction_data: dict) -> bool:
-    """Send a prediction event to Kafka topic."""
+def kafka_connected() -> bool:
+    """Whether the producer exists and is connected to a bootstrap server; never creates it."""
+    return _producer is not None and _producer.bootstrap_connected()
+
+@contextmanager
+def _locked_spill_file():
+    """Exclusive access to the spill file across threads and worker processes."""
+    with _spill_lock:
+        with open(KAFKA_OUTBOX_SPILL_PATH + ".lock", "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+
+def _spill(items: list):
+    """Append outbox items to the on-disk spill file."""
+    lines = "".join(json.dumps({"enqueued_at": enqueued_at, "event": event}) + "\n" for enqueued_at, event in items)
+    with _locked_spill_file():
+        with open(KAFKA_OUTBOX_SPILL_PATH, "a") as f:
+            f.write(lines)
+
+def _take_spilled() -> list:
+    """Atomically claim everything currently in the spill file."""
+    with _locked_spill_file():
+        if not os.path.exists(KAFKA_OUTBOX_SPILL_PATH):
+            return []
+        with open(KAFKA_OUTBOX_SPILL_PATH, "r+") as f:
+            lines = f.readlines()
+            f.truncate(0)
+    items = []
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            items.append((entry["enqueued_at"], entry["event"]))
+        except (ValueError, KeyError):
+            logger.warning("Skipping corrupt line in Kafka spill file")
+    return items
+
+def _drop(count: int = 1):
+    global _drops_unlogged, _drops_logged_at
+    KAFKA_EVENTS_DROPPED.inc(count)
+    with _drop_lock:
+        _drops_unlogged += count
+        now = time.monotonic()
+        if now - _drops_logged_at < KAFKA_DROP_LOG_INTERVAL:
+            return
+        count, _drops_unlogged, _drops_logged_at = _drops_unlogged, 0, now
+    logger.warning(f"Kafka outbox full, dropped {count} prediction event(s)")
+
+def send_prediction_events(events: list) -> list:
+    """Queue prediction events for the background publisher; returns one accepted flag per event.
+
+    An event is accepted if it went into the outbox (or was spilled to disk) and not
+    accepted if it was dropped because the outbox is full. With the "block" policy
+    this waits up to KAFKA_OUTBOX_BLOCK_TIMEOUT_MS for room and with "spill" it
+    writes to disk, so async code calls queue_prediction_events instead.
+    """
+    accepted = [True] * len(events)
+    enqueued_at = time.time()
+    deadline = time.monotonic() + KAFKA_OUTBOX_BLOCK_TIMEOUT_MS / 1000
+    spilled = []
+    for i, event in enumerate(events):
+        item = (enqueued_at, event)
+        try:
+            if KAFKA_OUTBOX_POLICY == "block":
+                _outbox.put(item, timeout=max(0.0, deadline - time.monotonic()))
+            else:
+                _outbox.put_nowait(item)
+        except queue.Full:
+            if KAFKA_OUTBOX_POLICY == "spill":
+                spilled.append(item)
+            else:
+                accepted[i] = False
+    if spilled:
+        _spill(spilled)
+    if not all(accepted):
+        _drop(accepted.count(False))
+    KAFKA_OUTBOX_DEPTH.set(_outbox.qsize())
+    return accepted
+
+async def queue_prediction_events(events: list) -> list:
+    """send_prediction_events for the event loop.
+
+    Events that fit in the outbox are queued right here; once it is full, the rest
+    goes through send_prediction_events in the threadpool when the policy would
+    block or write to disk.
+    """
+    accepted = []
+    enqueued_at = time.time()
+    for i, event in enumerate(events):
+        try:
+            _outbox.put_nowait((enqueued_at, event))
+        except queue.Full:
+            if KAFKA_OUTBOX_POLICY in ("block", "spill"):
+                accepted += await run_in_threadpool(send_prediction_events, events[i:])
+                break
+            accepted.append(False)
+            continue
+        accepted.append(True)
+    if not all(accepted) and KAFKA_OUTBOX_POLICY not in ("block", "spill"):
+        _drop(accepted.count(False))
+    KAFKA_OUTBOX_DEPTH.set(_outbox.qsize())
+    return accepted
+
+async def queue_prediction_event(prediction_data: dict) -> bool:
+    """Queue one prediction event; False if it was dropped."""
+    return (await queue_prediction_events([prediction_data]))[0]
+
+def _on_delivered(record_metadata, enqueued_at):
+    KAFKA_DELIVERY_LAG.set(time.time() - enqueued_at)
+
+def _on_delivery_failed(exc):
+    KAFKA_EVENTS_DROPPED.inc()
+    logger.error(f"Failed to deliver prediction to Kafka: {exc}")
+
+def _publish(items: list):
+    """Hand a batch of outbox items to the producer; delivery is acknowledged via callbacks."""
     try:
         producer = get_kafka_producer()
-        future = producer.send(
-            KAFKA_TOPIC_PREDICTIONS,
-            key=prediction_data.get("machine_id", "unknown"),
-            value=prediction_data
-        )
-        # Wait for the message to be delivered (with timeout)
-        record_metadata = future.get(timeout=10)
-        logger.info(
-            f"Prediction sent to topic {record_metadata.topic} "
-            f"partition {record_metadata.partition} offset {record_metadata.offset}"
-        )
+    except KafkaError:
+        # The items were accepted: keep them instead of dropping them
+        if KAFKA_OUTBOX_POLICY == "spill" or _publisher_stop.is_set():
+            _spill(items)
+        else:
+            # Retried first; meanwhile the outbox fills up and applies its policy
+            _unpublished[:0] = items
+        # Back off before trying to reconnect
+        _publisher_stop.wait(1.0)
+        return
+    for enqueued_at, event in items:
+        try:
+            future = producer.send(
+                KAFKA_TOPIC_PREDICTIONS,
+                key=event.get("machine_id", "unknown"),
+                value=event
+            )
+            future.add_callback(_on_delivered, enqueued_at)
+            future.add_errback(_on_delivery_failed)
+        except KafkaError as e:
+            _on_delivery_failed(e)
+
+def _take_outbox() -> list:
+    items = []
+    while True:
+        try:
+            items.append(_outbox.get_nowait())
+        except queue.Empty:
+            return items
+
+def _drain_outbox(block: bool = True) -> bool:
+    """Move up to one batch from the outbox to the producer. Returns False if nothing was sent."""
+    if _unpublished:
+        batch = _unpublished[:]
+        _unpublished.clear()
+        _publish(batch)
         return True
-    except KafkaError as e:
-        logger.error(f"Failed to send prediction to Kafka: {e}")
+    try:
+        batch = [_outbox.get(timeout=0.5) if block else _outbox.get_nowait()]
+    except queue.Empty:
         return False
+    while len(batch) < KAFKA_OUTBOX_DRAIN_BATCH:
+        try:
+            batch.append(_outbox.get_nowait())
+        except queue.Empty:
+            break
+    KAFKA_OUTBOX_DEPTH.set(_outbox.qsize())
+    _publish(batch)
+    return True
+
+def _publisher_loop():
+    while not _publisher_stop.is_set():
+        try:
+            if not _drain_outbox():
+                # Queue is idle: replay anything that was spilled to disk
+                spilled = _take_spilled()
+                for i in range(0, len(spilled), KAFKA_OUTBOX_DRAIN_BATCH):
+                    _publish(spilled[i:i + KAFKA_OUTBOX_DRAIN_BATCH])
+        except Exception as e:
+            # Keep the thread alive: without it the outbox only fills up
+            logger.exception(f"Kafka publisher error, continuing: {e}")
+            _publisher_stop.wait(1.0)
+
+def send_records(topic: str, values: list, timeout: float = 10.0):
+    """Publish values to ``topic`` right away and wait until Kafka has acknowledged them.
+
+    Bypasses the outbox, which may drop or delay: for records the caller must know
+    are stored before going on (e.g. dead letters ahead of an offset commit). Raises
+    KafkaError when they couldn't be delivered.
+    """
+    producer = get_kafka_producer()
+    futures = [producer.send(topic, value=value) for value in values]
+    producer.flush(timeout=timeout)
+    for future in futures:
+        future.get(timeout=timeout)
+
+def start_kafka_publisher():
+    """Start the background thread that drains the outbox into Kafka."""
+    global _publisher_thread
+    if _publisher_thread is not None and _publisher_thread.is_alive():
+        return
+    _publisher_stop.clear()
+    _publisher_thread = threading.Thread(target=_publisher_loop, name="kafka-publisher", daemon=True)
+    _publisher_thread.start()
+    logger.info(f"Kafka publisher started (policy={KAFKA_OUTBOX_POLICY}, max_size={KAFKA_OUTBOX_MAX_SIZE})")
 
 def close_kafka_producer():
-    """Close the Kafka producer."""
-    global _producer
+    """Stop the publisher, flush what is still queued (spill it if Kafka is down) and close the producer."""
+    global _producer, _publisher_thread
+    _publisher_stop.set()
+    if _publisher_thread is not None:
+        _publisher_thread.join(timeout=5)
+        _publisher_thread = None
+    if _unpublished or not _outbox.empty():
+        try:
+            get_kafka_producer()
+        except KafkaError:
+            # Replayed from disk after the next start
+            _spill(_unpublished + _take_outbox())
+            _unpublished.clear()
+        while _drain_outbox(block=False):
+            pass
     if _producer is not None:
+        _producer.flush(timeout=10)
         _producer.close()
         _producer = None
         logger.info("Kafka producer closed")
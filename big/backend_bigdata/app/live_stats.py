@@ -0,0 +1,215 @@
+"""Incrementally maintained prediction statistics for /stats and /machines.
+
+The aggregator is seeded from the database in the background at startup, then
+``observe`` is fed every committed prediction (see crud). The endpoints answer from
+memory once it is ready. Writes from other processes (other workers, the sensor
+consumer) are picked up by the periodic reconciliation, which re-reads the totals
+from the daily machine_rollups buckets (not the predictions table) and replaces the
+in-memory state. Under gunicorn with several workers the aggregator is off by
+default and the endpoints read the rollups directly (see gunicorn.conf.py).
+"""
+from typing import Dict, List, Optional
+import asyncio
+import os
+import random
+import threading
+
+import numpy as np
+from app.db import crud
+from app.db.session import AsyncSessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATS_ENABLED = os.getenv("LIVE_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+LIVE_STATS_RECONCILE_INTERVAL = float(os.getenv("LIVE_STATS_RECONCILE_INTERVAL", "60"))
+LIVE_STATS_SAMPLE_SIZE = int(os.getenv("LIVE_STATS_SAMPLE_SIZE", "4096"))
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+class MachineStats:
+    __slots__ = ("count", "prediction_sum", "last_prediction", "last_timestamp")
+
+    def __init__(self, count=0, prediction_sum=0.0, last_prediction=None, last_timestamp=None):
+        self.count = count
+        self.prediction_sum = prediction_sum
+        self.last_prediction = last_prediction
+        self.last_timestamp = last_timestamp
+
+class Reservoir:
+    """Uniform sample of a stream (Algorithm R) for approximate quantiles."""
+
+    __slots__ = ("size", "seen", "values")
+
+    def __init__(self, size=LIVE_STATS_SAMPLE_SIZE):
+        self.size = size
+        self.seen = 0
+        self.values = np.empty(size, dtype=np.float64)
+
+    def add(self, value):
+        if self.seen < self.size:
+            self.values[self.seen] = value
+        else:
+            slot = random.randrange(self.seen + 1)
+            if slot < self.size:
+                self.values[slot] = value
+        self.seen += 1
+
+    def quantiles(self) -> Optional[Dict[str, float]]:
+        n = min(self.seen, self.size)
+        if n == 0:
+            return None
+        values = np.quantile(self.values[:n], QUANTILES)
+        return {f"p{int(q * 100)}": round(float(v), 4) for q, v in zip(QUANTILES, values)}
+
+class LiveStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        # One list per running reconciliation, of the rows observed since it started
+        self._observers = []
+        self._reset()
+
+    def _reset(self):
+        self.machines: Dict[str, MachineStats] = {}
+        self.total = 0
+        self.prediction_sum = 0.0
+        self.latest_timestamp = None
+        self.temperature = Reservoir()
+        self.humidity = Reservoir()
+
+    def observe(self, rows):
+        """Fold committed (id, machine_id, timestamp, temperature, humidity, prediction) rows in."""
+        with self._lock:
+            rows = list(rows)
+            for observed in self._observers:
+                observed.extend(rows)
+            self._apply(rows)
+
+    def _apply(self, rows):
+        for _, machine_id, timestamp, temperature, humidity, prediction in rows:
+            m = self.machines.get(machine_id)
+            if m is None:
+                m = self.machines[machine_id] = MachineStats()
+            m.count += 1
+            m.prediction_sum += prediction
+            if m.last_timestamp is None or timestamp >= m.last_timestamp:
+                m.last_timestamp = timestamp
+                m.last_prediction = prediction
+            self.total += 1
+            self.prediction_sum += prediction
+            if self.latest_timestamp is None or timestamp > self.latest_timestamp:
+                self.latest_timestamp = timestamp
+            if temperature is not None:
+                self.temperature.add(temperature)
+            if humidity is not None:
+                self.humidity.add(humidity)
+
+    async def reconcile(self):
+        """Rebuild the state from one database snapshot and swap it in.
+
+        Rows observed while the snapshot is read may have been committed before or
+        after it was taken, whatever their ids: the ones the snapshot can't see are
+        re-applied on top. Rows observed after the last visibility check were
+        committed after a snapshot taken several round trips earlier.
+        """
+        observed = []
+        with self._lock:
+            self._observers.append(observed)
+        try:
+            # One snapshot of the primary: a replica may not have the rows observed since
+            async with AsyncSessionLocal(info={"primary": True}) as db:
+                if db.bind.dialect.name == "postgresql":
+                    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                summaries = await crud.get_machine_summaries(db)
+                readings = await crud.get_recent_readings(db, LIVE_STATS_SAMPLE_SIZE)
+                checked, visible = 0, set()
+                # Rows can keep arriving while the ids are checked; a few rounds catch up
+                for _ in range(3):
+                    if checked == len(observed):
+                        break
+                    pending, checked = observed[checked:], len(observed)
+                    visible |= await crud.get_visible_prediction_ids(db, {r[0] for r in pending})
+        except Exception:
+            with self._lock:
+                self._observers.remove(observed)
+            raise
+        machines = {
+            s.machine_id: MachineStats(
+                s.prediction_count, float(s.avg_prediction or 0.0) * s.prediction_count,
+                s.last_prediction, s.last_timestamp,
+            )
+            for s in summaries
+        }
+        total = sum(m.count for m in machines.values())
+        temperature, humidity = Reservoir(), Reservoir()
+        # The most recent readings stand in for a uniform sample of the table
+        for t, h in readings:
+            if t is not None:
+                temperature.add(t)
+            if h is not None:
+                humidity.add(h)
+        temperature.seen = max(temperature.seen, total)
+        humidity.seen = max(humidity.seen, total)
+        with self._lock:
+            self.machines = machines
+            self.total = total
+            self.prediction_sum = sum(m.prediction_sum for m in machines.values())
+            timestamps = [m.last_timestamp for m in machines.values() if m.last_timestamp is not None]
+            self.latest_timestamp = max(timestamps) if timestamps else None
+            self.temperature, self.humidity = temperature, humidity
+            self._observers.remove(observed)
+            self._apply(r for r in observed if r[0] not in visible)
+            self.ready = True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "total_predictions": self.total,
+                "unique_machines": len(self.machines),
+                "avg_prediction": round(self.prediction_sum / self.total, 4) if self.total else 0.0,
+                "latest_prediction": self.latest_timestamp,
+                "temperature_quantiles": self.temperature.quantiles(),
+                "humidity_quantiles": self.humidity.quantiles(),
+            }
+
+    def machine_summaries(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "machine_id": machine_id,
+                    "prediction_count": m.count,
+                    "last_prediction": m.last_prediction,
+                    "last_timestamp": m.last_timestamp,
+                }
+                for machine_id, m in sorted(self.machines.items())
+            ]
+
+live_stats = LiveStats()
+
+_reconcile_task = None
+
+async def _reconcile_loop():
+    while True:
+        try:
+            await live_stats.reconcile()
+        except Exception as e:
+            logger.error(f"Live stats reconciliation failed: {e}")
+        await asyncio.sleep(LIVE_STATS_RECONCILE_INTERVAL)
+
+def start_live_stats():
+    """Seed the aggregator and keep reconciling it; must run inside the event loop."""
+    global _reconcile_task
+    if not LIVE_STATS_ENABLED or _reconcile_task is not None:
+        return
+    _reconcile_task = asyncio.get_running_loop().create_task(_reconcile_loop())
+
+async def stop_live_stats():
+    global _reconcile_task
+    if _reconcile_task is not None:
+        _reconcile_task.cancel()
+        try:
+            await _reconcile_task
+        except asyncio.CancelledError:
+            pass
+        _reconcile_task = None
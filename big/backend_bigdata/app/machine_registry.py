@@ -0,0 +1,80 @@
+"""Registry of machines: the string machine id to its integer ``machines.id``.
+
+Predictions reference the registry through the integer ``machine_pk`` column. A
+machine is registered the first time one of its readings is written (an upsert on
+the unique ``machines.name``), in its own short transaction so the row is visible to
+every writer before their predictions reference it. Resolved keys are kept in a
+bounded per-process LRU, so after the first reading of a machine the write path
+never queries the registry.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+import os
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.models import Machine
+from app.db.session import AsyncSessionLocal
+from app.prometheus_metrics import MACHINE_REGISTRY_LOOKUPS
+import logging
+
+logger = logging.getLogger(__name__)
+
+MACHINE_CACHE_SIZE = int(os.getenv("MACHINE_CACHE_SIZE", "100000"))
+
+class MachineKeys:
+    """LRU of machine id -> machines.id, at most ``max_entries`` machines."""
+
+    def __init__(self, max_entries=MACHINE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, name: str) -> Optional[int]:
+        pk = self._entries.get(name)
+        if pk is not None:
+            self._entries.move_to_end(name)
+        return pk
+
+    def put(self, name: str, pk: int):
+        self._entries[name] = pk
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+machine_keys = MachineKeys()
+
+async def _register(names) -> Dict[str, int]:
+    async with AsyncSessionLocal() as db:
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(Machine).on_conflict_do_nothing(index_elements=[Machine.name])
+        # Sorted for a stable lock order between workers registering the same machines
+        await db.execute(stmt, [{"name": name} for name in sorted(names)])
+        rows = await db.execute(select(Machine.name, Machine.id).where(Machine.name.in_(list(names))))
+        pks = {row.name: row.id for row in rows}
+        await db.commit()
+    logger.debug(f"Resolved {len(pks)} machines in the registry")
+    return pks
+
+async def resolve(names: Iterable[Optional[str]]) -> Dict[str, int]:
+    """machines.id of each machine id, registering the ones never seen before."""
+    pks, missing = {}, set()
+    for name in names:
+        if name is None or name in pks or name in missing:
+            continue
+        pk = machine_keys.get(name)
+        if pk is None:
+            missing.add(name)
+        else:
+            pks[name] = pk
+    if pks:
+        MACHINE_REGISTRY_LOOKUPS.labels(source="cache").inc(len(pks))
+    if missing:
+        MACHINE_REGISTRY_LOOKUPS.labels(source="database").inc(len(missing))
+        for name, pk in (await _register(missing)).items():
+            machine_keys.put(name, pk)
+            pks[name] = pk
+    return pks
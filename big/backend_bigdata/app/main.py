@@ -1,21 +1,34 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import predict
+from app.api import predict, admin, stream, bulk
 from app.db.base import Base, engine
-from app.kafka_producer import close_kafka_producer
+from app.kafka_producer import close_kafka_producer, start_kafka_publisher
+from app.model_loader import model_wrapper, start_model_sync, stop_model_sync
+from app.db.partitions import start_partition_maintenance, stop_partition_maintenance
+from app.live_stats import start_live_stats, stop_live_stats
+from app.write_behind import start_write_behind, stop_write_behind
+from app.idempotency import start_key_pruning, stop_key_pruning
+from app.db.routing import start_replica_monitor, stop_replica_monitor
+from app.broadcast import broadcaster
+from app import health
+from app.prometheus_metrics import metrics_payload
+from app.instrumentation import RequestMetricsMiddleware
+from app.admission import AdmissionMiddleware
+from app.structured_logging import configure_logging
 from dotenv import load_dotenv
 import logging
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# JSON lines written by a background thread (see app.structured_logging)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# gunicorn.conf.py creates the tables once in the master and turns this off for the workers
+DB_CREATE_ALL_ON_STARTUP = os.getenv("DB_CREATE_ALL_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
 app = FastAPI(
     title="Maintenance Prediction API",
     description="API for machine maintenance prediction with Kafka integration",
@@ -33,30 +46,62 @@ allowed_origins = [
     "http://localhost:80",
 ]
 
+# Innermost, so shed requests still get CORS headers and are measured
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the frontend to fetch the next history page
+    expose_headers=["X-Next-Cursor"],
 )
+# Outermost, so the histogram includes time spent in the other middleware
+app.add_middleware(RequestMetricsMiddleware)
 
 @app.on_event("startup")
-def startup():
+async def startup():
     logger.info("Starting up application...")
     # Create database tables
+    if DB_CREATE_ALL_ON_STARTUP:
+        try:
+            Base.metadata.create_all(bind=engine)
+            logger.info("Database tables created successfully")
+        except Exception as e:
+            logger.error(f"Failed to create database tables: {e}")
+    
+    # Load the model once so the first request doesn't pay for it
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
+        model_wrapper.load()
     except Exception as e:
-        logger.error(f"Failed to create database tables: {e}")
-    
+        logger.error(f"Failed to load model: {e}")
+
     logger.info(f"Kafka bootstrap servers: {os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'redpanda:9092')}")
+    start_kafka_publisher()
+    start_partition_maintenance()
+    # Replays any journal left by a crashed worker before accepting new rows
+    await start_write_behind()
+    start_live_stats()
+    start_key_pruning()
+    start_replica_monitor()
+    start_model_sync()
+    # Before the worker accepts connections, so the first requests find everything warm
+    await health.warm_up()
     logger.info("Application started successfully")
 
 @app.on_event("shutdown")
-def shutdown():
+async def shutdown():
     logger.info("Shutting down application...")
+    # /ready fails from here on so load balancers stop sending new requests
+    health.state.shutting_down = True
+    await stop_write_behind()
+    await stop_live_stats()
+    await stop_key_pruning()
+    await stop_replica_monitor()
+    stop_model_sync()
+    stop_partition_maintenance()
+    broadcaster.stop()
     close_kafka_producer()
     logger.info("Application shutdown complete")
 
@@ -68,4 +113,23 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
-app.include_router(predict.router)
\ No newline at end of file
+@app.get("/live")
+def live():
+    """Liveness: the worker's event loop is responding"""
+    return health.liveness()
+
+@app.get("/ready")
+async def ready():
+    """Readiness: warmed up and the dependencies answer (per-check status and latency)"""
+    report = await health.readiness()
+    return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+app.include_router(predict.router)
+app.include_router(admin.router)
+app.include_router(stream.router)
+app.include_router(bulk.router)
\ No newline at end of file
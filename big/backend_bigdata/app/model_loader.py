@@ -1,16 +1,192 @@
 # filepath: /home/jasser/Desktop/big/backend_bigdata/app/model_loader.py
 from pathlib import Path
+from typing import NamedTuple, Optional
+import logging
+import os
+import re
+import threading
+import numpy as np
 
-MODEL_DIR = Path(__file__).resolve().parents[1] / "model"
+try:
+    import joblib
+except ImportError:  # joblib artifacts are optional
+    joblib = None
+
+try:
+    import onnxruntime
+except ImportError:  # ONNX artifacts are optional
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = Path(os.getenv("MODEL_DIR", Path(__file__).resolve().parents[1] / "model"))
+# Version to activate at startup; defaults to the newest artifact in MODEL_DIR
+MODEL_VERSION = os.getenv("MODEL_VERSION")
+# A hot swap writes the version here and every worker sharing the file loads it within
+# MODEL_SYNC_INTERVAL seconds; gunicorn.conf.py removes it when the server starts
+MODEL_ACTIVE_FILE = Path(os.getenv("MODEL_ACTIVE_FILE", "/tmp/model_active_version"))
+MODEL_SYNC_INTERVAL = float(os.getenv("MODEL_SYNC_INTERVAL", "5"))
+
+RULE_BASED_VERSION = "v1.0"
+MAINTENANCE_THRESHOLD = 0.5
+
+class ModelOutput(NamedTuple):
+    confidence: np.ndarray          # float64, one per input row
+    needs_maintenance: np.ndarray   # bool, one per input row
+    model_version: str
+
+class RuleBasedModel:
+    """The original hand-written scoring rules, vectorized over a [n, 2] matrix."""
+
+    def predict_confidence(self, features_matrix: np.ndarray) -> np.ndarray:
+        temperatures = features_matrix[:, 0]
+        humidities = features_matrix[:, 1]
+        risk_score = (temperatures / 100) * 0.6 + (humidities / 100) * 0.4
+
+        # High temperature (> 80°C, > 90°C) and high humidity (> 70%) add risk
+        risk_score += np.where(temperatures > 90, 0.3, np.where(temperatures > 80, 0.15, 0.0))
+        risk_score += np.where(humidities > 70, 0.1, 0.0)
+        return risk_score
+
+class JoblibModel:
+    """scikit-learn style estimator; numpy arrays inside the pickle are memory-mapped."""
+
+    def __init__(self, path: Path):
+        if joblib is None:
+            raise RuntimeError("joblib is not installed")
+        self.model = joblib.load(path, mmap_mode="r")
+
+    def predict_confidence(self, features_matrix: np.ndarray) -> np.ndarray:
+        if hasattr(self.model, "predict_proba"):
+            return np.asarray(self.model.predict_proba(features_matrix))[:, 1]
+        return np.asarray(self.model.predict(features_matrix), dtype=np.float64)
+
+class OnnxModel:
+    """ONNX classifier taking a float32 [n, 2] input and returning class probabilities."""
+
+    def __init__(self, path: Path):
+        if onnxruntime is None:
+            raise RuntimeError("onnxruntime is not installed")
+        self.session = onnxruntime.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_confidence(self, features_matrix: np.ndarray) -> np.ndarray:
+        outputs = self.session.run(None, {self.input_name: features_matrix.astype(np.float32)})
+        probabilities = np.asarray(outputs[-1], dtype=np.float64)
+        return probabilities[:, 1] if probabilities.ndim == 2 else probabilities
+
+def _artifact_path(version: str) -> Optional[Path]:
+    for name in ("model.onnx", "model.joblib"):
+        path = MODEL_DIR / version / name
+        if path.is_file():
+            return path
+    return None
+
+def _version_key(version: str):
+    """Orders versions by their numbers, so v10 comes after v2"""
+    return [int(part) for part in re.findall(r"\d+", version)], version
+
+def _read_active_file() -> Optional[str]:
+    try:
+        return MODEL_ACTIVE_FILE.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _load_model(version: str):
+    if version == RULE_BASED_VERSION:
+        return RuleBasedModel()
+    path = _artifact_path(version)
+    if path is None:
+        raise FileNotFoundError(f"No model artifact for version {version} in {MODEL_DIR}")
+    if path.suffix == ".onnx":
+        return OnnxModel(path)
+    return JoblibModel(path)
 
 class ModelWrapper:
+    """Holds the active model and swaps it atomically.
+
+    The active (version, model) pair is a single attribute, so a request that has
+    already read it keeps scoring with the old model while a swap happens.
+    """
+
     def __init__(self):
-        # Load your model here
-        pass
+        self._active = None
+        self._swap_lock = threading.Lock()
+
+    def available_versions(self):
+        versions = [RULE_BASED_VERSION]
+        if MODEL_DIR.is_dir():
+            versions += sorted(
+                (d.name for d in MODEL_DIR.iterdir() if d.is_dir() and _artifact_path(d.name)), key=_version_key
+            )
+        return versions
 
-    def predict(self, data):
-        # Implement prediction logic here
-        pass
+    @property
+    def version(self) -> Optional[str]:
+        return self._active[0] if self._active else None
+
+    def load(self, version: Optional[str] = None) -> str:
+        """Load a version (default: the one last swapped in, MODEL_VERSION or the newest
+        artifact), warm it up and make it active in this process."""
+        version = version or _read_active_file() or MODEL_VERSION or self.available_versions()[-1]
+        with self._swap_lock:
+            model = _load_model(version)
+            # Score one dummy row so the first real request doesn't pay for lazy init
+            model.predict_confidence(np.array([[20.0, 40.0]]))
+            previous = self.version
+            self._active = (version, model)
+        logger.info(f"Model {version} active (previous: {previous})")
+        return version
+
+    def swap(self, version: str) -> str:
+        """Load a version here and publish it to the other workers through MODEL_ACTIVE_FILE."""
+        self.load(version)
+        temporary = MODEL_ACTIVE_FILE.with_name(f"{MODEL_ACTIVE_FILE.name}.{os.getpid()}")
+        temporary.write_text(version)
+        os.replace(temporary, MODEL_ACTIVE_FILE)
+        return version
+
+    def predict(self, features_matrix) -> ModelOutput:
+        """Score a [n, 2] matrix of (temperature, humidity) rows."""
+        if self._active is None:
+            self.load()
+        version, model = self._active
+        features_matrix = np.asarray(features_matrix, dtype=np.float64).reshape(-1, 2)
+        confidence = np.clip(model.predict_confidence(features_matrix), 0.0, 1.0)
+        return ModelOutput(confidence, confidence > MAINTENANCE_THRESHOLD, version)
 
 # instantiate once so FastAPI loads it on startup
-model_wrapper = ModelWrapper()
\ No newline at end of file
+model_wrapper = ModelWrapper()
+
+_sync_thread = None
+_sync_stop = threading.Event()
+
+def _sync_loop():
+    failed = None
+    while not _sync_stop.wait(MODEL_SYNC_INTERVAL):
+        version = _read_active_file()
+        if version is None or version == model_wrapper.version or version == failed:
+            continue
+        try:
+            model_wrapper.load(version)
+            failed = None
+        except Exception as e:
+            # Not retried until another version is swapped in
+            failed = version
+            logger.error(f"Failed to load swapped-in model {version}: {e}")
+
+def start_model_sync():
+    """Start the background thread that follows hot swaps made by other workers."""
+    global _sync_thread
+    if _sync_thread is not None and _sync_thread.is_alive():
+        return
+    _sync_stop.clear()
+    _sync_thread = threading.Thread(target=_sync_loop, name="model-sync", daemon=True)
+    _sync_thread.start()
+
+def stop_model_sync():
+    global _sync_thread
+    if _sync_thread is not None:
+        _sync_stop.set()
+        _sync_thread.join(timeout=5)
+        _sync_thread = None
@@ -1,16 +1,85 @@
 # File: /home/jasser/Desktop/big/backend_bigdata/app/prometheus_metrics.py
 
-from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client import (
+    CollectorRegistry, CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest,
+    multiprocess, start_http_server,
+)
+import os
 import time
 
 PREDICTION_COUNTER = Counter("predictions_total", "Total prediction calls")
 PREDICTION_LATENCY = Histogram("prediction_latency_seconds", "Latency of prediction calls in seconds")
 
+HTTP_REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route template and status", ["method", "route", "status"])
+STAGE_LATENCY = Histogram(
+    "request_stage_duration_seconds", "Time spent in one stage of a request (score, db_write, kafka_publish, serialize, ...)", ["stage"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+KAFKA_OUTBOX_DEPTH = Gauge("kafka_outbox_depth", "Prediction events waiting in the Kafka outbox queue", multiprocess_mode="livesum")
+KAFKA_DELIVERY_LAG = Gauge("kafka_delivery_lag_seconds", "Time between enqueueing the last delivered event and its broker ack", multiprocess_mode="livemax")
+KAFKA_EVENTS_DROPPED = Counter("kafka_events_dropped_total", "Prediction events dropped before reaching Kafka")
+
+SENSOR_READINGS_CONSUMED = Counter("sensor_readings_consumed_total", "Sensor readings scored and stored by the Kafka consumer")
+SENSOR_READINGS_INVALID = Counter("sensor_readings_invalid_total", "Malformed sensor readings routed to the dead-letter topic by the Kafka consumer")
+KAFKA_CONSUMER_LAG = Gauge("kafka_consumer_lag", "Messages between the consumer position and the end of the partition", ["topic", "partition"], multiprocess_mode="livemax")
+
+DB_POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection")
+DB_POOL_IN_USE = Gauge("db_pool_connections_in_use", "Database connections currently checked out of the pool", multiprocess_mode="livesum")
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication replay lag of each read replica at its last check", ["replica"], multiprocess_mode="livemax")
+DB_REPLICA_HEALTHY = Gauge("db_replica_healthy", "1 while a read replica passes its checks and is within the lag limit", ["replica"], multiprocess_mode="livemin")
+DB_READS_ROUTED = Counter("db_reads_routed_total", "Read sessions routed to a replica, or to the primary for lack of a usable one", ["target"])
+
+CACHE_HITS = Counter("response_cache_hits_total", "Dashboard responses served from the read-through cache", ["endpoint"])
+CACHE_MISSES = Counter("response_cache_misses_total", "Dashboard responses computed from the database", ["endpoint"])
+
+WRITE_BEHIND_PENDING = Gauge("write_behind_pending_rows", "Journaled predictions waiting for the next group commit", multiprocess_mode="livesum")
+WRITE_BEHIND_FLUSH_ROWS = Histogram(
+    "write_behind_flush_rows", "Rows per write-behind group commit",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+WRITE_BEHIND_FLUSH_LATENCY = Histogram("write_behind_flush_duration_seconds", "Time to insert and commit one write-behind chunk")
+WRITE_BEHIND_ROW_DELAY = Histogram("write_behind_row_delay_seconds", "Time from a row being journaled to its commit in the database")
+
+DUPLICATE_PREDICTIONS = Counter(
+    "duplicate_predictions_total", "Retried readings answered with the stored response instead of a new row", ["source"]
+)
+
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Admitted requests being handled, per route class", ["route_class"], multiprocess_mode="livesum")
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for admission, per route class", ["route_class"], multiprocess_mode="livesum")
+ADMISSION_SHED = Counter(
+    "admission_shed_total", "Requests rejected with 503 by admission control", ["route_class", "reason"]
+)
+ADMISSION_WAIT = Histogram("admission_wait_seconds", "Time requests waited for admission, per route class", ["route_class"])
+
+LOG_RECORDS_SUPPRESSED = Counter(
+    "log_records_suppressed_total", "Log records not written: sampled out, over the per-route rate limit or queue full", ["reason"]
+)
+
+MACHINE_REGISTRY_LOOKUPS = Counter(
+    "machine_registry_lookups_total", "Machine ids resolved to their registry key, from the process cache or the database", ["source"]
+)
+
+STREAM_SUBSCRIBERS = Gauge("prediction_stream_subscribers", "Clients connected to /stream/predictions", multiprocess_mode="livesum")
+STREAM_EVENTS_DROPPED = Counter("prediction_stream_events_dropped_total", "Live events dropped because a client's buffer was full")
+
 def start_metrics_server(port=8000):
     start_http_server(port)
 
+def metrics_payload():
+    """Exposition for /metrics: summed across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set.
+
+    Returns (body, content_type).
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
 def record_prediction_latency(start_time):
-    elapsed_time = time.time() - start_time
+    elapsed_time = time.perf_counter() - start_time
     PREDICTION_LATENCY.observe(elapsed_time)
 
 # Start the metrics server on a separate thread or process if needed
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Sequence
+from app.model_loader import model_wrapper
+import numpy as np
+
+class ScoredBatch(NamedTuple):
+    records: List[dict]        # rows for crud.create_predictions_bulk
+    kafka_events: List[dict]   # payloads for the predictions topic
+    confidences: List[float]
+    needs_maintenance: List[bool]
+    model_version: str
+    timestamp: datetime
+    timestamps: List[datetime]  # per reading: its own timestamp, else ``timestamp``
+
+def score_batch(machine_ids: Sequence[str], temperatures: Sequence[float],
+                humidities: Sequence[float],
+                timestamps: Optional[Sequence[Optional[datetime]]] = None) -> ScoredBatch:
+    """Score readings with the active model and build the DB rows and Kafka events.
+
+    Shared by POST /predict/batch and the sensor-readings consumer so both paths
+    store and publish exactly the same thing. Readings given a timestamp in
+    ``timestamps`` are stored and published with it instead of the scoring time.
+    """
+    features_matrix = np.column_stack((
+        np.asarray(temperatures, dtype=np.float64),
+        np.asarray(humidities, dtype=np.float64),
+    ))
+    output = model_wrapper.predict(features_matrix)
+    confidences = np.round(output.confidence, 4).tolist()
+    needs_maintenance = output.needs_maintenance.tolist()
+    model_version = output.model_version
+    timestamp = datetime.utcnow()
+
+    if timestamps is not None:
+        scored_at = timestamp.replace(tzinfo=timezone.utc)
+        reading_times = [t or scored_at for t in timestamps]
+    else:
+        reading_times = [timestamp] * len(confidences)
+
+    records = []
+    kafka_events = []
+    for machine_id, temperature, humidity, needs, confidence, reading_time in zip(
+        machine_ids, temperatures, humidities, needs_maintenance, confidences, reading_times
+    ):
+        record = {
+            "machine_id": machine_id,
+            "features": {"temperature": temperature, "humidity": humidity},
+            "prediction": 1 if needs else 0,
+            "temperature": temperature,
+            "humidity": humidity,
+            "needs_maintenance": needs,
+            "model_version": model_version,
+        }
+        if timestamps is not None:
+            record["timestamp"] = reading_time
+        records.append(record)
+        kafka_events.append({
+            "machine_id": machine_id,
+            "temperature": temperature,
+            "humidity": humidity,
+            "prediction": 1 if needs else 0,
+            "needs_maintenance": needs,
+            "confidence": confidence,
+            "model_version": model_version,
+            "timestamp": reading_time.isoformat(),
+        })
+    return ScoredBatch(records, kafka_events, confidences, needs_maintenance, model_version, timestamp, reading_times)
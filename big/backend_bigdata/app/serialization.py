@@ -0,0 +1,57 @@
+"""Fast encoding of prediction rows for /history, /machine/{id} and their exports.
+
+Rows go straight from the database tuples (crud.HISTORY_COLUMNS, or archived rows
+with the same fields) to bytes with orjson: no PredictionHistory model,
+jsonable_encoder pass or response_model validation per row. ``json`` is the
+same PredictionHistory list the API always returned. ``columnar`` is one
+array per column, which drops the repeated keys and the derived ``features`` and
+``prediction`` fields (a third of the size); ``msgpack`` is the columnar layout as
+MessagePack and needs the optional ``msgpack`` package.
+"""
+from typing import Iterable, Tuple
+
+import orjson
+
+HISTORY_FORMATS = ("json", "columnar", "msgpack")
+COLUMNS = ("id", "machine_id", "temperature", "humidity", "needs_maintenance", "model_version", "timestamp")
+
+# Naive timestamps stay naive, aware ones end in "Z", as with Pydantic
+_OPTIONS = orjson.OPT_UTC_Z
+
+class FormatUnavailable(Exception):
+    """The requested format needs a package that isn't installed."""
+
+def row_dict(p) -> dict:
+    """One PredictionHistory object as a plain dict"""
+    return {
+        "id": p.id,
+        "machine_id": p.machine_id,
+        "features": {"temperature": p.temperature, "humidity": p.humidity},
+        "prediction": 1 if p.needs_maintenance else 0,
+        "needs_maintenance": bool(p.needs_maintenance),
+        "model_version": p.model_version or "v1.0",
+        "timestamp": p.timestamp,
+    }
+
+def ndjson_line(p) -> bytes:
+    return orjson.dumps(row_dict(p), option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+def _columns(rows) -> dict:
+    columns = dict(zip(COLUMNS, map(list, zip(*rows)))) if rows else {name: [] for name in COLUMNS}
+    columns["needs_maintenance"] = [bool(v) for v in columns["needs_maintenance"]]
+    columns["model_version"] = [v or "v1.0" for v in columns["model_version"]]
+    return columns
+
+def encode_rows(rows: Iterable, fmt: str = "json") -> Tuple[bytes, str]:
+    """(body, media type) of ``rows`` in one of HISTORY_FORMATS"""
+    if fmt == "json":
+        return orjson.dumps([row_dict(p) for p in rows], option=_OPTIONS), "application/json"
+    columns = _columns(list(rows))
+    if fmt == "columnar":
+        return orjson.dumps(columns, option=_OPTIONS), "application/json"
+    try:
+        import msgpack
+    except ImportError:
+        raise FormatUnavailable("format=msgpack needs the msgpack package")
+    columns["timestamp"] = [t.isoformat() if t is not None else None for t in columns["timestamp"]]
+    return msgpack.packb(columns), "application/msgpack"
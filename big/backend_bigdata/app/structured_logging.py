@@ -0,0 +1,162 @@
+"""Logging off the request path, as JSON lines for Fluent Bit.
+
+``configure_logging`` puts a QueueHandler on the root logger: the calling thread only
+captures the record (message, request id, route, stage timings so far and the fields
+bound with ``instrumentation.bind``, e.g. machine_id) and enqueues it. A
+QueueListener thread formats it and writes it to stdout, one JSON object per line
+with ``time`` in the ``%Y-%m-%dT%H:%M:%S.%L`` format ``json_parser`` in
+fluent-bit/parsers.conf expects (UTC). LOG_FORMAT=text keeps the old plain format.
+
+Records at INFO and below are sampled per route (LOG_SAMPLE_RATES, e.g.
+``/predict=0.01,/predict/batch=0.1``) and rate limited per route
+(LOG_RATE_LIMIT_PER_SECOND); warnings and errors always go through. The queue is
+bounded, and a record that doesn't fit is dropped rather than blocking the caller;
+suppressed records are counted in LOG_RECORDS_SUPPRESSED.
+"""
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import orjson
+
+from app.instrumentation import current_request, current_stages, route_of
+from app.prometheus_metrics import LOG_RECORDS_SUPPRESSED
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_RATE_LIMIT_PER_SECOND = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND", "0"))
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "true").lower() in ("1", "true", "yes")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in value.split(","):
+        route, sep, rate = item.strip().rpartition("=")
+        if sep and route:
+            rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        seconds = int(record.created)
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{int((record.created - seconds) * 1000):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+class RouteSampler(logging.Filter):
+    """Per-route sampling and token-bucket rate limit for records at INFO and below."""
+
+    def __init__(self, sample_rates: Dict[str, float], rate_limit: float):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate_limit = rate_limit
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _take_token(self, route: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(route, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - updated) * self.rate_limit)
+            if tokens < 1.0:
+                self._buckets[route] = (tokens, now)
+                return False
+            self._buckets[route] = (tokens - 1.0, now)
+            return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        request = current_request()
+        route = route_of(request) if request is not None else None
+        rate = self.sample_rates.get(route, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            LOG_RECORDS_SUPPRESSED.labels(reason="sampled").inc()
+            return False
+        if self.rate_limit > 0 and not self._take_token(route or "-"):
+            LOG_RECORDS_SUPPRESSED.labels(reason="rate_limited").inc()
+            return False
+        return True
+
+class ContextQueueHandler(QueueHandler):
+    """Captures the request context in the calling thread, leaves formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        request = current_request()
+        if request is not None:
+            for name, value in request["fields"].items():
+                record.__dict__.setdefault(name, value)
+            record.request_id = request["id"]
+            record.method = request["method"]
+            record.route = route_of(request)
+            stages = current_stages()
+            if stages:
+                record.stages_ms = {name: round(seconds * 1000, 3) for name, seconds in stages.items()}
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_SUPPRESSED.labels(reason="queue_full").inc()
+
+_listener: Optional[QueueListener] = None
+
+def configure_logging():
+    """Route the root logger through the queue; idempotent, call once per process."""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    handler = ContextQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RouteSampler(_parse_sample_rates(LOG_SAMPLE_RATES), LOG_RATE_LIMIT_PER_SECOND))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    if not LOG_REQUESTS:
+        logging.getLogger("app.requests").setLevel(logging.WARNING)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Write out what is still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
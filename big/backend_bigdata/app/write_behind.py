@@ -0,0 +1,297 @@
+"""Write-behind persistence for POST /predict (WRITE_BEHIND_ENABLED=true).
+
+A request appends its row to a local journal and returns once the journal is
+fsynced; concurrent requests share one fsync. A background task group-commits the
+queued rows every WRITE_BEHIND_MAX_ROWS rows or WRITE_BEHIND_MAX_DELAY_MS,
+whichever comes first, through crud.create_predictions_bulk (one multi-row INSERT
+per chunk).
+
+The journal is a series of segment files, one per flush: the flusher switches to a
+new segment in the same step as it takes the queued rows (nothing awaits in
+between, so the old segment holds exactly the rows of the batch) and deletes the
+old one after the batch is committed. Segments left behind by a crash are replayed at startup. A worker holds
+an exclusive flock on its open segment, so a restarting worker only replays
+segments whose writer is gone. Segment names carry a random token next to the pid
+and are created exclusively: pids repeat across container restarts, and a new
+worker must never append to (and later delete) a segment that is still waiting to
+be replayed. Replay is at-least-once: a crash between the commit and the delete
+stores that batch again.
+"""
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+
+from app.broadcast import broadcaster, live_event
+from app.db import crud
+from app.db.session import AsyncSessionLocal
+from app.live_stats import live_stats
+from app.prometheus_metrics import (
+    WRITE_BEHIND_FLUSH_ROWS, WRITE_BEHIND_FLUSH_LATENCY, WRITE_BEHIND_ROW_DELAY, WRITE_BEHIND_PENDING,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "50"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "50000"))
+WRITE_BEHIND_JOURNAL_DIR = Path(os.getenv("WRITE_BEHIND_JOURNAL_DIR", "/tmp/prediction_journal"))
+# "false" only flushes to the OS: survives a worker crash, not a host crash
+WRITE_BEHIND_FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "true").lower() in ("1", "true", "yes")
+
+class WriteBehindFull(Exception):
+    """More than WRITE_BEHIND_MAX_PENDING rows are waiting for the database."""
+
+def _encode(record: dict, confidence: float) -> bytes:
+    entry = {"record": {**record, "timestamp": record["timestamp"].isoformat()}, "confidence": confidence}
+    return (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+
+def _decode(line: bytes):
+    entry = json.loads(line)
+    record = entry["record"]
+    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+    return record, entry["confidence"]
+
+class Journal:
+    """Append-only segment files with coalesced fsyncs."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._token = uuid.uuid4().hex[:12]
+        self._segment = 0
+        self._file = None
+        self._path = None
+        self._written = 0
+        self._synced = 0
+        self._sync_task = None
+        self._retiring = None
+
+    def _open_segment(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segment += 1
+        path = self.directory / f"predictions-{os.getpid()}-{self._token}-{self._segment:08d}.journal"
+        f = open(path, "xb")
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f, path
+
+    def open(self):
+        self._file, self._path = self._open_segment()
+
+    def append(self, data: bytes) -> int:
+        """Buffer one entry; returns its sequence number for ``wait_durable``."""
+        self._file.write(data)
+        self._written += 1
+        return self._written
+
+    async def wait_durable(self, seq: int):
+        while self._synced < seq:
+            if self._sync_task is None:
+                self._sync_task = asyncio.get_running_loop().create_task(
+                    self._sync(self._file, self._written, self._retiring)
+                )
+            await asyncio.shield(self._sync_task)
+
+    async def _sync(self, f, target: int, retiring):
+        """Make entries up to ``target`` durable: they are in ``f`` or in a retired segment."""
+        try:
+            f.flush()
+            if WRITE_BEHIND_FSYNC:
+                await asyncio.get_running_loop().run_in_executor(None, os.fsync, f.fileno())
+            if retiring is not None:
+                await asyncio.shield(retiring)
+            self._synced = max(self._synced, target)
+        finally:
+            self._sync_task = None
+
+    def rotate(self) -> asyncio.Task:
+        """Switch to a new segment now; the returned task syncs and closes the previous
+        one and returns its path."""
+        old_file, old_path, sync_task = self._file, self._path, self._sync_task
+        self._file, self._path = self._open_segment()
+        self._retiring = asyncio.get_running_loop().create_task(self._retire(old_file, old_path, sync_task))
+        return self._retiring
+
+    async def _retire(self, f, path: Path, sync_task) -> Path:
+        if sync_task is not None:
+            # It may still be fsyncing this file
+            await asyncio.shield(sync_task)
+        f.flush()
+        if WRITE_BEHIND_FSYNC:
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, f.fileno())
+        f.close()
+        return path
+
+    def close(self) -> Path:
+        self._file.close()
+        return self._path
+
+class WriteBehindBuffer:
+    def __init__(self, journal_dir: Path = WRITE_BEHIND_JOURNAL_DIR):
+        self.journal = Journal(journal_dir)
+        self._pending = []  # (record, confidence, queued_at)
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    async def submit(self, record: dict, confidence: float):
+        """Queue one prediction row; returns once it is in the fsynced journal."""
+        if len(self._pending) >= WRITE_BEHIND_MAX_PENDING:
+            raise WriteBehindFull()
+        seq = self.journal.append(_encode(record, confidence))
+        self._pending.append((record, confidence, time.monotonic()))
+        WRITE_BEHIND_PENDING.set(len(self._pending))
+        self._has_pending.set()
+        if len(self._pending) >= WRITE_BEHIND_MAX_ROWS:
+            self._full.set()
+        await self.journal.wait_durable(seq)
+
+    async def _write_chunk(self, chunk):
+        """Commit one list of (record, confidence, queued_at) in a single transaction."""
+        records = [record for record, _, _ in chunk]
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            rows = await crud.create_predictions_bulk(db, records)
+        WRITE_BEHIND_FLUSH_LATENCY.observe(time.perf_counter() - start)
+        WRITE_BEHIND_FLUSH_ROWS.observe(len(chunk))
+        now = time.monotonic()
+        for _, _, queued_at in chunk:
+            WRITE_BEHIND_ROW_DELAY.observe(now - queued_at)
+        live_stats.observe(
+            (row.id, r["machine_id"], row.timestamp, r["temperature"], r["humidity"], r["prediction"])
+            for r, row in zip(records, rows)
+        )
+        broadcaster.publish(
+            live_event(row.id, row.timestamp, r, confidence)
+            for (r, confidence, _), row in zip(chunk, rows)
+        )
+
+    @staticmethod
+    def _chunks(batch):
+        return [batch[i:i + WRITE_BEHIND_MAX_ROWS] for i in range(0, len(batch), WRITE_BEHIND_MAX_ROWS)]
+
+    async def _flush_once(self):
+        # No await until both are swapped: a row queued meanwhile would end up in the
+        # retired segment but not in this batch, and be lost with that segment
+        retiring = self.journal.rotate()
+        batch, self._pending = self._pending, []
+        self._has_pending.clear()
+        self._full.clear()
+        WRITE_BEHIND_PENDING.set(0)
+        try:
+            segment = await retiring
+        except Exception:
+            # The rows stay queued; the segment isn't deleted and is replayed on the next start
+            self._pending[:0] = batch
+            WRITE_BEHIND_PENDING.set(len(self._pending))
+            self._has_pending.set()
+            raise
+        for chunk in self._chunks(batch):
+            # Retry a chunk until it commits; earlier chunks are already stored
+            backoff = 0.5
+            while True:
+                try:
+                    await self._write_chunk(chunk)
+                    break
+                except Exception as e:
+                    if self._stopping:
+                        # The segment stays on disk and is replayed on the next start
+                        logger.error(f"Write-behind flush failed during shutdown, rows left in {segment}: {e}")
+                        return
+                    logger.error(f"Write-behind flush of {len(chunk)} rows failed, retrying in {backoff:.1f}s: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 10.0)
+        segment.unlink(missing_ok=True)
+
+    async def _flush_loop(self):
+        backoff = 0.5
+        while not self._stopping:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=WRITE_BEHIND_MAX_DELAY_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            if not self._pending:
+                continue
+            try:
+                await self._flush_once()
+                backoff = 0.5
+            except Exception:
+                # Keep flushing: with the loop gone /predict would answer 503 once
+                # WRITE_BEHIND_MAX_PENDING rows are queued
+                logger.exception(f"Write-behind flush failed, retrying in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+
+    async def replay(self):
+        """Store rows from journal segments of processes that are no longer running."""
+        directory = self.journal.directory
+        if not directory.is_dir():
+            return 0
+        replayed = 0
+        for path in sorted(directory.glob("predictions-*.journal")):
+            with open(path, "rb") as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker is still writing it
+                batch = []
+                for line in f:
+                    try:
+                        record, confidence = _decode(line)
+                    except (ValueError, KeyError):
+                        # A torn last line from the crash; it was never acknowledged
+                        logger.warning(f"Skipping unreadable journal entry in {path}")
+                        continue
+                    batch.append((record, confidence, time.monotonic()))
+                for chunk in self._chunks(batch):
+                    await self._write_chunk(chunk)
+                path.unlink()
+            replayed += len(batch)
+        if replayed:
+            logger.info(f"Replayed {replayed} predictions from the write-behind journal")
+        return replayed
+
+    async def start(self):
+        try:
+            await self.replay()
+        except Exception as e:
+            logger.error(f"Write-behind journal replay failed, segments kept for the next start: {e}")
+        self.journal.open()
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+        logger.info(
+            f"Write-behind enabled (max_rows={WRITE_BEHIND_MAX_ROWS}, max_delay_ms={WRITE_BEHIND_MAX_DELAY_MS}, "
+            f"journal={self.journal.directory})"
+        )
+
+    async def stop(self):
+        """Flush everything still queued and close the journal."""
+        if self._task is None:
+            return
+        # Let an in-flight flush finish instead of cancelling it halfway through a transaction
+        self._stopping = True
+        self._has_pending.set()
+        self._full.set()
+        await self._task
+        self._task = None
+        if self._pending:
+            await self._flush_once()
+        path = self.journal.close()
+        if path.exists() and path.stat().st_size == 0:
+            path.unlink()
+
+write_behind = WriteBehindBuffer()
+
+async def start_write_behind():
+    if WRITE_BEHIND_ENABLED:
+        await write_behind.start()
+
+async def stop_write_behind():
+    if WRITE_BEHIND_ENABLED:
+        await write_behind.stop()
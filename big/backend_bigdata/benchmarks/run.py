@@ -0,0 +1,290 @@
+"""Load-test and benchmark runner for the prediction API.
+
+    python -m benchmarks.run --database-url sqlite:////tmp/bench.db --rows 100000 \\
+        --concurrency 32 --requests 5000 --output bench.json
+
+Seeds the database with ``--rows`` predictions through crud.create_predictions_bulk,
+starts benchmarks.stub_server (the real app with a stub Kafka producer) in a
+subprocess and drives each scenario with ``--concurrency`` concurrent clients.
+Results (throughput and p50/p95/p99 latency per scenario) are written as JSON.
+
+Regressions fail the run (exit code 1): absolute limits come from ``--thresholds``
+(benchmarks/thresholds.json by default, with one set of limits per database
+backend, picked from ``--database-url``), relative ones from comparing against a
+previous result file given with ``--baseline``. Needs httpx (``pip install .[bench]``).
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from sqlalchemy.engine import make_url
+
+SCENARIOS = ("predict", "batch", "history", "history_columnar", "machine", "stats", "machines")
+DEFAULT_THRESHOLDS = Path(__file__).with_name("thresholds.json")
+SEED_CHUNK = 10000
+FAR_FUTURE = "2100-01-01T00:00:00"
+
+def _machine_id(i: int) -> str:
+    return f"machine_{i}"
+
+async def seed(rows: int, machines: int):
+    """Insert ``rows`` synthetic predictions spread over ``machines`` machines."""
+    # Imported late: the engines read DATABASE_URL at import time
+    from app.db import crud
+    from app.db.base import Base, engine
+    from app.db.session import AsyncSessionLocal, async_engine
+    from app.scoring import score_batch
+
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(42)
+    written = 0
+    while written < rows:
+        n = min(SEED_CHUNK, rows - written)
+        scored = score_batch(
+            [_machine_id(i) for i in rng.integers(0, machines, n)],
+            rng.uniform(20, 110, n).round(1).tolist(),
+            rng.uniform(10, 95, n).round(1).tolist(),
+        )
+        async with AsyncSessionLocal() as db:
+            await crud.create_predictions_bulk(db, scored.records)
+        written += n
+    await async_engine.dispose()
+    engine.dispose()
+
+def _reading(machines: int) -> dict:
+    return {
+        "machineId": _machine_id(random.randrange(machines)),
+        "temperature": round(random.uniform(20, 110), 1),
+        "humidity": round(random.uniform(10, 95), 1),
+    }
+
+def _request_factory(scenario: str, machines: int, batch_size: int):
+    """Return a callable producing (method, url, json_body) for one request."""
+    if scenario == "predict":
+        return lambda: ("POST", "/predict", _reading(machines))
+    if scenario == "batch":
+        return lambda: ("POST", "/predict/batch", [_reading(machines) for _ in range(batch_size)])
+    if scenario == "history":
+        return lambda: ("GET", f"/history?limit=100&before_timestamp={FAR_FUTURE}", None)
+    if scenario == "history_columnar":
+        return lambda: ("GET", f"/history?limit=5000&before_timestamp={FAR_FUTURE}&format=columnar", None)
+    if scenario == "machine":
+        return lambda: (
+            "GET", f"/machine/{_machine_id(random.randrange(machines))}?limit=100&before_timestamp={FAR_FUTURE}", None
+        )
+    if scenario == "stats":
+        return lambda: ("GET", "/stats", None)
+    if scenario == "machines":
+        return lambda: ("GET", "/machines", None)
+    raise ValueError(f"Unknown scenario {scenario}")
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, requests: int, concurrency: int,
+                       machines: int, batch_size: int) -> dict:
+    """Closed-loop load: ``concurrency`` clients issue requests back to back until ``requests`` are done."""
+    make_request = _request_factory(scenario, machines, batch_size)
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, body = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 3),
+            "p50": round(float(np.percentile(ms, 50)), 3),
+            "p95": round(float(np.percentile(ms, 95)), 3),
+            "p99": round(float(np.percentile(ms, 99)), 3),
+            "max": round(float(ms.max()), 3),
+        },
+    }
+    if scenario == "batch":
+        result["rows_per_s"] = round(len(latencies) * batch_size / duration, 2)
+    return result
+
+def check_thresholds(results: dict, thresholds: dict) -> list:
+    """Absolute limits: min_rps, max_p50_ms, max_p95_ms, max_p99_ms, max_error_rate per scenario."""
+    failures = []
+    for scenario, limits in thresholds.items():
+        result = results.get(scenario)
+        if result is None:
+            continue
+        checks = [
+            ("min_rps", result["throughput_rps"], lambda v, lim: v >= lim),
+            ("max_p50_ms", result["latency_ms"]["p50"], lambda v, lim: v <= lim),
+            ("max_p95_ms", result["latency_ms"]["p95"], lambda v, lim: v <= lim),
+            ("max_p99_ms", result["latency_ms"]["p99"], lambda v, lim: v <= lim),
+            ("max_error_rate", result["errors"] / max(result["requests"], 1), lambda v, lim: v <= lim),
+        ]
+        for name, value, ok in checks:
+            if name in limits and not ok(value, limits[name]):
+                failures.append(f"{scenario}: {name} {limits[name]} violated ({value:.4g})")
+    return failures
+
+def backend_thresholds(thresholds: dict, database_url: str) -> dict:
+    """The limits for the backend of ``database_url`` ("postgresql", "sqlite", ...)."""
+    backend = make_url(database_url).get_backend_name()
+    if backend not in thresholds:
+        raise SystemExit(f"No thresholds for the {backend} backend")
+    return thresholds[backend]
+
+def compare_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Relative regressions against a previous run: throughput down or p99 up by more than ``tolerance``."""
+    failures = []
+    for scenario, result in results.items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        if result["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            failures.append(
+                f"{scenario}: throughput {result['throughput_rps']} rps vs baseline {previous['throughput_rps']}"
+            )
+        if result["latency_ms"]["p99"] > previous["latency_ms"]["p99"] * (1 + tolerance):
+            failures.append(
+                f"{scenario}: p99 {result['latency_ms']['p99']} ms vs baseline {previous['latency_ms']['p99']}"
+            )
+    return failures
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def _wait_until_up(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with code {server.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Benchmark server did not start")
+
+async def run(args) -> dict:
+    if args.rows:
+        print(f"Seeding {args.rows} rows...", file=sys.stderr)
+        started = time.perf_counter()
+        await seed(args.rows, args.machines)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    server_log = open(args.server_log, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_server", "--port", str(args.port)],
+        env=os.environ.copy(), stdout=server_log, stderr=subprocess.STDOUT,
+    )
+    results = {}
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+            await _wait_until_up(client, server)
+            for scenario in args.scenarios:
+                # A short warm-up so connection setup and first-call costs aren't measured
+                await run_scenario(client, scenario, min(args.concurrency * 2, args.requests),
+                                   args.concurrency, args.machines, args.batch_size)
+                results[scenario] = await run_scenario(
+                    client, scenario, args.requests, args.concurrency, args.machines, args.batch_size
+                )
+                print(f"{scenario}: {json.dumps(results[scenario])}", file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        server_log.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:////tmp/bench.db"))
+    parser.add_argument("--rows", type=int, default=10000, help="rows to seed before the run (0 to skip)")
+    parser.add_argument("--machines", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=500, help="readings per /predict/batch call")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--server-log", default="/tmp/bench-server.log", help="where the app's own output goes")
+    parser.add_argument("--thresholds", default=str(DEFAULT_THRESHOLDS), help="absolute limits ('' to skip)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change vs the baseline")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    thresholds = None
+    if args.thresholds:
+        thresholds = backend_thresholds(json.loads(Path(args.thresholds).read_text()), args.database_url)
+
+    os.environ["DATABASE_URL"] = args.database_url
+    started_at = datetime.now(timezone.utc).isoformat()
+    results = asyncio.run(run(args))
+
+    failures = []
+    if thresholds is not None:
+        failures += check_thresholds(results, thresholds)
+    if args.baseline:
+        failures += compare_baseline(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+
+    report = {
+        "meta": {
+            "started_at": started_at,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "database": args.database_url.split("://", 1)[0],
+            "rows_seeded": args.rows,
+            "machines": args.machines,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+        },
+        "scenarios": results,
+        "regressions": failures,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Micro-benchmark of the /history encoders, without a server or database.
+
+    python -m benchmarks.serialization --rows 100000 --repeat 5
+
+Compares the previous path (a PredictionHistory model per row, jsonable_encoder and
+json.dumps) with app.serialization in each format on synthetic rows shaped like
+crud.HISTORY_COLUMNS, and prints the best time and the body size per encoder as JSON.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+import numpy as np
+
+from app import serialization
+from app.api.predict import PredictionHistory
+
+Row = namedtuple("Row", serialization.COLUMNS)
+
+def make_rows(n: int, machines: int = 100):
+    rng = np.random.default_rng(42)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    temperatures = rng.uniform(20, 110, n).round(1).tolist()
+    humidities = rng.uniform(10, 95, n).round(1).tolist()
+    return [
+        Row(i + 1, f"machine_{i % machines}", t, h, t > 80, "v1.0", start + timedelta(seconds=i))
+        for i, (t, h) in enumerate(zip(temperatures, humidities))
+    ]
+
+def pydantic_path(rows) -> bytes:
+    models = [PredictionHistory(**serialization.row_dict(p)) for p in rows]
+    return json.dumps(jsonable_encoder(models), separators=(",", ":")).encode()
+
+def _best_of(encode, rows, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    encoders = {"pydantic": pydantic_path}
+    for fmt in serialization.HISTORY_FORMATS:
+        encoders[fmt] = lambda r, fmt=fmt: serialization.encode_rows(r, fmt)[0]
+
+    results = {}
+    for name, encode in encoders.items():
+        try:
+            seconds, size = _best_of(encode, rows, args.repeat)
+        except serialization.FormatUnavailable as e:
+            results[name] = {"skipped": str(e)}
+            continue
+        results[name] = {"ms": round(seconds * 1000, 2), "bytes": size}
+    baseline = results["pydantic"]["ms"]
+    for result in results.values():
+        if "ms" in result:
+            result["speedup"] = round(baseline / result["ms"], 1)
+    print(json.dumps({"rows": args.rows, "encoders": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Serve app.main with the Kafka producer replaced by an in-memory stub.
+
+    python -m benchmarks.stub_server --port 8765
+
+Events still go through the outbox queue and the publisher thread, so the request
+path is the production one; only the network send to the broker is skipped.
+"""
+import argparse
+
+import uvicorn
+import app.kafka_producer as kafka_producer
+
+class _StubFuture:
+    def add_callback(self, callback, *args, **kwargs):
+        callback(None, *args, **kwargs)
+        return self
+
+    def add_errback(self, errback, *args, **kwargs):
+        return self
+
+    def get(self, timeout=None):
+        return None
+
+class StubProducer:
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, topic, value=None, key=None):
+        self.sent += 1
+        return _StubFuture()
+
+    def bootstrap_connected(self):
+        return True
+
+    def partitions_for(self, topic):
+        return {0}
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    kafka_producer._producer = StubProducer()
+    from app.main import app
+    # The access log is not part of the app's own cost
+    uvicorn.run(app, host=args.host, port=args.port, workers=1, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
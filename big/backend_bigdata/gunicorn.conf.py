@@ -0,0 +1,56 @@
+"""gunicorn settings for the multi-worker deployment.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Every worker is a separate uvicorn event loop with its own database pool, Kafka
+producer and background threads, created after the fork (the app is not preloaded,
+so nothing holding sockets or threads is shared across processes). One-time work,
+creating the tables, resetting the Prometheus multiprocess directory and forgetting
+the last model hot swap, runs once
+in the master before any worker starts.
+"""
+import os
+import shutil
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+# SSE clients keep connections open; don't recycle workers under them too eagerly
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+preload_app = False
+
+# Must be in the environment before a worker imports prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+os.environ["DB_CREATE_ALL_ON_STARTUP"] = "false"
+if workers > 1:
+    # Per-process caches and aggregates would answer differently from one request
+    # to the next: share the response cache through Redis and serve /stats and
+    # /machines from the rollups instead of each worker's in-memory aggregator
+    os.environ.setdefault("CACHE_BACKEND", "redis")
+    os.environ.setdefault("LIVE_STATS_ENABLED", "false")
+
+def on_starting(server):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    # Files left by a previous run would be summed into the new counters
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    from app.model_loader import MODEL_ACTIVE_FILE
+    # A restart goes back to MODEL_VERSION instead of the last hot swap
+    MODEL_ACTIVE_FILE.unlink(missing_ok=True)
+
+    from app.db.base import Base, engine
+    try:
+        Base.metadata.create_all(bind=engine)
+        server.log.info("Database tables created successfully")
+    except Exception as e:
+        server.log.error(f"Failed to create database tables: {e}")
+    finally:
+        # Don't hand pooled connections to the forked workers
+        engine.dispose()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,66 @@
+"""Shared fixtures: a throwaway SQLite database with the schema, empty per-process caches,
+a runner for coroutines and an in-process client for the prediction routes."""
+import asyncio
+import os
+import tempfile
+
+# app.db binds its engines to DATABASE_URL on import, so this has to come first
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.setdefault("LOG_FORMAT", "text")
+
+import pytest
+
+@pytest.fixture
+def database():
+    from app import idempotency, machine_registry
+    from app.db import models  # noqa: F401  (registers the tables on Base)
+    from app.db.base import Base, engine
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    machine_registry.machine_keys.clear()
+    idempotency.recent_keys._entries.clear()
+    return engine
+
+@pytest.fixture
+def run():
+    """asyncio.run that also closes the pooled connections, which belong to its loop."""
+    from app.db.session import async_engine
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return run
+
+@pytest.fixture
+def api(database, run, monkeypatch):
+    """api(method, url, **kwargs) -> httpx.Response from the prediction routes.
+
+    Responses are cached in memory and Kafka events are accepted without a broker.
+    """
+    import httpx
+    from fastapi import FastAPI
+    from app import cache
+    from app.api import predict
+
+    async def queue_prediction_events(events):
+        return [True] * len(events)
+
+    async def queue_prediction_event(event):
+        return True
+
+    monkeypatch.setattr(cache, "backend", cache.MemoryBackend())
+    monkeypatch.setattr(predict, "queue_prediction_events", queue_prediction_events)
+    monkeypatch.setattr(predict, "queue_prediction_event", queue_prediction_event)
+    app = FastAPI()
+    app.include_router(predict.router)
+
+    def call(method, url, **kwargs):
+        async def request():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                return await http.request(method, url, **kwargs)
+        return run(request())
+    return call
@@ -0,0 +1,83 @@
+"""Admission control: route classification, priority between classes and shedding."""
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, Shed
+
+@pytest.fixture
+def controller(monkeypatch):
+    """One slot per class, so every second request has to queue."""
+    for name in ("INGEST", "READ", "BULK"):
+        monkeypatch.setenv(f"ADMISSION_{name}_CONCURRENCY", "1")
+        monkeypatch.setenv(f"ADMISSION_{name}_QUEUE", "2")
+        monkeypatch.setenv(f"ADMISSION_{name}_MAX_WAIT_MS", "1000")
+    return AdmissionController()
+
+@pytest.mark.parametrize("method, path, query, expected", [
+    ("POST", "/predict", b"", "ingest"),
+    ("POST", "/predict/batch", b"", "ingest"),
+    ("GET", "/history", b"limit=5", "read"),
+    ("GET", "/history/archive", b"", "read"),
+    ("GET", "/machine/m1", b"format=columnar", "read"),
+    ("GET", "/machine/m1/timeseries", b"", "read"),
+    ("GET", "/history", b"stream=true", "bulk"),
+    ("GET", "/history/archive", b"machine_id=m1&stream=true", "bulk"),
+    ("GET", "/machine/m1", b"stream=1", "bulk"),
+    ("GET", "/predictions/export", b"", "bulk"),
+    ("POST", "/predictions/import", b"", "bulk"),
+    ("GET", "/machine/m1", b"stream=false", "read"),
+    ("GET", "/stream/predictions", b"", None),
+    ("GET", "/ready", b"", None),
+])
+def test_routes_are_classified(controller, method, path, query, expected):
+    route_class = controller.classify(method, path, query)
+    assert (route_class and route_class.name) == expected
+
+def test_queued_ingest_is_admitted_before_reads_and_bulk(controller):
+    ingest, read, bulk = (controller.classify(*route) for route in (
+        ("POST", "/predict"), ("GET", "/stats"), ("GET", "/history", b"stream=true"),
+    ))
+    admitted = []
+
+    async def request(route_class, name):
+        await controller.acquire(route_class)
+        admitted.append(name)
+
+    async def scenario():
+        for route_class in (ingest, read, bulk):
+            await controller.acquire(route_class)
+        waiting = [asyncio.create_task(request(c, n)) for c, n in ((bulk, "bulk"), (read, "read"), (ingest, "ingest"))]
+        await asyncio.sleep(0)
+        # A free read or bulk slot doesn't let their queue past the waiting ingest request
+        controller.release(bulk, 0.0)
+        controller.release(read, 0.0)
+        await asyncio.sleep(0)
+        assert admitted == []
+        controller.release(ingest, 0.0)
+        await asyncio.gather(*waiting)
+
+    asyncio.run(scenario())
+    assert admitted == ["ingest", "read", "bulk"]
+
+def test_requests_are_shed_on_a_full_queue_or_a_long_estimated_wait(controller):
+    read = controller.classify("GET", "/stats")
+
+    async def scenario():
+        await controller.acquire(read)
+        waiting = [asyncio.create_task(controller.acquire(read)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as full:
+            await controller.acquire(read)
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+        read.service_time = 2 * read.max_wait
+        with pytest.raises(Shed) as deadline:
+            await controller.acquire(read)
+        return full.value, deadline.value
+
+    full, deadline = asyncio.run(scenario())
+    assert full.reason == "queue_full"
+    assert deadline.reason == "deadline" and deadline.retry_after > read.max_wait
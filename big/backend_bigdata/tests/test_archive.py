@@ -0,0 +1,34 @@
+"""Parquet archives keep the double precision of the typed columns."""
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app import bulk_io
+from app.db import archive
+
+def archived_table(schema, first_id, temperature):
+    row = {
+        "id": first_id, "machine_id": "m1", "features": "{}", "prediction": 1.0,
+        "temperature": temperature, "humidity": 40.125, "needs_maintenance": True,
+        "model_version": "test", "timestamp": datetime(2025, 1, 1, tzinfo=timezone.utc),
+    }
+    return pa.Table.from_pylist([row], schema=schema)
+
+def test_export_schema_keeps_double_precision():
+    for schema in (archive.ARCHIVE_SCHEMA, bulk_io.EXPORT_SCHEMA):
+        assert schema.field("temperature").type == pa.float64()
+        assert schema.field("humidity").type == pa.float64()
+
+def test_archives_of_both_precisions_are_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    # Written before the columns were double precision
+    old_schema = archive.ARCHIVE_SCHEMA.set(
+        archive.ARCHIVE_SCHEMA.get_field_index("temperature"), pa.field("temperature", pa.float32())
+    )
+    pq.write_table(archived_table(old_schema, 1, 21.5), tmp_path / "predictions_p2024_12.parquet")
+    pq.write_table(archived_table(archive.ARCHIVE_SCHEMA, 2, 21.123456789), tmp_path / "predictions_p2025_01.parquet")
+
+    rows = sorted(archive.iter_archived(machine_id="m1"), key=lambda r: r.id)
+
+    assert [r.temperature for r in rows] == [21.5, 21.123456789]
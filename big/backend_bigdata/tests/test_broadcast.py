@@ -0,0 +1,73 @@
+"""Prediction stream: subscriptions follow the response, the relay follows the subscribers."""
+import asyncio
+import time
+
+from starlette.requests import Request
+
+from app import broadcast
+from app.api import stream
+from app.broadcast import PredictionBroadcaster
+
+class FakeRelayConsumer:
+    def __init__(self):
+        self.closed = False
+
+    def poll(self, timeout_ms=0):
+        time.sleep(0.01)
+        return {}
+
+    def close(self):
+        self.closed = True
+
+def test_relay_stops_when_the_last_subscriber_has_been_gone_a_while(monkeypatch):
+    consumers = []
+
+    def open_relay_consumer():
+        consumers.append(FakeRelayConsumer())
+        return consumers[-1]
+
+    monkeypatch.setattr(broadcast, "_open_relay_consumer", open_relay_consumer)
+    monkeypatch.setattr(broadcast, "STREAM_RELAY_IDLE_SECONDS", 0.05)
+    broadcaster = PredictionBroadcaster(source="kafka")
+
+    async def scenario():
+        first = broadcaster.subscribe()
+        relay = broadcaster._relay_thread
+        broadcaster.unsubscribe(first)
+        # A client reconnecting within the idle time keeps the same relay
+        second = broadcaster.subscribe()
+        await asyncio.sleep(0.1)
+        assert broadcaster._relay_thread is relay and relay.is_alive()
+
+        broadcaster.unsubscribe(second)
+        await asyncio.sleep(0.1)
+        assert broadcaster._relay_thread is None
+        relay.join(timeout=1)
+        return relay
+
+    relay = asyncio.run(scenario())
+    assert not relay.is_alive()
+    assert len(consumers) == 1 and consumers[0].closed
+
+def request() -> Request:
+    async def receive():
+        return {"type": "http.disconnect"}
+    return Request({"type": "http", "method": "GET", "path": "/stream/predictions", "headers": []}, receive)
+
+def test_stream_subscribes_only_while_the_response_is_sent(monkeypatch):
+    broadcaster = PredictionBroadcaster(source="local")
+    monkeypatch.setattr(stream, "broadcaster", broadcaster)
+
+    async def scenario():
+        # Response built, client gone before it was sent
+        response = await stream.stream_predictions(request(), machine_id="m1")
+        assert broadcaster._subscribers == set()
+
+        body = response.body_iterator
+        assert await body.__anext__() == "retry: 3000\n\n"
+        subscription, = broadcaster._subscribers
+        assert subscription.machine_id == "m1"
+        await body.aclose()
+        return broadcaster._subscribers
+
+    assert asyncio.run(scenario()) == set()
@@ -0,0 +1,67 @@
+"""Response cache: ETag revalidation and invalidation through generations."""
+import pytest
+
+from app import cache
+from app.db import crud
+
+READING = {"temperature": 95.0, "humidity": 80.0}
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Paths whose page was read from the database, in order."""
+    seen = []
+    get_predictions_page = crud.get_predictions_page
+
+    async def counted(db, limit=None, **filters):
+        seen.append(filters["machine_id"])
+        return await get_predictions_page(db, limit=limit, **filters)
+
+    monkeypatch.setattr(crud, "get_predictions_page", counted)
+    return seen
+
+def test_unchanged_pages_revalidate_with_304(api, queries):
+    api("POST", "/predict", json={"machineId": "m1", **READING})
+    first = api("GET", "/history")
+    etag = first.headers["ETag"]
+
+    again = api("GET", "/history", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == etag
+    assert queries == [None]
+
+    api("POST", "/predict", json={"machineId": "m1", **READING})
+    changed = api("GET", "/history", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+def test_writes_only_invalidate_their_machine_and_global_reads(api, queries):
+    for machine_id in ("m1", "m2"):
+        api("POST", "/predict", json={"machineId": machine_id, **READING})
+    for url in ("/machine/m1", "/machine/m2", "/history"):
+        api("GET", url)
+
+    api("POST", "/predict", json={"machineId": "m2", **READING})
+    for url in ("/machine/m1", "/machine/m2", "/history"):
+        api("GET", url)
+
+    assert queries == ["m1", "m2", None, "m2", None]
+
+def test_invalidate_all_drops_every_entry(api, queries, run):
+    api("POST", "/predict", json={"machineId": "m1", **READING})
+    api("GET", "/machine/m1")
+    run(cache.invalidate_all())
+    api("GET", "/machine/m1")
+
+    assert queries == ["m1", "m1"]
+
+def test_responses_are_served_while_the_backend_fails(api, queries, monkeypatch):
+    class Unreachable(cache.MemoryBackend):
+        async def generations(self, names):
+            raise ConnectionError("cache down")
+
+    api("POST", "/predict", json={"machineId": "m1", **READING})
+    monkeypatch.setattr(cache, "backend", Unreachable())
+    responses = [api("GET", "/history") for _ in range(2)]
+
+    assert [r.status_code for r in responses] == [200, 200]
+    assert queries == [None, None]
@@ -0,0 +1,66 @@
+"""/ready and the warm-up: readiness rules and creating the Kafka producer once."""
+import threading
+import time
+
+import pytest
+
+from app import health, kafka_producer
+
+@pytest.fixture
+def probe(database, monkeypatch, run):
+    """readiness() of a warmed-up worker whose Kafka producer was never created."""
+    state = health._State()
+    state.warmed = True
+    monkeypatch.setattr(health, "state", state)
+    monkeypatch.setattr(kafka_producer, "_producer", None)
+    return lambda: run(health.readiness())
+
+def test_ready_once_warmed_with_database_and_model(probe):
+    report = probe()
+    assert report["status"] == "ready"
+    assert report["checks"]["database"]["ok"] and report["checks"]["model"]["ok"]
+    # Predictions are still stored while Kafka is down
+    assert not report["checks"]["kafka"]["ok"]
+
+def test_not_ready_before_warm_up_or_during_shutdown(probe):
+    health.state.warmed = False
+    assert probe()["status"] == "not_ready"
+    health.state.warmed = True
+    health.state.shutting_down = True
+    assert probe()["status"] == "not_ready"
+
+def test_not_ready_when_a_required_check_fails(probe, monkeypatch):
+    monkeypatch.setattr(health, "READY_REQUIRE_KAFKA", True)
+    assert probe()["status"] == "not_ready"
+    monkeypatch.setattr(health, "READY_REQUIRE_KAFKA", False)
+
+    async def unreachable():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(health, "_ping_database", unreachable)
+    report = probe()
+    assert report["status"] == "not_ready"
+    assert report["checks"]["database"] == {
+        "ok": False, "error": "database down", "latency_ms": report["checks"]["database"]["latency_ms"],
+    }
+
+def test_concurrent_callers_create_one_producer(monkeypatch):
+    created = []
+
+    class SlowProducer:
+        def __init__(self, **config):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(kafka_producer, "_producer", None)
+    monkeypatch.setattr(kafka_producer, "KafkaProducer", SlowProducer)
+    producers = []
+    # Warm-up (threadpool) and the publisher thread racing on first use
+    threads = [threading.Thread(target=lambda: producers.append(kafka_producer.get_kafka_producer())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(producer is created[0] for producer in producers)
@@ -0,0 +1,47 @@
+"""History pages: bounded by default, capped, and paged newest first through the cursor."""
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+
+import pytest
+
+from app.api import predict
+from app.db import crud
+from app.db.session import AsyncSessionLocal
+
+@pytest.fixture
+def client(api, run):
+    """GET against the prediction routes; machine m1 has a default page of readings plus 2."""
+    start = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+    async def seed():
+        async with AsyncSessionLocal() as db:
+            await crud.create_predictions_bulk(db, [{
+                "machine_id": "m1", "features": {}, "prediction": 0, "temperature": 20.0,
+                "humidity": 40.0, "needs_maintenance": False, "model_version": "test",
+                "timestamp": start + timedelta(minutes=i),
+            } for i in range(predict.HISTORY_DEFAULT_PAGE_SIZE + 2)])
+
+    run(seed())
+    return lambda url: api("GET", url)
+
+def test_pages_without_limit_are_bounded(client):
+    page_size = predict.HISTORY_DEFAULT_PAGE_SIZE
+    for url in ("/history", "/machine/m1"):
+        response = client(url)
+        assert response.status_code == 200
+        assert [row["id"] for row in response.json()] == list(range(1, page_size + 1))
+        assert parse_qs(response.headers["X-Next-Cursor"]) == {"after_id": [str(page_size)]}
+
+def test_limit_above_the_maximum_is_rejected(client):
+    response = client(f"/history?limit={predict.HISTORY_MAX_PAGE_SIZE + 1}")
+    assert response.status_code == 422
+
+def test_newest_first_pages_follow_the_cursor(client):
+    stored = predict.HISTORY_DEFAULT_PAGE_SIZE + 2
+    seen, url = [], "/machine/m1?limit=25&before_timestamp=2100-01-01T00:00:00"
+    while url:
+        response = client(url)
+        seen += [row["id"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        url = cursor and f"/machine/m1?limit=25&{cursor}"
+    assert seen == list(range(stored, 0, -1))
@@ -0,0 +1,80 @@
+"""Idempotency keys: replayed retries, keys pruned mid-request and concurrent duplicates."""
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from app import idempotency
+from app.db import crud
+from app.db.models import Prediction
+from app.db.session import AsyncSessionLocal
+
+READING = {"machineId": "m1", "temperature": 95.0, "humidity": 80.0}
+
+def stored_rows(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(Prediction.id))).scalar()
+
+def test_retries_replay_the_original_response(api, database):
+    first = api("POST", "/predict", json=READING, headers={"Idempotency-Key": "retry-1"})
+    cached = api("POST", "/predict", json=READING, headers={"Idempotency-Key": "retry-1"})
+    # Another worker: nothing in its LRU, the key is found in the database
+    idempotency.recent_keys._entries.clear()
+    stored = api("POST", "/predict", json=READING, headers={"Idempotency-Key": "retry-1"})
+
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers
+    for retry in (cached, stored):
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert retry.json() == first.json()
+    assert first.json()["kafka_sent"] is True
+    assert stored_rows(database) == 1
+
+def test_batch_readings_are_keyed_by_machine_and_timestamp(api, database):
+    reading = {**READING, "timestamp": "2026-10-18T10:00:00+00:00"}
+    first = api("POST", "/predict/batch", json=[reading, {**reading, "machineId": "m2"}])
+    retry = api("POST", "/predict/batch", json=[reading, reading, {**reading, "machineId": "m3"}])
+
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()[:2] == [first.json()[0]] * 2
+    assert stored_rows(database) == 3
+
+def test_key_pruned_before_its_response_is_read_answers_409(api, database, monkeypatch):
+    api("POST", "/predict", json=READING, headers={"Idempotency-Key": "pruned"})
+    idempotency.recent_keys._entries.clear()
+    get_key_responses = crud.get_key_responses
+
+    async def pruned_first(db, keys):
+        # The pruning task runs between the conflicting insert and the lookup
+        await crud.delete_expired_keys(db, datetime(2100, 1, 1, tzinfo=timezone.utc))
+        return await get_key_responses(db, keys)
+
+    monkeypatch.setattr(crud, "get_key_responses", pruned_first)
+    response = api("POST", "/predict", json=READING, headers={"Idempotency-Key": "pruned"})
+
+    assert response.status_code == 409
+    assert stored_rows(database) == 1
+
+def test_concurrent_writers_of_one_key_store_it_once(database, run):
+    record = {
+        "machine_id": "m1", "features": {}, "prediction": 1, "temperature": 95.0, "humidity": 80.0,
+        "needs_maintenance": True, "model_version": "test",
+        "timestamp": datetime(2026, 10, 18, 10, tzinfo=timezone.utc),
+    }
+
+    async def write(response):
+        async with AsyncSessionLocal() as db:
+            return await crud.create_predictions_once(db, [record, record], [("same", response), ("same", response)])
+
+    async def scenario():
+        results = await asyncio.gather(write({"writer": 1}), write({"writer": 2}))
+        async with AsyncSessionLocal() as db:
+            return results, await crud.get_key_responses(db, ["same"])
+
+    results, responses = run(scenario())
+    stored = [row for rows in results for row in rows if row is not None]
+    assert len(stored) == 1
+    # The repeat within a call is a duplicate too
+    assert all(rows[1] is None for rows in results)
+    winner = 1 if results[0][0] is not None else 2
+    assert responses == {"same": {"writer": winner}}
+    assert stored_rows(database) == 1
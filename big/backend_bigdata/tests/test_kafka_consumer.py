@@ -0,0 +1,140 @@
+"""SensorIngestWorker against an in-memory consumer, a fake publisher and SQLite."""
+from collections import namedtuple
+import json
+
+import pytest
+from kafka.structs import TopicPartition
+from sqlalchemy import func, select
+
+from app import kafka_consumer
+from app.db.models import Prediction
+from app.kafka_consumer import SensorIngestWorker
+
+Message = namedtuple("Message", "topic partition offset value")
+
+class FakeConsumer:
+    """One partition holding ``values``; poll() returns everything from the position on."""
+
+    def __init__(self, values):
+        self.tp = TopicPartition("sensor-readings", 0)
+        self.messages = [Message(self.tp.topic, self.tp.partition, offset, value) for offset, value in enumerate(values)]
+        self.position_ = 0
+        # Offset of the next message to consume, as Kafka stores it; None until a commit
+        self.committed = None
+
+    def poll(self, timeout_ms=0, max_records=None):
+        batch = self.messages[self.position_:self.position_ + (max_records or len(self.messages))]
+        self.position_ += len(batch)
+        return {self.tp: batch} if batch else {}
+
+    def commit(self):
+        self.committed = self.position_
+
+    def seek(self, tp, offset):
+        self.position_ = offset
+
+    def assignment(self):
+        return {self.tp}
+
+    def position(self, tp):
+        return self.position_
+
+    def end_offsets(self, tps):
+        return {self.tp: len(self.messages)}
+
+class FakeProducer:
+    """Collects what the worker publishes to the predictions and dead-letter topics."""
+
+    def __init__(self, fail_dead_letters=False):
+        self.events = []
+        self.dead_letters = []
+        self.fail_dead_letters = fail_dead_letters
+
+    async def publish(self, events):
+        self.events.extend(events)
+        return [True] * len(events)
+
+    async def send_dead_letters(self, records):
+        if self.fail_dead_letters:
+            raise ConnectionError("broker unavailable")
+        self.dead_letters.extend(records)
+
+def reading(machine_id, temperature=95.0, humidity=80.0, timestamp=None) -> bytes:
+    data = {"machineId": machine_id, "temperature": temperature, "humidity": humidity}
+    if timestamp is not None:
+        data["timestamp"] = timestamp
+    return json.dumps(data).encode()
+
+def make_worker(values, **producer_options):
+    consumer, producer = FakeConsumer(values), FakeProducer(**producer_options)
+    worker = SensorIngestWorker(consumer, publish=producer.publish, send_dead_letters=producer.send_dead_letters)
+    return worker, consumer, producer
+
+def stored_rows(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(Prediction.id))).scalar()
+
+def test_offsets_committed_after_the_write(database, run):
+    worker, consumer, producer = make_worker([reading("m1"), reading("m2", 20.0, 20.0)])
+
+    assert run(worker.run_once()) == 2
+
+    assert consumer.committed == 2
+    assert stored_rows(database) == 2
+    assert sorted(e["machine_id"] for e in producer.events) == ["m1", "m2"]
+    assert all(e["id"] is not None for e in producer.events)
+
+def test_failed_write_rewinds_without_committing(database, run, monkeypatch):
+    worker, consumer, producer = make_worker([reading("m1"), reading("m2")])
+
+    async def failing_write(db, records):
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(kafka_consumer.crud, "create_predictions_bulk", failing_write)
+    with pytest.raises(ConnectionError):
+        run(worker.run_once())
+    assert consumer.committed is None
+    assert consumer.position_ == 0
+    assert producer.events == []
+
+    monkeypatch.undo()
+    assert run(worker.run_once()) == 2
+    assert consumer.committed == 2
+    assert stored_rows(database) == 2
+
+def test_malformed_messages_go_to_the_dead_letter_topic(database, run):
+    values = [reading("m1"), b"not json", json.dumps({"machineId": "m2", "humidity": 10}).encode(), reading("m3")]
+    worker, consumer, producer = make_worker(values)
+
+    assert run(worker.run_once()) == 2
+
+    assert [(d["offset"], d["value"]) for d in producer.dead_letters] == [(1, "not json"), (2, values[2].decode())]
+    assert all(d["topic"] == "sensor-readings" and d["partition"] == 0 for d in producer.dead_letters)
+    assert consumer.committed == 4
+    assert stored_rows(database) == 2
+
+def test_dead_letter_failure_rewinds_before_the_write(database, run):
+    worker, consumer, producer = make_worker([reading("m1"), b"{}"], fail_dead_letters=True)
+
+    with pytest.raises(ConnectionError):
+        run(worker.run_once())
+
+    assert consumer.committed is None
+    assert consumer.position_ == 0
+    assert stored_rows(database) == 0
+
+def test_redelivered_readings_are_stored_once(database, run):
+    values = [
+        reading("m1", timestamp="2026-10-18T10:00:00+00:00"),
+        reading("m2", timestamp="2026-10-18T10:00:01+00:00"),
+    ]
+    worker, consumer, producer = make_worker(values)
+    assert run(worker.run_once()) == 2
+
+    # A consumer that crashed before its commit gets the same messages again
+    consumer.seek(consumer.tp, 0)
+    assert run(worker.run_once()) == 0
+
+    assert consumer.committed == 2
+    assert stored_rows(database) == 2
+    assert len(producer.events) == 2
@@ -0,0 +1,85 @@
+"""Kafka outbox: drop logging and keeping accepted events while the producer is down."""
+import logging
+import queue
+import threading
+
+import pytest
+from kafka.errors import KafkaError
+
+from app import kafka_producer
+
+class FakeKafkaProducer:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, topic, key=None, value=None):
+        self.sent.append(value)
+        return FakeFuture()
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self):
+        pass
+
+class FakeFuture:
+    def add_callback(self, callback, *args):
+        pass
+
+    def add_errback(self, errback):
+        pass
+
+@pytest.fixture
+def outbox(monkeypatch, tmp_path):
+    """A two-item outbox, a spill file in tmp_path and a producer that is down until set."""
+    monkeypatch.setattr(kafka_producer, "_outbox", queue.Queue(maxsize=2))
+    monkeypatch.setattr(kafka_producer, "_unpublished", [])
+    monkeypatch.setattr(kafka_producer, "_publisher_stop", threading.Event())
+    monkeypatch.setattr(kafka_producer, "_drops_unlogged", 0)
+    monkeypatch.setattr(kafka_producer, "_drops_logged_at", 0.0)
+    monkeypatch.setattr(kafka_producer, "KAFKA_OUTBOX_SPILL_PATH", str(tmp_path / "spill.jsonl"))
+    monkeypatch.setattr(kafka_producer, "KAFKA_OUTBOX_POLICY", "drop")
+    # No back-off between reconnects
+    monkeypatch.setattr(kafka_producer._publisher_stop, "wait", lambda timeout=None: False)
+    state = {"producer": None}
+
+    def get_kafka_producer():
+        if state["producer"] is None:
+            raise KafkaError("no brokers available")
+        return state["producer"]
+
+    monkeypatch.setattr(kafka_producer, "get_kafka_producer", get_kafka_producer)
+    return state
+
+def events(*machine_ids):
+    return [{"machine_id": machine_id} for machine_id in machine_ids]
+
+def test_drops_are_logged_once_per_interval(outbox, run, caplog):
+    caplog.set_level(logging.WARNING, logger=kafka_producer.__name__)
+
+    assert run(kafka_producer.queue_prediction_events(events("m1", "m2", "m3", "m4"))) == [True, True, False, False]
+    assert run(kafka_producer.queue_prediction_events(events("m5"))) == [False]
+
+    drops = [r.getMessage() for r in caplog.records if "dropped" in r.getMessage()]
+    assert drops == ["Kafka outbox full, dropped 2 prediction event(s)"]
+
+def test_accepted_events_wait_for_the_producer(outbox, run):
+    run(kafka_producer.queue_prediction_events(events("m1", "m2")))
+
+    assert kafka_producer._drain_outbox(block=False)
+    assert [event["machine_id"] for _, event in kafka_producer._unpublished] == ["m1", "m2"]
+    run(kafka_producer.queue_prediction_events(events("m3")))
+
+    outbox["producer"] = FakeKafkaProducer()
+    while kafka_producer._drain_outbox(block=False):
+        pass
+    assert [e["machine_id"] for e in outbox["producer"].sent] == ["m1", "m2", "m3"]
+
+def test_close_spills_what_the_producer_cannot_take(outbox, run):
+    run(kafka_producer.queue_prediction_events(events("m1", "m2")))
+    kafka_producer._drain_outbox(block=False)
+    run(kafka_producer.queue_prediction_events(events("m3")))
+
+    kafka_producer.close_kafka_producer()
+
+    assert [event["machine_id"] for _, event in kafka_producer._take_spilled()] == ["m1", "m2", "m3"]
@@ -0,0 +1,86 @@
+"""Replica routing, fallback to the primary and read-your-writes through the cache."""
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.requests import Request
+
+from app import cache
+from app.db import routing, session
+from app.db.models import Prediction
+from app.db.routing import Replica, ReplicaSet
+
+@pytest.fixture
+def replica_set(monkeypatch, tmp_path):
+    """One replica (a second SQLite file) routed to by every new session."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    replicas = ReplicaSet()
+    replicas.add(engine)
+    monkeypatch.setattr(session, "read_engines", [engine])
+    monkeypatch.setattr(session, "replicas", replicas)
+    return replicas
+
+def bind_of(db, clause):
+    return db.sync_session.get_bind(clause=clause)
+
+def test_reads_use_a_healthy_replica_until_the_session_writes(replica_set, run):
+    run(replica_set.check())
+    replica = replica_set.replicas[0]
+    assert replica.healthy and replica.lag == 0.0
+
+    db = session.AsyncSessionLocal()
+    assert bind_of(db, select(Prediction.id)) is replica.engine.sync_engine
+    assert bind_of(db, insert(Prediction)) is session.async_engine.sync_engine
+    # Read-your-writes: the session stays on the primary from now on
+    assert bind_of(db, select(Prediction.id)) is session.async_engine.sync_engine
+
+def test_primary_sessions_never_read_a_replica(replica_set, run):
+    run(replica_set.check())
+    db = session.AsyncSessionLocal(info={"primary": True})
+    assert bind_of(db, select(Prediction.id)) is session.async_engine.sync_engine
+
+def test_failing_or_lagging_replicas_fall_back_to_the_primary(replica_set, run, monkeypatch):
+    replica = replica_set.replicas[0]
+
+    async def lagging(self):
+        return routing.REPLICA_MAX_LAG_SECONDS + 1
+
+    monkeypatch.setattr(Replica, "_lag", lagging)
+    run(replica_set.check())
+    assert not replica.healthy
+    assert bind_of(session.AsyncSessionLocal(), select(Prediction.id)) is session.async_engine.sync_engine
+
+    async def failing(self):
+        raise ConnectionError("replica down")
+
+    monkeypatch.setattr(Replica, "_lag", failing)
+    run(replica_set.check())
+    assert not replica.healthy and replica.error == "replica down"
+    assert replica_set.status()[replica.name]["healthy"] is False
+
+def request(headers=()) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/stats", "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+    })
+
+def test_primary_reads_skip_cached_bodies(monkeypatch, run):
+    monkeypatch.setattr(cache, "backend", cache.MemoryBackend())
+    bodies = iter([{"total": 1}, {"total": 2}, {"total": 3}])
+
+    async def produce():
+        return next(bodies), {}
+
+    async def scenario():
+        stale = await cache.cached_json_response(request(), "stats", cache.GLOBAL_SCOPE, produce)
+        cached = await cache.cached_json_response(request(), "stats", cache.GLOBAL_SCOPE, produce)
+        fresh = await cache.cached_json_response(
+            request([(session.READ_CONSISTENCY_HEADER, "primary")]), "stats", cache.GLOBAL_SCOPE, produce
+        )
+        after = await cache.cached_json_response(request(), "stats", cache.GLOBAL_SCOPE, produce)
+        return stale.body, cached.body, fresh.body, after.body
+
+    stale, cached, fresh, after = run(scenario())
+    assert cached == stale == b'{"total":1}'
+    assert fresh == b'{"total":2}'
+    # The primary's answer replaces the entry for everyone else
+    assert after == fresh
@@ -0,0 +1,98 @@
+"""Write-behind journal: segment naming, rotation and replay."""
+from datetime import datetime, timezone
+import fcntl
+import os
+
+from sqlalchemy import select
+
+from app.db.models import Prediction
+from app.write_behind import Journal, WriteBehindBuffer, _encode
+
+def record(machine_id, temperature=95.0, humidity=80.0) -> dict:
+    return {
+        "machine_id": machine_id,
+        "features": {"temperature": temperature, "humidity": humidity},
+        "prediction": 1,
+        "temperature": temperature,
+        "humidity": humidity,
+        "needs_maintenance": True,
+        "model_version": "test",
+        "timestamp": datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc),
+    }
+
+def stored_machines(engine) -> list:
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(Prediction.machine_id)).scalars())
+
+def segments(directory) -> list:
+    return sorted(p.name for p in directory.glob("predictions-*.journal"))
+
+def test_segment_names_are_unique_per_journal(tmp_path):
+    first, second = Journal(tmp_path), Journal(tmp_path)
+    first.open()
+    second.open()
+    try:
+        # Same pid, same segment number: the token tells them apart
+        assert len(segments(tmp_path)) == 2
+        assert all(name.startswith(f"predictions-{os.getpid()}-") for name in segments(tmp_path))
+    finally:
+        first.close()
+        second.close()
+
+def test_leftover_segment_is_not_reused(database, run, tmp_path):
+    # Left behind by an earlier worker with this pid whose replay failed
+    leftover = tmp_path / f"predictions-{os.getpid()}-00000001.journal"
+    leftover.write_bytes(_encode(record("m1"), 0.9))
+    buffer = WriteBehindBuffer(tmp_path)
+
+    async def scenario():
+        buffer.journal.open()
+        buffer.journal.append(_encode(record("m2"), 0.9))
+        await buffer.journal.wait_durable(1)
+        return buffer.journal.close()
+
+    path = run(scenario())
+    assert path != leftover
+    assert leftover.read_bytes() == _encode(record("m1"), 0.9)
+
+def test_replay_stores_and_removes_orphaned_segments(database, run, tmp_path):
+    orphan = tmp_path / "predictions-1-abc-00000001.journal"
+    # The crash tore the last line; it was never acknowledged
+    orphan.write_bytes(_encode(record("m1"), 0.9) + _encode(record("m2"), 0.8) + b'{"record": {"mach')
+
+    assert run(WriteBehindBuffer(tmp_path).replay()) == 2
+
+    assert stored_machines(database) == ["m1", "m2"]
+    assert not orphan.exists()
+
+def test_replay_skips_segments_of_live_writers(database, run, tmp_path):
+    live = tmp_path / "predictions-1-abc-00000001.journal"
+    live.write_bytes(_encode(record("m1"), 0.9))
+    with open(live, "rb") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert run(WriteBehindBuffer(tmp_path).replay()) == 0
+    assert live.exists()
+    assert stored_machines(database) == []
+
+def test_flush_rotates_and_deletes_the_committed_segment(database, run, tmp_path):
+    buffer = WriteBehindBuffer(tmp_path)
+
+    async def scenario():
+        buffer.journal.open()
+        first = buffer.journal._path
+        await buffer.submit(record("m1"), 0.9)
+        await buffer.submit(record("m2"), 0.9)
+        await buffer._flush_once()
+        current = buffer.journal._path
+        await buffer.submit(record("m3"), 0.9)
+        return first, current
+
+    first, current = run(scenario())
+    assert not first.exists()
+    assert current != first
+    # m3 is only journaled: a restart replays it
+    assert stored_machines(database) == ["m1", "m2"]
+    assert segments(tmp_path) == [current.name]
+    buffer.journal.close()
+    assert run(WriteBehindBuffer(tmp_path).replay()) == 1
+    assert stored_machines(database) == ["m1", "m2", "m3"]
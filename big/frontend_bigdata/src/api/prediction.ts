@@ -43,6 +43,27 @@ export interface MachineInfo {
   last_timestamp: string | null;
 }
 
+export interface TimeseriesPoint {
+  bucket_start: string;
+  count: number;
+  maintenance_count: number;
+  temperature_min: number | null;
+  temperature_mean: number | null;
+  temperature_max: number | null;
+  humidity_min: number | null;
+  humidity_mean: number | null;
+  humidity_max: number | null;
+}
+
+// Reads can be served by a database replica that lags the primary a little; for a
+// while after this client's own write, ask for the primary so the write shows up.
+const READ_YOUR_WRITES_MS = 10000;
+let lastWriteAt = 0;
+
+function readHeaders(): HeadersInit {
+  return Date.now() - lastWriteAt < READ_YOUR_WRITES_MS ? { 'X-Read-Consistency': 'primary' } : {};
+}
+
 // API Functions
 export async function postPredict(payload: PredictRequest): Promise<PredictResponse> {
   const response = await fetch(`${API_BASE}/predict`, {
@@ -61,21 +82,67 @@ export async function postPredict(payload: PredictRequest): Promise<PredictRespo
     throw new Error('Network response was not ok');
   }
 
+  lastWriteAt = Date.now();
   return response.json();
 }
 
-export async function getHistory(): Promise<PredictionHistory[]> {
-  const response = await fetch(`${API_BASE}/history`);
-  
+// History as one array per column (?format=columnar): about a third of the row-object JSON
+interface PredictionColumns {
+  id: number[];
+  machine_id: string[];
+  temperature: (number | null)[];
+  humidity: (number | null)[];
+  needs_maintenance: boolean[];
+  model_version: string[];
+  timestamp: string[];
+}
+
+function fromColumns(columns: PredictionColumns): PredictionHistory[] {
+  return columns.id.map((id, i) => ({
+    id,
+    machine_id: columns.machine_id[i],
+    features: {
+      temperature: columns.temperature[i] ?? undefined,
+      humidity: columns.humidity[i] ?? undefined,
+    },
+    prediction: columns.needs_maintenance[i] ? 1 : 0,
+    needs_maintenance: columns.needs_maintenance[i],
+    model_version: columns.model_version[i],
+    timestamp: columns.timestamp[i],
+  }));
+}
+
+// One page of history, newest first; pass `nextCursor` back in to get the page after it
+export interface HistoryPage {
+  predictions: PredictionHistory[];
+  nextCursor: string | null;
+}
+
+// Pages are requested newest first (before_timestamp) so the first one holds the latest rows
+const NEWEST_FIRST = 'before_timestamp=2100-01-01T00:00:00';
+
+async function getHistoryPage(path: string, limit: number, cursor?: string | null): Promise<HistoryPage> {
+  const response = await fetch(
+    `${API_BASE}${path}?format=columnar&limit=${limit}&${cursor || NEWEST_FIRST}`,
+    { headers: readHeaders() }
+  );
+
   if (!response.ok) {
     throw new Error('Failed to fetch history');
   }
-  
-  return response.json();
+
+  return {
+    predictions: fromColumns(await response.json()),
+    nextCursor: response.headers.get('X-Next-Cursor'),
+  };
+}
+
+export async function getHistory(limit = 50, cursor?: string | null): Promise<HistoryPage> {
+  return getHistoryPage('/history', limit, cursor);
 }
 
 export async function getStats(): Promise<StatsResponse> {
-  const response = await fetch(`${API_BASE}/stats`);
+  const response = await fetch(`${API_BASE}/stats`, { headers: readHeaders() });
   
   if (!response.ok) {
     throw new Error('Failed to fetch stats');
@@ -85,7 +152,7 @@ export async function getStats(): Promise<StatsResponse> {
 }
 
 export async function getMachines(): Promise<MachineInfo[]> {
-  const response = await fetch(`${API_BASE}/machines`);
+  const response = await fetch(`${API_BASE}/machines`, { headers: readHeaders() });
   
   if (!response.ok) {
     throw new Error('Failed to fetch machines');
@@ -94,16 +161,56 @@ export async function getMachines(): Promise<MachineInfo[]> {
   return response.json();
 }
 
-export async function getMachinePredictions(machineId: string): Promise<PredictionHistory[]> {
-  const response = await fetch(`${API_BASE}/machine/${encodeURIComponent(machineId)}`);
-  
+export async function getMachinePredictions(
+  machineId: string,
+  limit = 50,
+  cursor?: string | null
+): Promise<HistoryPage> {
+  return getHistoryPage(`/machine/${encodeURIComponent(machineId)}`, limit, cursor);
+}
+
+export async function getMachineTimeseries(
+  machineId: string,
+  bucket: 'minute' | 'hour' | 'day' = 'hour'
+): Promise<TimeseriesPoint[]> {
+  const response = await fetch(
+    `${API_BASE}/machine/${encodeURIComponent(machineId)}/timeseries?bucket=${bucket}`,
+    { headers: readHeaders() }
+  );
+
   if (!response.ok) {
-    throw new Error('Failed to fetch machine predictions');
+    throw new Error('Failed to fetch machine timeseries');
   }
-  
+
   return response.json();
 }
 
+export interface LivePrediction extends PredictionHistory {
+  confidence: number;
+}
+
+// Live feed of new predictions (Server-Sent Events); returns a function that closes it.
+// EventSource reconnects on its own after network errors.
+export function subscribePredictions(
+  onPrediction: (prediction: LivePrediction) => void,
+  machineId?: string
+): () => void {
+  const query = machineId ? `?machine_id=${encodeURIComponent(machineId)}` : '';
+  const source = new EventSource(`${API_BASE}/stream/predictions${query}`);
+  source.addEventListener('prediction', (event) => {
+    onPrediction(JSON.parse((event as MessageEvent).data));
+  });
+  return () => source.close();
+}
+
+// `list` with a live prediction in front, unless the initial fetch already returned it
+export function prependPrediction(list: PredictionHistory[], prediction: PredictionHistory): PredictionHistory[] {
+  if (prediction.id != null && list.some((p) => p.id === prediction.id)) {
+    return list;
+  }
+  return [prediction, ...list];
+}
+
 export async function getHealth(): Promise<{ status: string }> {
   const response = await fetch(`${API_BASE}/health`);
   
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import { getStats, getHistory, StatsResponse, PredictionHistory } from '../api/prediction';
+import { getStats, getHistory, subscribePredictions, prependPrediction, StatsResponse, PredictionHistory } from '../api/prediction';
 
 const Dashboard = () => {
   const [stats, setStats] = useState<StatsResponse | null>(null);
@@ -13,11 +13,11 @@ const Dashboard = () => {
       try {
         const [statsData, historyData] = await Promise.all([
           getStats(),
-          getHistory()
+          getHistory(5)
         ]);
         setStats(statsData);
-        // Get last 5 predictions
-        setRecentPredictions(historyData.slice(-5).reverse());
+        // The 5 latest predictions, newest first
+        setRecentPredictions(historyData.predictions);
       } catch (err) {
         setError('Failed to load dashboard data');
         console.error(err);
@@ -29,6 +29,20 @@ const Dashboard = () => {
     fetchData();
   }, []);
 
+  // Keep the recent list and the counters current without re-fetching. Subscribed once
+  // the initial fetch has resolved, so its results can't overwrite newer live events.
+  useEffect(() => {
+    if (loading) return;
+    return subscribePredictions((prediction) => {
+      setRecentPredictions((prev) => prependPrediction(prev, prediction).slice(0, 5));
+      setStats((prev) => prev && {
+        ...prev,
+        total_predictions: prev.total_predictions + 1,
+        latest_prediction: prediction.timestamp,
+      });
+    });
+  }, [loading]);
+
   const formatDate = (dateStr: string | null) => {
     if (!dateStr) return 'N/A';
     return new Date(dateStr).toLocaleString();
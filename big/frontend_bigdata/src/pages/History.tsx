@@ -2,17 +2,22 @@ import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { getHistory, PredictionHistory } from '../api/prediction';
 
+const PAGE_SIZE = 5;
+
 const History = () => {
   const [predictions, setPredictions] = useState<PredictionHistory[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const fetchHistory = async () => {
       try {
-        const data = await getHistory();
-        setPredictions(data.reverse()); // Most recent first
+        const page = await getHistory(PAGE_SIZE);
+        setPredictions(page.predictions); // Most recent first
+        setNextCursor(page.nextCursor);
       } catch (err) {
         setError('Failed to load prediction history');
         console.error(err);
@@ -24,6 +29,22 @@ const History = () => {
     fetchHistory();
   }, []);
 
+  // Older predictions, one page at a time (keyset cursor from the previous page)
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getHistory(PAGE_SIZE, nextCursor);
+      setPredictions((prev) => [...prev, ...page.predictions]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError('Failed to load more predictions');
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateStr: string) => {
     return new Date(dateStr).toLocaleString();
   };
@@ -55,7 +76,7 @@ const History = () => {
 
       <div className="card">
         <div className="card-header">
-          <h2 className="card-title">All Predictions ({filteredPredictions.length})</h2>
+          <h2 className="card-title">Predictions ({filteredPredictions.length}{nextCursor ? '+' : ''})</h2>
           <input
             type="text"
             placeholder="Search by Machine ID..."
@@ -120,6 +141,14 @@ const History = () => {
             </table>
           </div>
         )}
+
+        {nextCursor && (
+          <div style={{ display: 'flex', justifyContent: 'center', marginTop: '1rem' }}>
+            <button className="btn btn-secondary" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,20 +1,26 @@
 import { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import { getMachinePredictions, PredictionHistory } from '../api/prediction';
+import { getMachinePredictions, subscribePredictions, prependPrediction, PredictionHistory } from '../api/prediction';
+
+const PAGE_SIZE = 50;
 
 export default function MachineDetail() {
   const { id } = useParams<{ id: string }>();
   const [predictions, setPredictions] = useState<PredictionHistory[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const fetchMachineData = async () => {
       if (!id) return;
-      
+      setLoading(true);
+
       try {
-        const data = await getMachinePredictions(id);
-        setPredictions(data.reverse()); // Most recent first
+        const page = await getMachinePredictions(id, PAGE_SIZE);
+        setPredictions(page.predictions); // Most recent first
+        setNextCursor(page.nextCursor);
       } catch (err) {
         setError('Failed to load machine data');
         console.error(err);
@@ -26,6 +32,29 @@ export default function MachineDetail() {
     fetchMachineData();
   }, [id]);
 
+  const loadMore = async () => {
+    if (!id || !nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await getMachinePredictions(id, PAGE_SIZE, nextCursor);
+      setPredictions((prev) => [...prev, ...page.predictions]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError('Failed to load more predictions');
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Subscribed once the initial fetch has resolved, so it can't overwrite live events
+  useEffect(() => {
+    if (!id || loading) return;
+    return subscribePredictions((prediction) => {
+      setPredictions((prev) => prependPrediction(prev, prediction));
+    }, id);
+  }, [id, loading]);
+
   const formatDate = (dateStr: string) => {
     return new Date(dateStr).toLocaleString();
   };
@@ -75,7 +104,7 @@ export default function MachineDetail() {
           <div className="stat-card">
             <div className="stat-icon primary">📊</div>
             <div className="stat-value">{predictions.length}</div>
-            <div className="stat-label">Total Predictions</div>
+            <div className="stat-label">{nextCursor ? 'Latest Predictions' : 'Total Predictions'}</div>
           </div>
           <div className="stat-card">
             <div className="stat-icon danger">🔧</div>
@@ -144,6 +173,14 @@ export default function MachineDetail() {
             </table>
           </div>
         )}
+
+        {nextCursor && (
+          <div style={{ display: 'flex', justifyContent: 'center', marginTop: '1rem' }}>
+            <button className="btn btn-secondary" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
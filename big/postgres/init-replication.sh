@@ -0,0 +1,5 @@
+#!/bin/bash
+# Lets the standby in docker-compose.replica.yml stream WAL from this server.
+# Runs from /docker-entrypoint-initdb.d, so only when the data volume is first initialized.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"